@@ -1,101 +1,168 @@
-
-
-import streamlit as st
-from dotenv import load_dotenv
-load_dotenv()
-import requests
-import json
-
-API_URL = "http://localhost:8000"
-
-st.set_page_config(page_title="Autonomous QA Agent", layout="wide")
-st.title("Autonomous QA Agent for Test Case & Selenium Script Generation")
-
-
-st.sidebar.header("Configuration")
-provider = st.sidebar.selectbox("LLM Provider", ["Ollama", "Groq", "Mock"])
-api_key = ""
-if provider == "Groq":
-    api_key = st.sidebar.text_input("Groq API Key (Optional)", type="password", help="Leave empty to use Mock or Environment Variable")
-elif provider == "Ollama":
-    st.sidebar.info("Ensure Ollama is running locally (http://localhost:11434). Model: llama3")
-elif provider == "Mock":
-    st.sidebar.warning("Using Mock Mode. No AI will be used.")
-
-
-
-st.header("Step 1: Upload Support Documents")
-support_files = st.file_uploader(
-    "Upload your support docs (MD, TXT, JSON, PDF, HTML)", 
-    type=["md", "txt", "json", "pdf", "html"], 
-    accept_multiple_files=True
-)
-
-if st.button("Upload Support Documents") and support_files:
-    for f in support_files:
-        files = {"file": (f.name, f, f.type)}
-        r = requests.post(f"{API_URL}/upload_support_doc", files=files)
-        if r.status_code == 200:
-            st.success(f"Uploaded: {f.name}")
-        else:
-            st.error(f"Failed: {f.name} | {r.text}")
-
-
-st.header("Step 2: Upload checkout.html")
-checkout_file = st.file_uploader("Upload checkout.html", type=["html"])
-
-if st.button("Upload checkout.html") and checkout_file:
-    files = {"file": (checkout_file.name, checkout_file, checkout_file.type)}
-    r = requests.post(f"{API_URL}/upload_checkout_html", files=files)
-    if r.status_code == 200:
-        st.success("checkout.html uploaded successfully")
-    else:
-        st.error(f"Failed: {r.text}")
-
-
-st.header("Step 3: Build Knowledge Base")
-if st.button("Build Knowledge Base"):
-    r = requests.post(f"{API_URL}/build_kb")
-    if r.status_code == 200:
-        res = r.json()
-        st.success(f"Knowledge Base Built! Chunks ingested: {res.get('ingested_chunks', 0)}")
-    else:
-        st.error(f"Failed to build KB: {r.text}")
-
-
-st.header("Step 4: Generate Test Cases")
-user_request = st.text_input("Enter your test case request (e.g., discount code test cases)")
-
-if st.button("Generate Test Cases") and user_request:
-    data = {"user_request": user_request}
-    headers = {"x-llm-provider": provider.lower()}
-    if api_key:
-        headers["x-groq-api-key"] = api_key
-        
-    r = requests.post(f"{API_URL}/generate_testcases", data=data, headers=headers)
-    if r.status_code == 200:
-        res = r.json()
-        tc_id = res.get("testcases_id")
-        st.session_state["tc_id"] = tc_id
-        st.success("Test cases generated! ID: " + tc_id)
-        st.text_area("Preview:", res.get("preview", "")[:2000], height=300)
-    else:
-        st.error(f"Failed to generate test cases: {r.text}")
-
-
-st.header("Step 5: Generate Selenium Script")
-tc_id = st.session_state.get("tc_id", None)
-testcase_index = st.number_input("Test case index (0 for first)", min_value=0, value=0)
-
-if tc_id and st.button("Generate Selenium Script"):
-    data = {"testcases_id": tc_id, "testcase_index": testcase_index}
-    headers = {"x-llm-provider": provider.lower()}
-    if api_key:
-        headers["x-groq-api-key"] = api_key
-        
-    r = requests.post(f"{API_URL}/generate_selenium_script", data=data, headers=headers)
-    if r.status_code == 200:
-        st.success("Selenium Script Generated!")
-        st.code(r.text, language="python")
-    else:
-        st.error(f"Failed: {r.text}")
+
+
+import streamlit as st
+from dotenv import load_dotenv
+load_dotenv()
+import requests
+import json
+import time
+
+API_URL = "http://localhost:8000"
+
+st.set_page_config(page_title="Autonomous QA Agent", layout="wide")
+st.title("Autonomous QA Agent for Test Case & Selenium Script Generation")
+
+
+st.sidebar.header("Configuration")
+provider = st.sidebar.selectbox("LLM Provider", ["Ollama", "Groq", "Mock"])
+api_key = ""
+if provider == "Groq":
+    api_key = st.sidebar.text_input("Groq API Key (Optional)", type="password", help="Leave empty to use Mock or Environment Variable")
+elif provider == "Ollama":
+    st.sidebar.info("Ensure Ollama is running locally (http://localhost:11434). Model: llama3")
+elif provider == "Mock":
+    st.sidebar.warning("Using Mock Mode. No AI will be used.")
+
+
+
+st.header("Step 1: Upload Support Documents")
+support_files = st.file_uploader(
+    "Upload your support docs (MD, TXT, JSON, PDF, HTML)", 
+    type=["md", "txt", "json", "pdf", "html"], 
+    accept_multiple_files=True
+)
+
+if st.button("Upload Support Documents") and support_files:
+    for f in support_files:
+        files = {"file": (f.name, f, f.type)}
+        r = requests.post(f"{API_URL}/upload_support_doc", files=files)
+        if r.status_code == 200:
+            st.success(f"Uploaded: {f.name}")
+        else:
+            st.error(f"Failed: {f.name} | {r.text}")
+
+
+st.header("Step 2: Upload checkout.html")
+checkout_file = st.file_uploader("Upload checkout.html", type=["html"])
+page_name = st.text_input("Page name (e.g. checkout, cart, payment)", value="checkout")
+
+if st.button("Upload checkout.html") and checkout_file:
+    files = {"file": (checkout_file.name, checkout_file, checkout_file.type)}
+    r = requests.post(f"{API_URL}/upload_checkout_html", files=files, data={"page_name": page_name})
+    if r.status_code == 200:
+        st.success(f"{page_name}.html uploaded successfully ({r.json().get('elements')} elements indexed)")
+    else:
+        st.error(f"Failed: {r.text}")
+
+
+st.header("Step 3: Build Knowledge Base")
+col_build, col_cancel = st.columns([1, 1])
+if col_build.button("Build Knowledge Base"):
+    r = requests.post(f"{API_URL}/build_kb")
+    if r.status_code in (200, 202):
+        st.session_state["build_job_id"] = r.json().get("job_id")
+    else:
+        st.error(f"Failed to build KB: {r.text}")
+
+build_job_id = st.session_state.get("build_job_id")
+if build_job_id and col_cancel.button("Cancel Build"):
+    requests.post(f"{API_URL}/build_kb/{build_job_id}/cancel")
+
+if build_job_id:
+    progress = st.progress(0.0)
+    status_line = st.empty()
+    while True:
+        r = requests.get(f"{API_URL}/build_kb/{build_job_id}")
+        if r.status_code != 200:
+            st.error(f"Failed to get build status: {r.text}")
+            break
+        job = r.json()
+        total = job.get("files_total") or 0
+        progress.progress(min(1.0, job.get("files_parsed", 0) / total) if total else 0.0)
+        eta = job.get("eta_seconds")
+        status_line.text(
+            f"Status: {job['status']} | files {job.get('files_parsed', 0)}/{total} | "
+            f"chunks embedded {job.get('chunks_embedded', 0)} | "
+            f"{job.get('chunks_per_sec', 0)} chunks/s" + (f" | ETA {eta}s" if eta is not None else "")
+        )
+        if job["status"] == "succeeded":
+            res = job.get("result") or {}
+            st.success(f"Knowledge Base Built! Chunks ingested: {res.get('ingested_chunks', 0)}")
+            st.session_state.pop("build_job_id", None)
+            break
+        if job["status"] in ("failed", "cancelled"):
+            st.error(f"Build {job['status']}: {job.get('error') or ''}")
+            st.session_state.pop("build_job_id", None)
+            break
+        time.sleep(1)
+
+
+st.header("Step 4: Generate Test Cases")
+user_request = st.text_input("Enter your test case request (e.g., discount code test cases)")
+
+if st.button("Generate Test Cases") and user_request:
+    data = {"user_request": user_request}
+    headers = {"x-llm-provider": provider.lower()}
+    if api_key:
+        headers["x-groq-api-key"] = api_key
+        
+    preview = st.empty()
+    with requests.post(f"{API_URL}/generate_testcases/stream", data=data, headers=headers, stream=True) as r:
+        if r.status_code == 200:
+            tc_id = r.headers.get("X-Testcases-Id")
+            st.session_state["tc_id"] = tc_id
+            text = ""
+            for piece in r.iter_content(chunk_size=None, decode_unicode=True):
+                text += piece
+                preview.code(text[-4000:], language="json")
+            st.success("Test cases generated! ID: " + tc_id)
+        else:
+            st.error(f"Failed to generate test cases: {r.text}")
+
+
+st.header("Step 5: Generate Selenium Script")
+tc_id = st.session_state.get("tc_id", None)
+testcase_index = st.number_input("Test case index (0 for first)", min_value=0, value=0)
+try:
+    pages = [p["page_name"] for p in requests.get(f"{API_URL}/pages", timeout=10).json().get("pages", [])]
+except Exception:
+    pages = []
+script_page = st.selectbox("Page", ["All pages"] + pages)
+page_data = {} if script_page == "All pages" else {"page_name": script_page}
+
+if tc_id and st.button("Generate Selenium Script"):
+    data = {"testcases_id": tc_id, "testcase_index": testcase_index, **page_data}
+    headers = {"x-llm-provider": provider.lower()}
+    if api_key:
+        headers["x-groq-api-key"] = api_key
+        
+    script_box = st.empty()
+    with requests.post(f"{API_URL}/generate_selenium_script/stream", data=data, headers=headers, stream=True) as r:
+        if r.status_code == 200:
+            code = ""
+            for piece in r.iter_content(chunk_size=None, decode_unicode=True):
+                code += piece
+                script_box.code(code, language="python")
+            st.success("Selenium Script Generated!")
+        else:
+            st.error(f"Failed: {r.text}")
+
+st.subheader("Generate All Scripts")
+output_format = st.radio("Output format", ["zip", "pytest"], horizontal=True)
+
+if tc_id and st.button("Generate All Scripts"):
+    data = {"testcases_id": tc_id, "output_format": output_format, **page_data}
+    headers = {"x-llm-provider": provider.lower()}
+    if api_key:
+        headers["x-groq-api-key"] = api_key
+
+    with st.spinner("Generating scripts..."):
+        res = requests.post(f"{API_URL}/generate_selenium_scripts", data=data, headers=headers)
+    if res.status_code == 200:
+        st.success("Selenium Scripts Generated!")
+        if output_format == "zip":
+            st.download_button("Download scripts (.zip)", res.content, file_name="selenium_scripts.zip", mime="application/zip")
+        else:
+            st.download_button("Download test suite (.py)", res.content, file_name="test_suite.py", mime="text/x-python")
+    else:
+        st.error(f"Failed: {res.text}")
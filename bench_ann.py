@@ -0,0 +1,107 @@
+"""
+Recall / latency benchmark for the FaissStore index types.
+
+Builds each index type on a synthetic clustered corpus of unit vectors and reports
+recall@k against the exact flat_ip baseline plus p50/p99 single-query latency.
+
+Usage (from the project root, so that backend.app.services is importable):
+    python bench_ann.py --sizes 10000 100000 1000000 --dim 384 --k 5
+"""
+
+import argparse
+import json
+import math
+import time
+
+import numpy as np
+
+from backend.app.services import vectorstore as vs_mod
+
+
+def synthetic_corpus(n: int, dim: int, n_clusters: int = 256, seed: int = 0) -> np.ndarray:
+    """
+    Gaussian-mixture vectors, L2-normalized, roughly mimicking sentence embeddings.
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, dim)).astype("float32")
+    labels = rng.integers(0, n_clusters, size=n)
+    x = centers[labels] + 0.35 * rng.standard_normal((n, dim)).astype("float32")
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def configs_for(n: int):
+    """
+    Index configurations to compare at corpus size n.
+    """
+    nlist = int(4 * math.sqrt(n))
+    return [
+        ("flat_ip", {}),
+        ("hnsw", {"M": 32, "ef_construction": 80, "ef_search": 64}),
+        ("hnsw", {"M": 32, "ef_construction": 80, "ef_search": 128}),
+        ("ivfpq", {"nlist": nlist, "m": 48, "nbits": 8, "nprobe": 16}),
+        ("ivfpq", {"nlist": nlist, "m": 48, "nbits": 8, "nprobe": 64}),
+    ]
+
+
+def run(n: int, dim: int, k: int, n_queries: int, batch: int = 50000):
+    corpus = synthetic_corpus(n, dim)
+    queries = synthetic_corpus(n_queries, dim, seed=1)
+    ids = np.arange(n, dtype="int64")
+    results = []
+    truth = None
+
+    for index_type, params in configs_for(n):
+        store = vs_mod.FaissStore(dim=dim, index_type=index_type, params=params)
+        t0 = time.perf_counter()
+        for start in range(0, n, batch):
+            end = min(start + batch, n)
+            metas = [{"i": int(i)} for i in ids[start:end]]
+            store.add(corpus[start:end], metas, ids[start:end])
+        store.flush()
+        build_s = time.perf_counter() - t0
+
+        found = []
+        latencies = []
+        for q in queries:
+            t = time.perf_counter()
+            hits = store.query(q, top_k=k)
+            latencies.append(time.perf_counter() - t)
+            found.append([h["i"] for h in hits])
+
+        if truth is None:
+            truth = found
+        recall = np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+        lat_ms = np.array(latencies) * 1000
+        results.append({
+            "n": n,
+            "index_type": index_type,
+            "params": params,
+            "build_s": round(build_s, 3),
+            f"recall@{k}": round(float(recall), 4),
+            "p50_ms": round(float(np.percentile(lat_ms, 50)), 4),
+            "p99_ms": round(float(np.percentile(lat_ms, 99)), 4),
+        })
+        print(json.dumps(results[-1]), flush=True)
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--queries", type=int, default=1000)
+    ap.add_argument("--out", default=None, help="Optional path to write all results as JSON")
+    args = ap.parse_args()
+
+    all_results = []
+    for n in args.sizes:
+        all_results.extend(run(n, args.dim, args.k, args.queries))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(all_results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+"""
+Chunker benchmark: the native chunker against LangChain's RecursiveCharacterTextSplitter.
+
+Reports import time, throughput (MB/s), chunk count and size, and retrieval quality on a
+synthetic markdown / JSON / text corpus with known answers: each query asks for one
+planted fact, and hit@k counts queries where a top-k chunk contains the whole fact
+(facts_intact is the share of facts that no chunk boundary cuts through).
+Retrieval uses BM25 by default; pass --dense to also use the embedding model.
+LangChain is only needed for the comparison (pip install langchain-text-splitters).
+
+Usage (from the project root, so that backend.app.services is importable):
+    python bench_chunker.py --docs 200 --k 3 --dense --corpus assets
+"""
+
+import argparse
+import json
+import random
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.services import chunker as chunker_mod
+from backend.app.services import lexical as lex_mod
+
+WORDS = ("checkout cart discount shipping payment card email address validation error message total "
+         "price quantity button form field order summary tax currency session guest login").split()
+ITEMS = ["shoes", "jackets", "books", "lamps", "phones", "chairs", "watches", "bags"]
+
+
+def synthetic_corpus(n_docs: int, seed: int = 0):
+    """
+    Documents of all three kinds with one planted fact per section.
+    Returns ([(kind, text)], [(query, fact)]).
+    """
+    rng = random.Random(seed)
+    docs, facts = [], []
+
+    def filler(n):
+        return " ".join(rng.choice(WORDS) for _ in range(n)) + "."
+
+    for d in range(n_docs):
+        kind = ("markdown", "json", "text")[d % 3]
+        sections = []
+        for s in range(rng.randint(3, 8)):
+            code = f"SAVE{d}X{s}"
+            pct = rng.randint(5, 60)
+            item = rng.choice(ITEMS)
+            fact = f"The discount code {code} gives {pct} percent off {item}."
+            facts.append((f"How much does code {code} take off?", fact))
+            paras = [filler(rng.randint(20, 120)) for _ in range(rng.randint(1, 5))]
+            paras.insert(rng.randint(0, len(paras)), fact)
+            sections.append((f"Promotion {d}.{s}", paras))
+        if kind == "markdown":
+            text = "\n\n".join(f"## {title}\n\n" + "\n\n".join(paras) for title, paras in sections)
+        elif kind == "json":
+            text = json.dumps({title: {"rules": paras} for title, paras in sections}, indent=2)
+        else:
+            text = "\n\n".join(p for _, paras in sections for p in paras)
+        docs.append((kind, text))
+    return docs, facts
+
+
+def load_files(corpus_dir):
+    docs = []
+    for path in sorted(Path(corpus_dir).rglob("*")):
+        if path.suffix.lower() in {".md", ".txt", ".json"}:
+            docs.append((chunker_mod.kind_for(path.name), path.read_text(encoding="utf-8", errors="ignore")))
+    return docs
+
+
+def native_splitter(chunk_size: int, overlap: int):
+    def split(kind, text):
+        return [c for c, _, _ in chunker_mod.Chunker(chunk_size, overlap, kind).iter_chunks(text)]
+    return split
+
+
+def langchain_splitter(chunk_size: int, overlap: int):
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    def split(kind, text):
+        # A new splitter per call, as parser.chunk_text used to do.
+        return RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap, length_function=len).split_text(text)
+    return split
+
+
+def hit_rate(chunks, facts, k: int, embedder=None) -> float:
+    ids = list(range(len(chunks)))
+    if embedder is None:
+        index = lex_mod.BM25Index()
+        index.add(ids, chunks)
+        ranked = [[vid for vid, _ in index.query(q, top_k=k)] for q, _ in facts]
+    else:
+        vectors = embedder.embed(chunks)
+        queries = embedder.embed([q for q, _ in facts])
+        ranked = np.argsort(-(queries @ vectors.T), axis=1)[:, :k].tolist()
+    hits = sum(any(fact in chunks[i] for i in row) for row, (_, fact) in zip(ranked, facts))
+    return hits / len(facts)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--docs", type=int, default=200, help="Synthetic documents")
+    ap.add_argument("--corpus", default=None, help="Directory of md/txt/json files added to the throughput run")
+    ap.add_argument("--chunk-size", type=int, default=800)
+    ap.add_argument("--overlap", type=int, default=100)
+    ap.add_argument("--k", type=int, default=3)
+    ap.add_argument("--repeat", type=int, default=3, help="Throughput runs (best is reported)")
+    ap.add_argument("--dense", action="store_true", help="Also measure hit@k with the embedding model")
+    ap.add_argument("--out", default=None, help="Optional path to write all results as JSON")
+    args = ap.parse_args()
+
+    docs, facts = synthetic_corpus(args.docs)
+    throughput_docs = docs + (load_files(args.corpus) if args.corpus else [])
+    mb = sum(len(t) for _, t in throughput_docs) / 2 ** 20
+    embedder = None
+    if args.dense:
+        from backend.app.services.embeddings import EmbeddingModel
+        embedder = EmbeddingModel(cache_size=0)
+
+    results = []
+    for name, factory, module in [("native", native_splitter, None), ("langchain", langchain_splitter, "langchain_text_splitters")]:
+        t0 = time.perf_counter()
+        try:
+            if module:
+                __import__(module)
+            split = factory(args.chunk_size, args.overlap)
+        except ImportError as e:
+            print(f"Skipping {name}: {e}")
+            continue
+        import_s = time.perf_counter() - t0
+
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            for kind, text in throughput_docs:
+                split(kind, text)
+            best = min(best, time.perf_counter() - t0)
+
+        chunks = [c for kind, text in docs for c in split(kind, text)]
+        row = {
+            "chunker": name,
+            "import_s": round(import_s, 3),
+            "mb_per_s": round(mb / best, 2),
+            "chunks": len(chunks),
+            "mean_chars": round(float(np.mean([len(c) for c in chunks])), 1),
+            "facts_intact": round(sum(any(fact in c for c in chunks) for _, fact in facts) / len(facts), 4),
+            f"bm25_hit@{args.k}": round(hit_rate(chunks, facts, args.k), 4),
+        }
+        if embedder is not None:
+            row[f"dense_hit@{args.k}"] = round(hit_rate(chunks, facts, args.k, embedder), 4)
+        results.append(row)
+        print(json.dumps(row), flush=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Throughput / latency / memory / recall benchmark for the embedding backends and
+FaissStore vector storage formats.
+
+Each backend embeds the same corpus and query set. Reported per backend: model load
+time, resident memory added by loading it, batch throughput (texts/sec) and p50/p99
+single-query latency. Recall@k is measured per (backend, storage) pair against exact
+float32 search over the torch embeddings, i.e. the current setup.
+
+Usage (from the project root, so that backend.app.services is importable):
+    python bench_embeddings.py --corpus assets --backends torch int8 onnx onnx:onnx/model_qint8_avx2.onnx
+"""
+
+import argparse
+import gc
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+from backend.app.services import embeddings as emb_mod
+from backend.app.services import vectorstore as vs_mod
+
+MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def rss_mb():
+    """
+    Resident set size of this process in MB (None where it cannot be read).
+    """
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss / 2 ** 20
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except (OSError, ValueError):
+        return None
+
+
+def load_corpus(corpus_dir, n: int, seed: int = 0):
+    """
+    Paragraphs from the text files in corpus_dir, topped up with synthetic
+    checkout-domain sentences until there are n texts.
+    """
+    texts = []
+    if corpus_dir:
+        for path in sorted(Path(corpus_dir).rglob("*")):
+            if path.suffix.lower() in {".md", ".txt", ".json", ".html", ".htm"}:
+                body = path.read_text(encoding="utf-8", errors="ignore")
+                texts.extend(p.strip() for p in body.split("\n\n") if len(p.strip()) > 20)
+    rng = random.Random(seed)
+    subjects = ["discount code", "shipping method", "payment form", "cart total", "email field",
+                "order summary", "express shipping", "coupon SAVE15", "checkout button", "address form"]
+    verbs = ["must validate", "updates", "rejects", "is shown next to", "recalculates", "disables",
+             "displays an error for", "applies", "requires", "hides"]
+    objects = ["invalid input", "the total price", "an empty value", "the success message",
+               "expired codes", "the standard rate", "a red border", "the submit action"]
+    while len(texts) < n:
+        texts.append(f"The {rng.choice(subjects)} {rng.choice(verbs)} {rng.choice(objects)}.")
+    return texts[:n]
+
+
+def bench_backend(spec: str, corpus, queries, batch_size: int):
+    """
+    Load one backend ("name" or "onnx:<file>") and time it on corpus and queries.
+    Returns (result row, corpus vectors, query vectors).
+    """
+    backend, _, onnx_file = spec.partition(":")
+    gc.collect()
+    before = rss_mb()
+    t0 = time.perf_counter()
+    model = emb_mod.EmbeddingModel(MODEL, cache_size=0, backend=backend, onnx_file=onnx_file or None)
+    load_s = time.perf_counter() - t0
+    after = rss_mb()
+
+    model.encode(corpus[:batch_size])  # warm-up
+    t0 = time.perf_counter()
+    vectors = np.vstack([model.encode(corpus[i:i + batch_size]) for i in range(0, len(corpus), batch_size)])
+    throughput = len(corpus) / (time.perf_counter() - t0)
+
+    latencies, query_vectors = [], []
+    for q in queries:
+        t = time.perf_counter()
+        query_vectors.append(model.encode([q])[0])
+        latencies.append(time.perf_counter() - t)
+    lat_ms = np.array(latencies) * 1000
+    row = {
+        "backend": spec,
+        "load_s": round(load_s, 3),
+        "memory_mb": round(after - before, 1) if before is not None and after is not None else None,
+        "texts_per_s": round(throughput, 1),
+        "p50_ms": round(float(np.percentile(lat_ms, 50)), 3),
+        "p99_ms": round(float(np.percentile(lat_ms, 99)), 3),
+    }
+    del model
+    return row, vectors, np.vstack(query_vectors)
+
+
+def search(vectors, query_vectors, k: int, storage: str, index_type: str):
+    store = vs_mod.FaissStore(dim=vectors.shape[1], index_type=index_type, storage=storage)
+    ids = np.arange(len(vectors), dtype="int64")
+    store.add(vectors, [{"i": int(i)} for i in ids], ids)
+    store.flush()
+    return [[h["i"] for h in hits] for hits in store.query_batch(query_vectors, top_k=k)]
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--corpus", default=None, help="Directory of text files to embed (topped up synthetically)")
+    ap.add_argument("--n", type=int, default=5000, help="Corpus size")
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=5)
+    ap.add_argument("--batch-size", type=int, default=256)
+    ap.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"],
+                    help='Backends to compare; "onnx:<file>" selects an exported ONNX file')
+    ap.add_argument("--storage", nargs="+", default=vs_mod.STORAGE_TYPES)
+    ap.add_argument("--index-type", default="flat_ip", choices=["flat_ip", "hnsw"])
+    ap.add_argument("--out", default=None, help="Optional path to write all results as JSON")
+    args = ap.parse_args()
+
+    corpus = load_corpus(args.corpus, args.n)
+    queries = load_corpus(None, args.queries, seed=1)
+    # torch runs first: its exact float32 results are the recall baseline.
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+
+    results, truth = [], None
+    for spec in backends:
+        try:
+            row, vectors, query_vectors = bench_backend(spec, corpus, queries, args.batch_size)
+        except Exception as e:
+            if spec == "torch":
+                raise
+            print(f"Skipping backend {spec}: {e}", file=sys.stderr)
+            continue
+        if spec == "torch":
+            truth = search(vectors, query_vectors, args.k, "float32", "flat_ip")
+        for storage in args.storage:
+            found = search(vectors, query_vectors, args.k, storage, args.index_type)
+            recall = np.mean([len(set(f) & set(t)) / args.k for f, t in zip(found, truth)])
+            results.append({
+                **row,
+                "storage": storage,
+                "index_type": args.index_type,
+                f"recall@{args.k}": round(float(recall), 4),
+                "index_mb": round(len(vectors) * vectors.shape[1] * {"float32": 4, "float16": 2, "int8": 1}[storage] / 2 ** 20, 2),
+            })
+            print(json.dumps(results[-1]), flush=True)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Cold-start benchmark: how long importing the API takes, and how long the server takes to
+become live (/health answers) and ready (/ready answers 200, embedding model loaded).
+
+Import time is measured in fresh interpreters with `python -X importtime`; the report lists
+the slowest top-level imports and whether any of the heavy optional dependencies (torch,
+sentence-transformers, FAISS, PyMuPDF, BeautifulSoup) were loaded by the import alone.
+Startup runs the app with uvicorn on an empty scratch directory (QA_BASE_DIR).
+
+Each figure is checked against a budget; the script exits with status 1 if the median
+of any of them is over budget, so it can gate CI.
+
+Usage (from the project root):
+    python bench_startup.py --runs 5 --import-budget 1.0 --live-budget 2.0 --ready-budget 30 --out startup.json
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+import httpx
+
+from bench_suite import ApiServer, _git_revision
+
+HEAVY_MODULES = ["torch", "sentence_transformers", "transformers", "faiss", "fitz", "bs4"]
+
+_IMPORT_PROBE = """
+import json, sys, time
+t0 = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - t0
+print(json.dumps({{"seconds": elapsed, "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def measure_import(module: str):
+    """
+    Import module in a fresh interpreter. Returns (seconds, heavy modules loaded,
+    [(cumulative_us, name)] for the top-level imports, from -X importtime).
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _IMPORT_PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        capture_output=True, text=True, cwd=Path(__file__).resolve().parent,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    top = []
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package"; nesting is indented.
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            top.append((int(cumulative), name.strip()))
+    return result["seconds"], result["loaded"], top
+
+
+def measure_startup(app: str):
+    """
+    Start the API on an empty scratch directory. Returns (live_s, ready_s, model_load_s).
+    """
+    with tempfile.TemporaryDirectory(prefix="qa-startup-") as tmp:
+        # No LLM calls are made; the URL only has to be set.
+        server = ApiServer(app, Path(tmp), "http://127.0.0.1:9", {})
+        try:
+            body = httpx.get(f"{server.url}/ready", timeout=5).json()
+        finally:
+            server.close()
+    return server.live_s, server.startup_s, body.get("model_load_seconds")
+
+
+def _summary(values, budget):
+    values = [v for v in values if v is not None]
+    if not values:
+        return {"median_s": None, "budget_s": budget, "ok": None}
+    median = statistics.median(values)
+    return {
+        "median_s": round(median, 3),
+        "min_s": round(min(values), 3),
+        "max_s": round(max(values), 3),
+        "budget_s": budget,
+        "ok": budget is None or median <= budget,
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--module", default="backend.app.main", help="Module whose import is timed")
+    ap.add_argument("--app", default="backend.app.main:app", help="uvicorn import path of the API")
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list")
+    ap.add_argument("--import-budget", type=float, default=1.0, help="Seconds to import --module")
+    ap.add_argument("--live-budget", type=float, default=2.0, help="Seconds from spawn until /health answers")
+    ap.add_argument("--ready-budget", type=float, default=30.0, help="Seconds from spawn until /ready answers 200")
+    ap.add_argument("--skip-server", action="store_true", help="Only measure the import")
+    ap.add_argument("--out", default=None, help="Optional path to write all results as JSON")
+    args = ap.parse_args()
+
+    import_s, loaded, top = [], set(), {}
+    for _ in range(args.runs):
+        seconds, heavy, imports = measure_import(args.module)
+        import_s.append(seconds)
+        loaded.update(heavy)
+        for us, name in imports:
+            top.setdefault(name, []).append(us)
+    slowest = sorted(((statistics.median(v), k) for k, v in top.items()), reverse=True)[:args.top]
+
+    results = {
+        "git_revision": _git_revision(),
+        "python": sys.version.split()[0],
+        "import": {
+            **_summary(import_s, args.import_budget),
+            "heavy_modules_loaded": sorted(loaded),
+            "slowest_imports_ms": {name: round(us / 1000, 1) for us, name in slowest},
+        },
+    }
+    if not args.skip_server:
+        runs = [measure_startup(args.app) for _ in range(args.runs)]
+        results["live"] = _summary([r[0] for r in runs], args.live_budget)
+        results["ready"] = _summary([r[1] for r in runs], args.ready_budget)
+        results["model_load"] = _summary([r[2] for r in runs], None)
+
+    print(json.dumps(results, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if any(r.get("ok") is False for r in results.values() if isinstance(r, dict)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+End-to-end benchmark suite: ingestion, retrieval and generation through the FastAPI app.
+
+For each corpus scale, a synthetic corpus of md, json, html and pdf files is written to a
+scratch directory (QA_BASE_DIR), the API is started on it with uvicorn, and the suite
+measures:
+  - startup time until /health answers (live) and until /ready does (model loaded)
+  - /build_kb wall time, chunks/sec and input MB/sec, plus a no-op incremental rebuild
+  - peak RSS of the server process
+  - sequential /generate_testcases latency with an instant LLM (p50/p99 of the request
+    and of its "retrieve" stage, from the Server-Timing breakdown)
+  - concurrent /generate_testcases throughput (requests/sec, p50/p99)
+The LLM is a local stub speaking the Groq (OpenAI-compatible) API with configurable
+latency, so runs need no network access and are repeatable. The generation cache is
+disabled so every request reaches the stub.
+
+Results are printed and written as JSON (with the git revision) for comparing versions.
+
+Usage (from the project root):
+    python bench_suite.py --scales small medium --llm-latency 0.5 --concurrency 16 --out bench.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+# (files per type, paragraphs per file)
+SCALES = {"small": (5, 20), "medium": (25, 40), "large": (100, 80)}
+
+WORDS = ("checkout cart discount code coupon shipping express standard payment card paypal email "
+         "address validation error message total price quantity button submit form field required "
+         "invalid expired order summary confirmation tax currency user guest login session").split()
+
+STUB_TESTCASES = [
+    {"Test_ID": "TC-001", "Feature": "Discount code", "Test_Scenario": "Apply a valid code",
+     "Steps": ["Open checkout", "Enter SAVE15", "Click Apply"], "Expected_Result": "Total is reduced by 15%",
+     "Grounded_In": "product_specs.md"},
+    {"Test_ID": "TC-002", "Feature": "Discount code", "Test_Scenario": "Apply an invalid code",
+     "Steps": ["Open checkout", "Enter XXXX", "Click Apply"], "Expected_Result": "An error message is shown",
+     "Grounded_In": "product_specs.md"},
+]
+
+
+def _paragraph(rng: random.Random, n_words: int = 60) -> str:
+    words = [rng.choice(WORDS) for _ in range(n_words)]
+    words[0] = words[0].capitalize()
+    return " ".join(words) + "."
+
+
+def write_corpus(assets: Path, files_per_type: int, paragraphs: int, seed: int = 0) -> dict:
+    """
+    Write files_per_type md, json, html and pdf files of `paragraphs` paragraphs each.
+    Returns file counts and total bytes. PDFs are skipped if PyMuPDF is not installed.
+    """
+    rng = random.Random(seed)
+    assets.mkdir(parents=True, exist_ok=True)
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+        print("PyMuPDF not installed, skipping pdf files", file=sys.stderr)
+
+    counts = {"md": 0, "json": 0, "html": 0, "pdf": 0}
+    for i in range(files_per_type):
+        paras = [_paragraph(rng) for _ in range(paragraphs)]
+        md = [f"# Feature spec {i}"]
+        for j, p in enumerate(paras):
+            md.append(f"## Rule {j}\n\n{p}")
+        (assets / f"spec_{i}.md").write_text("\n\n".join(md), encoding="utf-8")
+
+        endpoints = [{"path": f"/api/v1/feature{i}/op{j}", "method": rng.choice(["GET", "POST"]), "description": p}
+                     for j, p in enumerate(paras)]
+        (assets / f"api_{i}.json").write_text(json.dumps({"endpoints": endpoints}, indent=2), encoding="utf-8")
+
+        body = "".join(f'<section id="s{j}"><h2>Section {j}</h2><p>{p}</p>'
+                       f'<label for="f{j}">Field {j}</label><input id="f{j}" name="f{j}"></section>'
+                       for j, p in enumerate(paras))
+        (assets / f"page_{i}.html").write_text(f"<html><body><form>{body}</form></body></html>", encoding="utf-8")
+        counts["md"] += 1
+        counts["json"] += 1
+        counts["html"] += 1
+
+        if fitz is not None:
+            doc = fitz.open()
+            for start in range(0, len(paras), 8):
+                page = doc.new_page()
+                page.insert_textbox(fitz.Rect(50, 50, 550, 800), "\n\n".join(paras[start:start + 8]), fontsize=9)
+            doc.save(str(assets / f"guide_{i}.pdf"))
+            doc.close()
+            counts["pdf"] += 1
+
+    counts["bytes"] = sum(p.stat().st_size for p in assets.iterdir() if p.is_file())
+    return counts
+
+
+class StubLLM:
+    """
+    Minimal OpenAI-compatible /chat/completions server (plain and streamed) that answers
+    every prompt with the same testcases after `latency` (+/- `jitter`) seconds.
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, port: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                stub.requests += 1
+                time.sleep(max(0.0, stub.latency + random.uniform(-stub.jitter, stub.jitter)))
+                content = json.dumps(STUB_TESTCASES)
+                prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+                usage = {"prompt_tokens": prompt_chars // 4, "completion_tokens": len(content) // 4}
+                if body.get("stream"):
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    for i in range(0, len(content), 16):
+                        delta = {"choices": [{"delta": {"content": content[i:i + 16]}}]}
+                        self.wfile.write(f"data: {json.dumps(delta)}\n\n".encode())
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    return
+                data = json.dumps({"choices": [{"message": {"content": content}}], "usage": usage}).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def peak_rss_mb(pid: int):
+    """
+    Peak resident set size of a process in MB (VmHWM on Linux, current RSS via psutil
+    elsewhere), or None if unavailable.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import psutil
+        return psutil.Process(pid).memory_info().rss / 2 ** 20
+    except Exception:
+        return None
+
+
+class ApiServer:
+    """
+    The FastAPI app in a uvicorn subprocess, with assets/ and kb/ under base_dir.
+    """
+
+    def __init__(self, app: str, base_dir: Path, llm_url: str, extra_env: dict, startup_timeout: float = 600):
+        self.port = _free_port()
+        self.url = f"http://127.0.0.1:{self.port}"
+        env = {
+            **os.environ,
+            "QA_BASE_DIR": str(base_dir),
+            "GROQ_BASE_URL": llm_url,
+            "GROQ_API_KEY": "bench",
+            "GEN_CACHE_SIZE": "0",
+            "GEN_CACHE_PATH": "",
+            **extra_env,
+        }
+        t0 = time.perf_counter()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--host", "127.0.0.1", "--port", str(self.port), "--log-level", "warning"],
+            env=env,
+        )
+        deadline = time.monotonic() + startup_timeout
+        self._wait_for("/health", deadline)
+        self.live_s = time.perf_counter() - t0
+        # Revisions without a readiness endpoint (404) load the model before /health answers.
+        self._wait_for("/ready", deadline, ok=(200, 404))
+        self.startup_s = time.perf_counter() - t0
+
+    def _wait_for(self, path: str, deadline: float, ok=(200,)):
+        while True:
+            if self.proc.poll() is not None:
+                raise RuntimeError(f"API server exited with code {self.proc.returncode}")
+            try:
+                status = httpx.get(f"{self.url}{path}", timeout=2).status_code
+                if status in ok:
+                    return
+                if status == 500:
+                    self.close()
+                    raise RuntimeError(f"API server failed to start: GET {path} returned 500")
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline:
+                self.close()
+                raise RuntimeError("API server did not start in time")
+            time.sleep(0.05)
+
+    def close(self):
+        self.proc.terminate()
+        try:
+            self.proc.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            self.proc.kill()
+
+
+def _percentiles(values_s) -> dict:
+    ms = np.array(values_s) * 1000 if len(values_s) else np.array([0.0])
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 2), "p99_ms": round(float(np.percentile(ms, 99)), 2)}
+
+
+def _server_timing(header: str) -> dict:
+    out = {}
+    for part in filter(None, (p.strip() for p in (header or "").split(","))):
+        name, _, dur = part.partition(";dur=")
+        if dur:
+            out[name] = float(dur) / 1000
+    return out
+
+
+def build_kb(client: httpx.Client, timeout: float = 3600) -> dict:
+    """
+    Run one /build_kb job to completion. Returns its final status and wall time.
+    """
+    t0 = time.perf_counter()
+    job = client.post("/build_kb").json()["job_id"]
+    deadline = time.monotonic() + timeout
+    while True:
+        status = client.get(f"/build_kb/{job}").json()
+        if status["status"] in ("succeeded", "failed", "cancelled"):
+            break
+        if time.monotonic() > deadline:
+            raise RuntimeError("KB build did not finish in time")
+        time.sleep(0.1)
+    if status["status"] != "succeeded":
+        raise RuntimeError(f"KB build {status['status']}: {status.get('error')}")
+    return {"wall_s": time.perf_counter() - t0, "result": status.get("result") or {}, "chunks": status["chunks_embedded"]}
+
+
+def _request_text(i: int) -> str:
+    rng = random.Random(i)
+    return f"Generate test cases for the {rng.choice(WORDS)} {rng.choice(WORDS)} flow, variant {i}"
+
+
+def sequential_queries(client: httpx.Client, n: int, top_k: int) -> dict:
+    totals, retrieve = [], []
+    for i in range(n):
+        t0 = time.perf_counter()
+        r = client.post("/generate_testcases", params={"top_k": top_k}, data={"user_request": _request_text(i)},
+                        headers={"X-Timing": "1", "X-LLM-Provider": "groq"})
+        totals.append(time.perf_counter() - t0)
+        r.raise_for_status()
+        retrieve.append(_server_timing(r.headers.get("server-timing")).get("retrieve", 0.0))
+    return {"requests": n, **_percentiles(totals), "retrieve": _percentiles(retrieve)}
+
+
+async def concurrent_queries(url: str, n: int, concurrency: int, top_k: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+
+    async with httpx.AsyncClient(base_url=url, timeout=600) as client:
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                t0 = time.perf_counter()
+                try:
+                    r = await client.post("/generate_testcases", params={"top_k": top_k},
+                                          data={"user_request": _request_text(10_000 + i)},
+                                          headers={"X-LLM-Provider": "groq"})
+                    r.raise_for_status()
+                    latencies.append(time.perf_counter() - t0)
+                except httpx.HTTPError:
+                    errors += 1
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(n)))
+        wall = time.perf_counter() - t0
+    return {
+        "requests": n,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_s": round(len(latencies) / wall, 2) if wall > 0 else 0.0,
+        **_percentiles(latencies),
+    }
+
+
+def run_scale(scale: str, args, stub: StubLLM, extra_env: dict) -> dict:
+    files_per_type, paragraphs = SCALES[scale]
+    base = Path(tempfile.mkdtemp(prefix=f"qa-bench-{scale}-"))
+    try:
+        corpus = write_corpus(base / "assets", files_per_type, paragraphs, seed=args.seed)
+        server = ApiServer(args.app, base, stub.url, extra_env)
+        try:
+            with httpx.Client(base_url=server.url, timeout=600) as client:
+                build = build_kb(client)
+                rebuild = build_kb(client)
+                stub.latency = 0.0
+                sequential = sequential_queries(client, args.queries, args.top_k)
+                stub.latency = args.llm_latency
+                concurrent = asyncio.run(concurrent_queries(server.url, args.requests, args.concurrency, args.top_k))
+            peak = peak_rss_mb(server.proc.pid)
+        finally:
+            server.close()
+        mb = corpus["bytes"] / 2 ** 20
+        return {
+            "scale": scale,
+            "corpus": {**corpus, "mb": round(mb, 2)},
+            "live_s": round(server.live_s, 2),
+            "startup_s": round(server.startup_s, 2),
+            "build": {
+                "wall_s": round(build["wall_s"], 2),
+                "chunks": build["chunks"],
+                "chunks_per_s": round(build["chunks"] / build["wall_s"], 1) if build["wall_s"] else None,
+                "mb_per_s": round(mb / build["wall_s"], 2) if build["wall_s"] else None,
+            },
+            "rebuild_noop_s": round(rebuild["wall_s"], 3),
+            "peak_rss_mb": round(peak, 1) if peak is not None else None,
+            "query_sequential": sequential,
+            "generate_concurrent": {**concurrent, "llm_latency_s": args.llm_latency},
+        }
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
+
+
+def _git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scales", nargs="+", default=["small", "medium"], choices=list(SCALES))
+    ap.add_argument("--app", default="backend.app.main:app", help="uvicorn import path of the API")
+    ap.add_argument("--queries", type=int, default=50, help="Sequential /generate_testcases requests")
+    ap.add_argument("--requests", type=int, default=100, help="Concurrent /generate_testcases requests")
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--top-k", type=int, default=5)
+    ap.add_argument("--llm-latency", type=float, default=0.5, help="Stub LLM latency (seconds) in the concurrent phase")
+    ap.add_argument("--llm-jitter", type=float, default=0.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE", help="Extra environment for the API server")
+    ap.add_argument("--out", default=None, help="Optional path to write all results as JSON")
+    args = ap.parse_args()
+
+    extra_env = dict(kv.split("=", 1) for kv in args.env)
+    stub = StubLLM(jitter=args.llm_jitter)
+    results = []
+    try:
+        for scale in args.scales:
+            results.append(run_scale(scale, args, stub, extra_env))
+            print(json.dumps(results[-1]), flush=True)
+    finally:
+        stub.close()
+
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "args": vars(args),
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
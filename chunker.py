@@ -0,0 +1,132 @@
+# backend/app/services/chunker.py
+
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# Separators per kind of text, most preferred first. The first `structural` ones mark
+# section boundaries (markdown headings, JSON keys as printed by json.dumps(indent=2)):
+# a chunk that is at least half full is closed there, and no overlap is carried into
+# the new section.
+SEPARATORS = {
+    "text": (["\n\n", "\n", ". ", " ", ""], 0),
+    "markdown": (["\n# ", "\n## ", "\n### ", "\n#### ", "\n\n", "\n", ". ", " ", ""], 4),
+    "json": (['\n  "', "\n  {", '\n    "', "\n    {", "\n", " ", ""], 4),
+}
+
+Atom = Tuple[int, int, int, int]  # (start, end, separator level it was cut at, length)
+
+
+def _cut_offset(sep: str) -> int:
+    """
+    Where to cut relative to a separator match: right after the leading newline(s) for
+    separators that introduce something (headings, keys), so it starts the next piece;
+    after the whole separator otherwise (sentence ends, blank lines, spaces).
+    """
+    body = sep.lstrip("\n")
+    return len(sep) - len(body) if body.strip() else len(sep)
+
+
+class Chunker:
+    """
+    Recursive splitter over character offsets: text is cut at the most preferred
+    separator that occurs, pieces that are still too long are cut at the next one, and
+    the resulting pieces are merged greedily into chunks of at most `chunk_size`, each
+    starting with up to `overlap` of the previous chunk's tail. Only spans are tracked
+    while splitting, so the only strings created are the chunks themselves, and every
+    chunk comes with its exact (start, end) offsets.
+    `length` measures a string (characters by default; pass a tokenizer-based counter
+    for token-aware sizing, with chunk_size and overlap in tokens).
+    """
+
+    def __init__(self, chunk_size: int = 800, overlap: int = 100, kind: str = "text",
+                 length: Optional[Callable[[str], int]] = None):
+        if overlap >= chunk_size:
+            raise ValueError("overlap must be smaller than chunk_size")
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.separators, self.structural = SEPARATORS.get(kind, SEPARATORS["text"])
+        self.length = length
+
+    def _len(self, text: str, start: int, end: int) -> int:
+        if self.length is None:
+            return end - start
+        return self.length(text[start:end])
+
+    def _atoms(self, text: str, start: int, end: int, level: int, depth: int, out: List[Atom]):
+        size = end - start
+        # Tokens never outnumber characters for the tokenizers used here, so spans
+        # short in characters need no tokenizer call.
+        if size <= self.chunk_size or (self.length is not None and self._len(text, start, end) <= self.chunk_size):
+            out.append((start, end, level, size if self.length is None else -1))
+            return
+        for d in range(depth, len(self.separators)):
+            sep = self.separators[d]
+            if sep == "":
+                for s in range(start, end, self.chunk_size):
+                    out.append((s, min(s + self.chunk_size, end), level if s == start else d, -1))
+                return
+            cut = _cut_offset(sep)
+            cuts = []
+            i = text.find(sep, start, end)
+            while i >= 0:
+                if start < i + cut < end:
+                    cuts.append(i + cut)
+                i = text.find(sep, i + len(sep), end)
+            if not cuts:
+                continue
+            prev, prev_level = start, level
+            for c in cuts + [end]:
+                if c - prev <= self.chunk_size:
+                    out.append((prev, c, prev_level, c - prev if self.length is None else -1))
+                else:
+                    self._atoms(text, prev, c, prev_level, d + 1, out)
+                prev, prev_level = c, d
+            return
+        out.append((start, end, level, -1))
+
+    def _emit(self, text: str, members: List[Atom]) -> Optional[Tuple[str, int, int]]:
+        start, end = members[0][0], members[-1][1]
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start == end:
+            return None
+        return text[start:end], start, end
+
+    def iter_chunks(self, text: str) -> Iterator[Tuple[str, int, int]]:
+        """
+        Yield (chunk, char_start, char_end) for text, in order.
+        """
+        atoms: List[Atom] = []
+        self._atoms(text, 0, len(text), len(self.separators), 0, atoms)
+        members: List[Atom] = []
+        total = 0
+        for start, end, level, n in atoms:
+            n = n if n >= 0 else self._len(text, start, end)
+            section = level < self.structural
+            if members and (total + n > self.chunk_size or (section and total * 2 >= self.chunk_size)):
+                chunk = self._emit(text, members)
+                if chunk is not None:
+                    yield chunk
+                if section:
+                    members, total = [], 0
+                while members and (total > self.overlap or total + n > self.chunk_size):
+                    total -= members.pop(0)[3]
+            members.append((start, end, level, n))
+            total += n
+        if members:
+            chunk = self._emit(text, members)
+            if chunk is not None:
+                yield chunk
+
+
+def kind_for(filename: str) -> str:
+    """
+    Chunking kind for a file name: markdown, json or plain text.
+    """
+    name = filename.lower()
+    if name.endswith((".md", ".markdown")):
+        return "markdown"
+    if name.endswith(".json"):
+        return "json"
+    return "text"
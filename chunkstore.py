@@ -0,0 +1,190 @@
+# backend/app/services/chunkstore.py
+
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+CHUNKS_META_FILE = "chunks.json"
+COMPACT_MIN_DEAD_BYTES = 1 << 20
+
+
+class ChunkStore:
+    """
+    Full chunk texts by vector id, kept out of the Python heap.
+    Texts are appended as UTF-8 to a generation data file (chunks-<gen>.bin) and
+    located through an (id, offset, length) index sorted by id, saved as .npy and
+    memory-mapped on load. Copies share the data file (appends never move existing
+    bytes), so a build can add to a copy while the live store keeps serving reads.
+    save() compacts into a new generation once most of the data file is dead.
+    """
+
+    def __init__(self, directory: Path, generation: int = 0, index: np.ndarray = None):
+        self.directory = Path(directory)
+        self.generation = generation
+        self._index = index if index is not None else np.empty((0, 3), dtype=np.int64)
+        self._added: Dict[int, tuple] = {}  # id -> (offset, length), not merged into _index yet
+        self._removed = set()
+        self._map = None
+        self._lock = threading.Lock()
+
+    def _data_path(self, generation: int = None) -> Path:
+        return self.directory / f"chunks-{self.generation if generation is None else generation}.bin"
+
+    def _index_path(self) -> Path:
+        return self.directory / f"chunks-{self.generation}.idx.npy"
+
+    def _locate(self, vid: int):
+        if vid in self._added:
+            return self._added[vid]
+        if vid in self._removed or not len(self._index):
+            return None
+        pos = int(np.searchsorted(self._index[:, 0], vid))
+        if pos < len(self._index) and self._index[pos, 0] == vid:
+            return int(self._index[pos, 1]), int(self._index[pos, 2])
+        return None
+
+    def _read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            if self._map is None or offset + length > len(self._map):
+                # First read, or the file grew since it was mapped.
+                if self._map is not None:
+                    self._map.close()
+                with self._data_path().open("rb") as f:
+                    self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            return self._map[offset:offset + length]
+
+    def get(self, vid: int):
+        """
+        Full text of one chunk, or None if the id is unknown.
+        """
+        return self.get_many([vid]).get(vid)
+
+    def get_many(self, ids: Iterable[int]) -> Dict[int, str]:
+        """
+        Full texts for the given ids; unknown ids are left out.
+        """
+        out = {}
+        for vid in ids:
+            loc = self._locate(int(vid))
+            if loc is not None:
+                out[int(vid)] = self._read(*loc).decode("utf-8")
+        return out
+
+    def add(self, ids: List[int], texts: List[str]):
+        """
+        Append texts for ids (an existing id is replaced).
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._data_path().open("ab") as f:
+            offset = f.tell()
+            for vid, text in zip(ids, texts):
+                data = text.encode("utf-8")
+                f.write(data)
+                if self._locate(int(vid)) is not None and int(vid) not in self._added:
+                    self._removed.add(int(vid))
+                self._added[int(vid)] = (offset, len(data))
+                offset += len(data)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """
+        Drop ids from the index; their bytes become dead until the next compaction.
+        """
+        removed = 0
+        for vid in ids:
+            vid = int(vid)
+            if self._added.pop(vid, None) is not None:
+                removed += 1
+            elif self._locate(vid) is not None:
+                self._removed.add(vid)
+                removed += 1
+        return removed
+
+    def _materialize(self) -> np.ndarray:
+        index = np.asarray(self._index)
+        if self._removed:
+            index = index[~np.isin(index[:, 0], np.fromiter(self._removed, dtype=np.int64))]
+        if self._added:
+            added = np.array([(vid, off, ln) for vid, (off, ln) in self._added.items()], dtype=np.int64)
+            index = np.concatenate([index, added])
+            index = index[np.argsort(index[:, 0], kind="stable")]
+        return np.array(index, dtype=np.int64)
+
+    def copy(self) -> "ChunkStore":
+        """
+        Independent index over the same data file, for copy-on-write builds.
+        """
+        return ChunkStore(self.directory, self.generation, self._materialize())
+
+    def count(self) -> int:
+        return len(self._index) - len(self._removed) + len(self._added)
+
+    def save(self):
+        """
+        Persist the index (written to a temporary and renamed into place). Compacts the
+        data file into a new generation first when dead bytes outweigh live ones. The
+        previous generation is kept for readers that still use it; older ones are deleted.
+        """
+        self._index, self._added, self._removed = self._materialize(), {}, set()
+        data_path = self._data_path()
+        size = data_path.stat().st_size if data_path.exists() else 0
+        live = int(self._index[:, 2].sum()) if len(self._index) else 0
+        if size - live > max(live, COMPACT_MIN_DEAD_BYTES):
+            self._compact()
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        index_path = self._index_path()
+        tmp_index = self.directory / "chunks.idx.tmp.npy"
+        np.save(tmp_index, self._index)
+        os.replace(tmp_index, index_path)
+        meta_path = self.directory / CHUNKS_META_FILE
+        tmp_meta = meta_path.with_suffix(".tmp")
+        with tmp_meta.open("w", encoding="utf-8") as f:
+            json.dump({"generation": self.generation, "count": len(self._index)}, f)
+        os.replace(tmp_meta, meta_path)
+
+        for path in self.directory.glob("chunks-*"):
+            gen = path.name.split("-", 1)[1].split(".", 1)[0]
+            if gen.isdigit() and int(gen) < self.generation - 1:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _compact(self):
+        """
+        Rewrite live texts in id order into the next generation's data file.
+        """
+        new_path = self._data_path(self.generation + 1)
+        new_index = self._index.copy()
+        offset = 0
+        with new_path.open("wb") as f:
+            for row in new_index:
+                data = self._read(int(row[1]), int(row[2]))
+                f.write(data)
+                row[1] = offset
+                offset += len(data)
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+        self.generation += 1
+        self._index = new_index
+
+    @classmethod
+    def load(cls, directory: Path) -> "ChunkStore":
+        """
+        Load a store saved with `save`, memory-mapping its index.
+        Raises FileNotFoundError if no saved store exists.
+        """
+        directory = Path(directory)
+        with (directory / CHUNKS_META_FILE).open("r", encoding="utf-8") as f:
+            meta = json.load(f)
+        store = cls(directory, generation=meta["generation"])
+        index = np.load(store._index_path(), mmap_mode="r")
+        store._index = index if len(index) else np.empty((0, 3), dtype=np.int64)
+        return store
@@ -0,0 +1,160 @@
+# backend/app/services/dedup.py
+
+import hashlib
+import os
+import re
+import zlib
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+DEDUP_FILE = "dedup.npz"
+MODES = ["minhash", "exact", "off"]
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands of 4 rows: pairs at Jaccard 0.8 become candidates with p > 0.999
+SHINGLE = 3  # words per shingle
+_SEED = 1234
+
+_rng = np.random.RandomState(_SEED)
+# Multiply-shift hashing: (a * x + b) mod 2**64, keeping the high 32 bits.
+_A = _rng.randint(1, 2 ** 32, size=NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_B = _rng.randint(0, 2 ** 32, size=NUM_PERM, dtype=np.uint64)
+_WORD = re.compile(r"\w+")
+
+Signature = Tuple[int, Optional[np.ndarray]]  # (exact digest, MinHash signature or None)
+
+
+def signature(text: str, near: bool = True) -> Signature:
+    """
+    Exact digest of the case- and whitespace-normalized text and, if near, the MinHash
+    signature of its word 3-shingles. Pure function of the text, so it can run on the
+    parse/prefetch thread.
+    """
+    normalized = " ".join(text.lower().split())
+    digest = int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little", signed=True)
+    if not near:
+        return digest, None
+    words = _WORD.findall(normalized)
+    shingles = {" ".join(words[i:i + SHINGLE]) for i in range(max(1, len(words) - SHINGLE + 1))}
+    x = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    with np.errstate(over="ignore"):
+        hashed = (_A[:, None] * x[None, :] + _B[:, None]) >> np.uint64(32)
+    return digest, hashed.min(axis=1).astype(np.uint32)
+
+
+class DedupIndex:
+    """
+    Finds chunks that duplicate one already in the knowledge base, keyed by the same
+    int64 ids as the vector store: exact matches by digest, near matches (mode
+    "minhash") by locality-sensitive hashing over MinHash signatures, confirmed when
+    the estimated Jaccard similarity of the word 3-shingles is at least `threshold`.
+    copy() is cheap (bucket tuples are shared), so a build can update a copy while the
+    live index is left alone.
+    """
+
+    def __init__(self, threshold: float = 0.85, near: bool = True):
+        self.threshold = threshold
+        self.near = near
+        self._digests: Dict[int, int] = {}  # digest -> id
+        self._sigs: Dict[int, Optional[np.ndarray]] = {}  # id -> signature
+        self._ids_digest: Dict[int, int] = {}  # id -> digest
+        self._buckets: Dict[Tuple[int, bytes], tuple] = {}  # (band, rows) -> ids; removed ids linger until reload
+
+    def _bands(self, sig: np.ndarray) -> Iterable[Tuple[int, bytes]]:
+        rows = NUM_PERM // BANDS
+        for band in range(BANDS):
+            yield band, sig[band * rows:(band + 1) * rows].tobytes()
+
+    def find(self, sig: Signature) -> Optional[int]:
+        """
+        Id of the stored chunk this signature duplicates (exact match first, else the
+        most similar near match), or None.
+        """
+        digest, minhash = sig
+        vid = self._digests.get(digest)
+        if vid is not None or minhash is None or not self.near:
+            return vid
+        best, best_sim = None, self.threshold
+        seen = set()
+        for key in self._bands(minhash):
+            for cand in self._buckets.get(key, ()):
+                if cand in seen or cand not in self._sigs:
+                    continue
+                seen.add(cand)
+                sim = float(np.mean(self._sigs[cand] == minhash))
+                if sim >= best_sim:
+                    best, best_sim = cand, sim
+        return best
+
+    def add(self, vid: int, sig: Signature):
+        digest, minhash = sig
+        self._digests.setdefault(digest, vid)
+        self._ids_digest[vid] = digest
+        self._sigs[vid] = minhash
+        if minhash is not None and self.near:
+            for key in self._bands(minhash):
+                self._buckets[key] = self._buckets.get(key, ()) + (vid,)
+
+    def remove(self, ids: Iterable[int]):
+        for vid in ids:
+            digest = self._ids_digest.pop(vid, None)
+            self._sigs.pop(vid, None)
+            if digest is not None and self._digests.get(digest) == vid:
+                del self._digests[digest]
+
+    def copy(self) -> "DedupIndex":
+        other = DedupIndex(self.threshold, self.near)
+        other._digests = dict(self._digests)
+        other._sigs = dict(self._sigs)
+        other._ids_digest = dict(self._ids_digest)
+        other._buckets = dict(self._buckets)
+        return other
+
+    def count(self) -> int:
+        return len(self._ids_digest)
+
+    @classmethod
+    def from_texts(cls, texts: Dict[int, str], threshold: float = 0.85, near: bool = True) -> "DedupIndex":
+        """
+        Index existing chunks (id -> text), e.g. a KB saved without a dedup index.
+        """
+        index = cls(threshold, near)
+        for vid in sorted(texts):
+            index.add(vid, signature(texts[vid], near))
+        return index
+
+    def save(self, directory: Path):
+        """
+        Persist ids, digests and signatures (LSH buckets are rebuilt on load).
+        Written to a temporary and renamed into place.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        ids = np.array(sorted(self._ids_digest), dtype="int64")
+        digests = np.array([self._ids_digest[i] for i in ids], dtype="int64")
+        if self.near:
+            sigs = np.stack([self._sigs[i] for i in ids]) if len(ids) else np.zeros((0, NUM_PERM), dtype="uint32")
+        else:
+            sigs = np.zeros((0, NUM_PERM), dtype="uint32")
+        path = directory / DEDUP_FILE
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("wb") as f:
+            np.savez(f, ids=ids, digests=digests, sigs=sigs, near=np.array(self.near))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory: Path, threshold: float = 0.85, near: bool = True) -> "DedupIndex":
+        """
+        Load an index saved with `save`. Raises FileNotFoundError if none exists and
+        ValueError if it was saved without signatures but near matching is wanted.
+        """
+        with np.load(Path(directory) / DEDUP_FILE) as data:
+            ids, digests, sigs, saved_near = data["ids"], data["digests"], data["sigs"], bool(data["near"])
+        if near and not saved_near:
+            raise ValueError("dedup index was saved without MinHash signatures")
+        index = cls(threshold, near)
+        for row, (vid, digest) in enumerate(zip(ids.tolist(), digests.tolist())):
+            index.add(vid, (digest, sigs[row] if near else None))
+        return index
@@ -0,0 +1,214 @@
+# backend/app/services/embedding_cache.py
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from . import metrics
+from .state_store import FileLock
+
+KEY_SIZE = 20  # sha1 digest length
+
+
+def cache_key(model_name: str, text: str) -> bytes:
+    """
+    Cache key for a text embedded by a given model: sha1(model_name + NUL + text).
+    """
+    return hashlib.sha1(model_name.encode("utf-8") + b"\0" + text.encode("utf-8")).digest()
+
+
+class DiskEmbeddingTier:
+    """
+    Append-only on-disk embedding store for a single model.
+    - vectors.f32: float32 rows, read through a memory map
+    - keys.bin:    KEY_SIZE-byte keys, row i of keys.bin belongs to row i of vectors.f32
+    The key -> row index is built in memory on open and extended with rows other
+    processes appended (several workers may share the directory): appends take a
+    lock file and first catch up on keys.bin, and every read checks the row's stored
+    key, so a row is never returned for a key it does not belong to. Thread-safe; the
+    in-memory index is never held while waiting for the lock file.
+    """
+
+    def __init__(self, directory: Path, dim: int):
+        self.dim = dim
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.vectors_path = self.directory / "vectors.f32"
+        self.keys_path = self.directory / "keys.bin"
+        self.lock_path = self.directory / "append.lock"
+        self.rows: Dict[bytes, int] = {}
+        self._n = 0
+        self._mm: Optional[np.memmap] = None
+        self._keys_mm: Optional[np.memmap] = None
+        self._lock = threading.Lock()  # guards rows, _n and the memory maps
+
+        with FileLock(self.lock_path):
+            self.vectors_path.touch(exist_ok=True)
+            self.keys_path.touch(exist_ok=True)
+            row_bytes = 4 * dim
+            n = min(self.vectors_path.stat().st_size // row_bytes, self.keys_path.stat().st_size // KEY_SIZE)
+            # Drop a torn tail left by an interrupted append.
+            if self.vectors_path.stat().st_size != n * row_bytes:
+                with self.vectors_path.open("r+b") as f:
+                    f.truncate(n * row_bytes)
+            if self.keys_path.stat().st_size != n * KEY_SIZE:
+                with self.keys_path.open("r+b") as f:
+                    f.truncate(n * KEY_SIZE)
+            self._sync()
+
+    def _sync(self):
+        """
+        Index rows appended since the last sync (by this or another process).
+        Only rows whose key and vector are both complete are picked up. Caller holds _lock.
+        """
+        n = min(self.vectors_path.stat().st_size // (4 * self.dim), self.keys_path.stat().st_size // KEY_SIZE)
+        if n <= self._n:
+            return
+        with self.keys_path.open("rb") as f:
+            f.seek(self._n * KEY_SIZE)
+            keys = f.read((n - self._n) * KEY_SIZE)
+        for i in range(n - self._n):
+            self.rows.setdefault(keys[i * KEY_SIZE:(i + 1) * KEY_SIZE], self._n + i)
+        self._n = n
+
+    def _mapped(self):
+        """
+        Memory maps over all rows written so far (vectors, keys), remapped after appends.
+        """
+        if self._mm is None or len(self._mm) < self._n:
+            self._mm = np.memmap(self.vectors_path, dtype="float32", mode="r", shape=(self._n, self.dim))
+            self._keys_mm = np.memmap(self.keys_path, dtype="uint8", mode="r", shape=(self._n, KEY_SIZE))
+        return self._mm, self._keys_mm
+
+    def get(self, key: bytes) -> Optional[np.ndarray]:
+        """
+        Return a copy of the stored vector for key, or None.
+        """
+        with self._lock:
+            row = self.rows.get(key)
+            if row is None:
+                self._sync()
+                row = self.rows.get(key)
+                if row is None:
+                    return None
+            vectors, keys = self._mapped()
+            if keys[row].tobytes() != key:
+                return None
+            return np.array(vectors[row])
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """
+        Append vectors for keys that are not stored yet.
+        """
+        if all(k in self.rows for k in keys):
+            return
+        with FileLock(self.lock_path):
+            with self._lock:
+                self._sync()
+                new, seen = [], set()
+                for k, v in zip(keys, vectors):
+                    if k not in self.rows and k not in seen:
+                        seen.add(k)
+                        new.append((k, v))
+            if not new:
+                return
+            block = np.ascontiguousarray(np.vstack([v for _, v in new]), dtype="float32")
+            # Vectors first: a reader only picks up rows that have both a key and a vector.
+            with self.vectors_path.open("ab") as f:
+                f.write(block.tobytes())
+            with self.keys_path.open("ab") as f:
+                f.write(b"".join(k for k, _ in new))
+            with self._lock:
+                self._sync()
+
+    def nbytes(self) -> int:
+        """
+        Bytes used on disk by vectors and keys.
+        """
+        return self._n * (4 * self.dim + KEY_SIZE)
+
+
+class EmbeddingCache:
+    """
+    Two-tier embedding cache keyed by model name + text hash.
+    - Memory tier: LRU of up to max_entries vectors
+    - Disk tier (optional): DiskEmbeddingTier under cache_dir/<model name>
+    Thread-safe.
+    """
+
+    def __init__(self, model_name: str, dim: int, max_entries: int = 10000, cache_dir: Optional[Path] = None):
+        self.model_name = model_name
+        self.dim = dim
+        self.max_entries = max_entries
+        self._lru: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk = None
+        if cache_dir is not None:
+            safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+            self.disk = DiskEmbeddingTier(Path(cache_dir) / safe_name, dim)
+
+    def get_many(self, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """
+        Look up vectors for keys; None for misses. Disk hits are promoted to memory.
+        """
+        out = []
+        with self._lock:
+            for k in keys:
+                vec = self._lru.get(k)
+                if vec is not None:
+                    self._lru.move_to_end(k)
+                elif self.disk is not None:
+                    vec = self.disk.get(k)
+                    if vec is not None:
+                        self._remember(k, vec)
+                if vec is None:
+                    self.misses += 1
+                else:
+                    self.hits += 1
+                out.append(vec)
+        misses = sum(v is None for v in out)
+        if misses:
+            metrics.CACHE_REQUESTS.inc(misses, cache="embedding", result="miss")
+        if len(out) > misses:
+            metrics.CACHE_REQUESTS.inc(len(out) - misses, cache="embedding", result="hit")
+        return out
+
+    def put_many(self, keys: List[bytes], vectors: np.ndarray):
+        """
+        Store freshly computed vectors in both tiers. The disk write happens after the
+        memory tier's lock is released, so lookups never wait on another worker's append.
+        """
+        with self._lock:
+            for k, v in zip(keys, vectors):
+                self._remember(k, np.asarray(v, dtype="float32"))
+        if self.disk is not None:
+            self.disk.put_many(keys, vectors)
+
+    def _remember(self, key: bytes, vec: np.ndarray):
+        self._lru[key] = vec
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.max_entries:
+            self._lru.popitem(last=False)
+
+    def stats(self) -> dict:
+        """
+        Hit rate and memory/disk usage, for /health.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._lru),
+                "memory_bytes": len(self._lru) * (4 * self.dim + KEY_SIZE),
+                "disk_entries": len(self.disk.rows) if self.disk else 0,
+                "disk_bytes": self.disk.nbytes() if self.disk else 0,
+            }
@@ -1,27 +1,105 @@
-
-
-from sentence_transformers import SentenceTransformer
-from typing import List
-import numpy as np
-
-
-class EmbeddingModel:
-    """
-    Wrapper around a free HuggingFace sentence-transformer model.
-    Used for generating embeddings for documents and queries.
-    """
-
-    def __init__(self, model_name: str = "sentence-transformers/all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
-
-    def embed(self, texts: List[str]) -> np.ndarray:
-        """
-        Returns numpy embeddings for a list of strings.
-        """
-        return self.model.encode(texts, convert_to_numpy=True)
-
-    def embed_one(self, text: str) -> np.ndarray:
-        """
-        Convenience wrapper to embed a single string.
-        """
-        return self.model.encode([text], convert_to_numpy=True)[0]
+
+
+from pathlib import Path
+from typing import TYPE_CHECKING, List, Optional
+import numpy as np
+
+from . import metrics
+from .embedding_cache import EmbeddingCache, cache_key
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+BACKENDS = ["torch", "int8", "onnx"]
+
+
+def load_model(model_name: str, backend: str = "torch", onnx_file: Optional[str] = None) -> "SentenceTransformer":
+    """
+    Load a sentence-transformer on the CPU with the given inference backend:
+      - torch: the full-precision PyTorch model
+      - int8:  PyTorch with Linear layers dynamically quantized to int8
+      - onnx:  ONNX Runtime (needs `sentence-transformers[onnx]`); onnx_file picks an
+               exported variant from the model repo, e.g. "onnx/model_qint8_avx2.onnx"
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown embedding backend {backend!r}, expected one of {BACKENDS}")
+    # sentence-transformers pulls in torch and transformers (seconds of import time),
+    # so it is imported on first load rather than when this module is.
+    from sentence_transformers import SentenceTransformer
+
+    if backend == "onnx":
+        model_kwargs = {"file_name": onnx_file} if onnx_file else None
+        return SentenceTransformer(model_name, device="cpu", backend="onnx", model_kwargs=model_kwargs)
+    model = SentenceTransformer(model_name)
+    if backend == "int8":
+        import torch
+        model = torch.quantization.quantize_dynamic(model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8)
+    return model
+
+
+class EmbeddingModel:
+    """
+    Wrapper around a free HuggingFace sentence-transformer model.
+    Used for generating embeddings for documents and queries.
+    Embeddings are cached (LRU in memory, optionally on disk), so only
+    texts that were never seen before are sent to the model.
+    Backends other than torch produce slightly different vectors, so they get their
+    own model_id, which keys the cache and the build manifest.
+    """
+
+    def __init__(
+        self,
+        model_name: str = "sentence-transformers/all-MiniLM-L6-v2",
+        cache_size: int = 10000,
+        cache_dir: Optional[Path] = None,
+        backend: str = "torch",
+        onnx_file: Optional[str] = None,
+    ):
+        self.model_name = model_name
+        self.backend = backend
+        self.model = load_model(model_name, backend, onnx_file)
+        self.model_id = model_name if backend == "torch" else f"{model_name}#{onnx_file or backend}"
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.cache = EmbeddingCache(self.model_id, self.dim, max_entries=cache_size, cache_dir=cache_dir)
+
+    @metrics.timed("embed")
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Returns numpy embeddings (float32, shape (len(texts), dim)) for a list of strings.
+        Cache misses are deduplicated and encoded in a single batch.
+        """
+        keys = [cache_key(self.model_id, t) for t in texts]
+        cached = self.cache.get_many(keys)
+
+        missing = {}
+        for k, t, vec in zip(keys, texts, cached):
+            if vec is None and k not in missing:
+                missing[k] = t
+        if missing:
+            fresh = self.encode(list(missing.values()))
+            self.cache.put_many(list(missing.keys()), fresh)
+            computed = dict(zip(missing.keys(), fresh))
+            cached = [vec if vec is not None else computed[k] for k, vec in zip(keys, cached)]
+
+        if not cached:
+            return np.empty((0, self.dim), dtype="float32")
+        return np.vstack(cached).astype("float32", copy=False)
+
+    def count_tokens(self, text: str) -> int:
+        """
+        Number of tokens the model's tokenizer produces for text (without special tokens).
+        """
+        return len(self.model.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    @metrics.timed("embed_model")
+    def encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Run the model on texts, bypassing the cache.
+        """
+        return self.model.encode(texts, convert_to_numpy=True).astype("float32")
+
+    def embed_one(self, text: str) -> np.ndarray:
+        """
+        Convenience wrapper to embed a single string.
+        """
+        return self.embed([text])[0]
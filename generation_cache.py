@@ -0,0 +1,213 @@
+# backend/app/services/generation_cache.py
+
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional
+
+from . import metrics
+from .state_store import FileLock
+
+
+def generation_key(provider: str, model: str, temperature, system_prompt: str, user_prompt: str) -> str:
+    """
+    Cache key for one LLM call: provider, model, temperature and a hash of both prompts.
+    """
+    h = hashlib.sha256()
+    for part in (provider, model, repr(temperature), system_prompt, user_prompt):
+        h.update(str(part).encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class GenerationCache:
+    """
+    LRU cache of LLM responses with TTL and entry-count eviction.
+    With a path, entries are also appended to a JSON-lines log that is replayed on
+    startup and compacted when it grows past twice the live entries. Several workers
+    may share the log: appends and compactions hold a lock file next to it, and a
+    compaction keeps the live entries other workers appended. Log writes happen on a
+    background thread, so put() never waits on the lock file or a compaction; flush()
+    waits for them.
+    Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 24 * 3600, path: Optional[Path] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, text)
+        self._lock = threading.Lock()
+        self._log_lines = 0
+        self._file_lock = FileLock(Path(f"{self.path}.lock")) if self.path else None
+        self.hits = 0
+        self.misses = 0
+        self._writes: "queue.Queue" = queue.Queue()  # log records to append, or None to truncate
+        if self.path is not None:
+            self._replay()
+            threading.Thread(target=self._writer, name="qa-gen-cache-writer", daemon=True).start()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        Return the cached response for key, or None if missing or expired.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.time():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                metrics.CACHE_REQUESTS.inc(cache="generation", result="miss")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        metrics.CACHE_REQUESTS.inc(cache="generation", result="hit")
+        return entry[1]
+
+    def put(self, key: str, text: str):
+        """
+        Store a response. Empty responses are not cached.
+        """
+        if not text:
+            return
+        expires_at = time.time() + self.ttl_seconds
+        with self._lock:
+            self._entries[key] = (expires_at, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        if self.path is not None:
+            self._writes.put({"k": key, "e": expires_at, "t": text})
+
+    def clear(self):
+        """
+        Drop every entry (and truncate the log).
+        """
+        with self._lock:
+            self._entries.clear()
+        if self.path is not None:
+            self._writes.put(None)
+            self.flush()
+
+    def flush(self):
+        """
+        Wait until every queued log write has reached the disk.
+        """
+        if self.path is not None:
+            self._writes.join()
+
+    def stats(self) -> dict:
+        """
+        Hit/miss counts and size, for /health.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def _read_log(self) -> "OrderedDict[str, tuple]":
+        """
+        Unexpired entries in the log, oldest first; also counts its lines.
+        """
+        entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._log_lines = 0
+        if not self.path.exists():
+            return entries
+        now = time.time()
+        with self.path.open("r", encoding="utf-8") as f:
+            for line in f:
+                self._log_lines += 1
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+                if rec["e"] >= now:
+                    entries[rec["k"]] = (rec["e"], rec["t"])
+                    entries.move_to_end(rec["k"])
+        return entries
+
+    def _replay(self):
+        with self._file_lock:
+            self._entries = self._read_log()
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _writer(self):
+        """
+        Background thread: append queued records to the log in batches, compacting it
+        when it has grown past twice the live entries.
+        """
+        while True:
+            batch = [self._writes.get()]
+            while True:
+                try:
+                    batch.append(self._writes.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(batch)
+            except OSError as e:
+                print(f"Generation cache log write failed: {e}")
+            finally:
+                for _ in batch:
+                    self._writes.task_done()
+
+    def _write(self, batch: list):
+        # A None (from clear) truncates the log, dropping the records queued before it.
+        if None in batch:
+            last = len(batch) - 1 - batch[::-1].index(None)
+            batch = batch[last + 1:]
+            with self._file_lock:
+                self._rewrite(OrderedDict(), merge=False)
+        if not batch:
+            return
+        with self._file_lock:
+            with self.path.open("a", encoding="utf-8") as f:
+                f.writelines(json.dumps(rec, separators=(",", ":")) + "\n" for rec in batch)
+            self._log_lines += len(batch)
+            if self._log_lines > 2 * max(len(self._entries), 1) + 100:
+                with self._lock:
+                    live = OrderedDict(self._entries)
+                self._rewrite(live)
+
+    def _rewrite(self, live: "OrderedDict[str, tuple]", merge: bool = True):
+        """
+        Compact the log to the live entries (a snapshot of this process's cache). Caller
+        holds the file lock. With merge, entries other workers appended since this
+        process last read the log are kept.
+        """
+        entries = self._read_log() if merge else OrderedDict()
+        for k, v in live.items():
+            entries[k] = v
+            entries.move_to_end(k)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+        tmp = Path(f"{self.path}.{os.getpid()}.tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            for k, (e, t) in entries.items():
+                f.write(json.dumps({"k": k, "e": e, "t": t}, separators=(",", ":")) + "\n")
+        os.replace(tmp, self.path)
+        self._log_lines = len(entries)
+
+
+# Shared by rag_agent and selenium_builder; main calls configure() at startup.
+GENERATION_CACHE = GenerationCache()
+
+
+def configure(max_entries: int, ttl_seconds: float, path: Optional[Path] = None) -> GenerationCache:
+    """
+    Replace the shared cache with one built from the given settings.
+    """
+    global GENERATION_CACHE
+    GENERATION_CACHE = GenerationCache(max_entries=max_entries, ttl_seconds=ttl_seconds, path=path)
+    return GENERATION_CACHE
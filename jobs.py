@@ -0,0 +1,186 @@
+# backend/app/services/jobs.py
+
+import threading
+import time
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional, Dict, Any
+
+
+class JobCancelled(Exception):
+    """
+    Raised inside a job function when cancellation was requested.
+    """
+
+
+class BuildJob:
+    """
+    Progress and status of one knowledge-base build.
+    Status moves queued -> running -> succeeded | failed | cancelled.
+    Counters are updated by the build function and read by the status endpoint.
+    """
+
+    def __init__(self):
+        self.id = str(uuid.uuid4())
+        self.status = "queued"
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.files_total = 0
+        self.files_parsed = 0
+        self.chunks_total = 0
+        self.chunks_embedded = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+        # Set by the JobManager in shared-state mode: cancel requests from other
+        # workers, and publishing progress where other workers can read it.
+        self._cancel_probe: Optional[Callable[[str], bool]] = None
+        self._on_checkpoint: Optional[Callable[["BuildJob"], None]] = None
+
+    def cancel(self):
+        """
+        Request cancellation; the build stops at its next checkpoint.
+        """
+        self._cancel.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    def check_cancelled(self):
+        """
+        Checkpoint for the build function: raise JobCancelled if cancellation was requested.
+        """
+        if not self._cancel.is_set() and self._cancel_probe is not None and self._cancel_probe(self.id):
+            self._cancel.set()
+        if self._on_checkpoint is not None:
+            self._on_checkpoint(self)
+        if self._cancel.is_set():
+            raise JobCancelled()
+
+    def update(self, **counters):
+        """
+        Set counters, e.g. update(files_total=10).
+        """
+        with self._lock:
+            for k, v in counters.items():
+                setattr(self, k, v)
+
+    def incr(self, **counters):
+        """
+        Increment counters, e.g. incr(chunks_embedded=64).
+        """
+        with self._lock:
+            for k, v in counters.items():
+                setattr(self, k, getattr(self, k) + v)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Snapshot including derived throughput (chunks/sec) and ETA in seconds.
+        The ETA extrapolates chunks for files not parsed yet from the average so far.
+        """
+        with self._lock:
+            now = self.finished_at or time.time()
+            elapsed = (now - self.started_at) if self.started_at else 0.0
+            rate = self.chunks_embedded / elapsed if elapsed > 0 else 0.0
+            eta = None
+            if self.status == "running" and rate > 0:
+                expected = self.chunks_total
+                if self.files_parsed and self.files_total > self.files_parsed:
+                    expected += (self.chunks_total / self.files_parsed) * (self.files_total - self.files_parsed)
+                eta = round(max(0.0, expected - self.chunks_embedded) / rate, 1)
+            return {
+                "job_id": self.id,
+                "status": self.status,
+                "cancel_requested": self._cancel.is_set(),
+                "files_total": self.files_total,
+                "files_parsed": self.files_parsed,
+                "chunks_total": self.chunks_total,
+                "chunks_embedded": self.chunks_embedded,
+                "chunks_per_sec": round(rate, 1),
+                "eta_seconds": eta,
+                "elapsed_seconds": round(elapsed, 1),
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Runs build jobs one at a time on a dedicated worker thread and keeps
+    the most recent `max_history` jobs for status polling.
+    With `publish`, job snapshots are passed to it on every status change and at most
+    every `publish_interval` seconds from build checkpoints; with `cancel_probe`, a
+    running job also stops when cancel_probe(job_id) returns True.
+    """
+
+    def __init__(
+        self,
+        max_history: int = 50,
+        publish: Optional[Callable[[Dict[str, Any]], None]] = None,
+        cancel_probe: Optional[Callable[[str], bool]] = None,
+        publish_interval: float = 0.5,
+    ):
+        self.max_history = max_history
+        self.publish = publish
+        self.cancel_probe = cancel_probe
+        self.publish_interval = publish_interval
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="kb-build")
+        self._jobs: "OrderedDict[str, BuildJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._published_at: Dict[str, float] = {}
+
+    def _publish(self, job: BuildJob, force: bool = True):
+        if self.publish is None:
+            return
+        now = time.monotonic()
+        if force or now - self._published_at.get(job.id, 0.0) >= self.publish_interval:
+            self._published_at[job.id] = now
+            try:
+                self.publish(job.to_dict())
+            except Exception as e:
+                print("Failed to publish build job status:", e)
+
+    def submit(self, fn: Callable[[BuildJob], Dict[str, Any]]) -> BuildJob:
+        """
+        Queue fn(job). If a job is already queued and not started, that job is returned
+        instead, since it will pick up the same assets.
+        """
+        with self._lock:
+            for job in self._jobs.values():
+                if job.status == "queued" and not job.cancel_requested:
+                    return job
+            job = BuildJob()
+            job._cancel_probe = self.cancel_probe
+            job._on_checkpoint = lambda j: self._publish(j, force=False)
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_history:
+                old_id, _ = self._jobs.popitem(last=False)
+                self._published_at.pop(old_id, None)
+        self._publish(job)
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: BuildJob, fn: Callable[[BuildJob], Dict[str, Any]]):
+        if job.cancel_requested or (self.cancel_probe is not None and self.cancel_probe(job.id)):
+            job.update(status="cancelled", finished_at=time.time())
+            self._publish(job)
+            return
+        job.update(status="running", started_at=time.time())
+        self._publish(job)
+        try:
+            result = fn(job)
+            job.update(status="succeeded", result=result, finished_at=time.time())
+        except JobCancelled:
+            job.update(status="cancelled", finished_at=time.time())
+        except Exception as e:
+            job.update(status="failed", error=f"{e}\n{traceback.format_exc()}", finished_at=time.time())
+        self._publish(job)
+
+    def get(self, job_id: str) -> Optional[BuildJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
@@ -0,0 +1,214 @@
+# backend/app/services/lexical.py
+
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from . import metrics
+
+LEXICAL_FILE = "lexical.json"
+
+# Query terms that are skipped: stopwords, and terms in more than MAX_DF of the documents
+# once they appear in more than MIN_COMMON_DF of them (they barely move the ranking but
+# each would walk a large share of the corpus).
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from has have how i if in into is it its of on "
+    "or should so than that the their then there these this to was were what when which "
+    "will with".split()
+)
+MAX_DF = 0.5
+MIN_COMMON_DF = 500
+
+# Compound tokens keep codes, field ids and API paths whole ("save15", "discount_code",
+# "/api/v1/orders"); their parts are indexed as well so "discount code" still matches.
+_COMPOUND = re.compile(r"/?[a-z0-9]+(?:[._/-][a-z0-9]+)*")
+_PART = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased compound tokens plus their alphanumeric parts.
+    """
+    tokens = []
+    for compound in _COMPOUND.findall(text.lower()):
+        parts = _PART.findall(compound)
+        if len(parts) > 1 or compound != parts[0]:
+            tokens.append(compound)
+        tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    Incremental inverted index with Okapi BM25 scoring, keyed by the same int64 ids
+    as the vector store. copy() is cheap: posting lists are shared and only copied
+    when the copy first modifies them, so a build can update a copy while the live
+    index keeps serving queries.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings: Dict[str, Dict[int, int]] = {}  # term -> {id: term frequency}
+        self._doc_terms: Dict[int, Tuple[str, ...]] = {}  # id -> distinct terms, for removal
+        self._doc_len: Dict[int, int] = {}
+        self._total_len = 0
+        self._owned = set()  # terms whose posting dict belongs to this instance
+        self._arrays: Dict[str, tuple] = {}  # term -> (ids, tfs, doc lengths), built on first query
+
+    def _writable(self, term: str) -> Dict[int, int]:
+        self._arrays.pop(term, None)
+        postings = self._postings.get(term)
+        if postings is None:
+            postings = self._postings[term] = {}
+            self._owned.add(term)
+        elif term not in self._owned:
+            postings = self._postings[term] = dict(postings)
+            self._owned.add(term)
+        return postings
+
+    def add(self, ids: Sequence[int], texts: Sequence[str]):
+        """
+        Index texts under ids (an existing id is replaced).
+        """
+        for vid, text in zip(ids, texts):
+            vid = int(vid)
+            if vid in self._doc_len:
+                self.remove([vid])
+            tf = Counter(tokenize(text))
+            for term, n in tf.items():
+                self._writable(term)[vid] = n
+            self._doc_terms[vid] = tuple(tf)
+            length = sum(tf.values())
+            self._doc_len[vid] = length
+            self._total_len += length
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """
+        Remove ids from the index. Returns how many were present.
+        """
+        removed = 0
+        for vid in ids:
+            vid = int(vid)
+            terms = self._doc_terms.pop(vid, None)
+            if terms is None:
+                continue
+            for term in terms:
+                postings = self._writable(term)
+                postings.pop(vid, None)
+                if not postings:
+                    del self._postings[term]
+                    self._owned.discard(term)
+            self._total_len -= self._doc_len.pop(vid)
+            removed += 1
+        return removed
+
+    @metrics.timed("bm25_query")
+    def query(self, text: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """
+        The top_k (id, BM25 score) pairs for a query, best first. Stopwords and very
+        common terms are skipped unless nothing else matches, in which case only the
+        rarest query term is scored.
+        """
+        n = len(self._doc_len)
+        terms = [t for t in set(tokenize(text)) if t in self._postings]
+        if n == 0 or not terms or top_k <= 0:
+            return []
+        common = max(MAX_DF * n, MIN_COMMON_DF)
+        kept = [t for t in terms if t not in STOPWORDS and len(self._postings[t]) <= common]
+        if not kept:
+            kept = [min(terms, key=lambda t: len(self._postings[t]))]
+
+        avg_len = self._total_len / n
+        ids, scores = [], []
+        for term in kept:
+            vids, tfs, lens = self._term_arrays(term)
+            idf = math.log(1 + (n - len(vids) + 0.5) / (len(vids) + 0.5))
+            ids.append(vids)
+            scores.append(idf * tfs * (self.k1 + 1) / (tfs + self.k1 * (1 - self.b + self.b * lens / avg_len)))
+        ids, inverse = np.unique(np.concatenate(ids), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        best = np.argpartition(-totals, top_k - 1)[:top_k] if len(totals) > top_k else np.arange(len(totals))
+        best = best[np.argsort(-totals[best], kind="stable")]
+        return [(int(ids[i]), float(totals[i])) for i in best]
+
+    def _term_arrays(self, term: str) -> tuple:
+        """
+        A term's postings as arrays (ids, term frequencies, document lengths), cached
+        until the term's postings change.
+        """
+        arrays = self._arrays.get(term)
+        if arrays is None:
+            postings = self._postings[term]
+            vids = np.fromiter(postings.keys(), dtype="int64", count=len(postings))
+            tfs = np.fromiter(postings.values(), dtype="float64", count=len(postings))
+            lens = np.fromiter((self._doc_len[v] for v in postings), dtype="float64", count=len(postings))
+            arrays = self._arrays[term] = (vids, tfs, lens)
+        return arrays
+
+    def copy(self) -> "BM25Index":
+        other = BM25Index(self.k1, self.b)
+        other._postings = dict(self._postings)
+        other._doc_terms = dict(self._doc_terms)
+        other._doc_len = dict(self._doc_len)
+        other._total_len = self._total_len
+        other._arrays = dict(self._arrays)
+        return other
+
+    def count(self) -> int:
+        return len(self._doc_len)
+
+    def save(self, directory: Path):
+        """
+        Persist term frequencies per document (postings are rebuilt on load).
+        Written to a temporary and renamed into place.
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        docs = {}
+        for vid, terms in self._doc_terms.items():
+            docs[str(vid)] = {t: self._postings[t][vid] for t in terms}
+        path = directory / LEXICAL_FILE
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"k1": self.k1, "b": self.b, "docs": docs}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory: Path) -> "BM25Index":
+        """
+        Load an index saved with `save`. Raises FileNotFoundError if none exists.
+        """
+        with (Path(directory) / LEXICAL_FILE).open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        index = cls(data["k1"], data["b"])
+        for vid, tf in data["docs"].items():
+            vid = int(vid)
+            for term, n in tf.items():
+                index._writable(term)[vid] = n
+            index._doc_terms[vid] = tuple(tf)
+            index._doc_len[vid] = sum(tf.values())
+            index._total_len += index._doc_len[vid]
+        return index
+
+
+def rrf_fuse(
+    rankings: Sequence[Sequence[int]], k: int = 60, weights: Optional[Sequence[float]] = None, top_k: int = 5,
+) -> List[Tuple[int, float]]:
+    """
+    Reciprocal rank fusion: each ranking (ids, best first) contributes
+    weight / (k + rank) to an id's score. Returns the top_k (id, fused score) pairs.
+    """
+    weights = weights or [1.0] * len(rankings)
+    fused: Dict[int, float] = {}
+    for ranking, weight in zip(rankings, weights):
+        for rank, vid in enumerate(ranking, start=1):
+            fused[vid] = fused.get(vid, 0.0) + weight / (k + rank)
+    return heapq.nlargest(top_k, fused.items(), key=lambda x: x[1])
@@ -0,0 +1,411 @@
+# backend/app/services/llm_client.py
+
+import asyncio
+import os
+import random
+import threading
+import time
+import json
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+import httpx
+
+from . import generation_cache as gen_cache
+from . import metrics
+from .parser import estimate_tokens
+
+OLLAMA_URL = os.environ.get("OLLAMA_URL", "http://localhost:11434")
+GROQ_BASE_URL = os.environ.get("GROQ_BASE_URL", "https://api.groq.com/openai/v1")
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", "120"))
+LLM_CONNECT_TIMEOUT = float(os.environ.get("LLM_CONNECT_TIMEOUT", "10"))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", "3"))
+LLM_BACKOFF_BASE = float(os.environ.get("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_CAP = float(os.environ.get("LLM_BACKOFF_CAP", "20"))
+LLM_PROVIDER_CONCURRENCY = int(os.environ.get("LLM_PROVIDER_CONCURRENCY", "4"))
+
+DEFAULT_MODELS = {"groq": "llama-3.1-8b-instant", "ollama": "llama3"}
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """
+    Raised when a provider call fails after all retries.
+    """
+
+
+class ProviderClient:
+    """
+    Pooled HTTP clients (sync and async, keep-alive) for one provider + API key.
+    Retries 429/5xx and transport errors with jittered exponential backoff.
+    Concurrency is limited per provider, shared by every key of that provider.
+    """
+
+    def __init__(self, provider: str, base_url: str, api_key: Optional[str] = None):
+        self.provider = provider
+        self.base_url = base_url
+        self.headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.timeout = httpx.Timeout(LLM_TIMEOUT, connect=LLM_CONNECT_TIMEOUT)
+        self.limits = httpx.Limits(max_connections=LLM_PROVIDER_CONCURRENCY * 2, max_keepalive_connections=LLM_PROVIDER_CONCURRENCY)
+        self._client: Optional[httpx.Client] = None
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> httpx.Client:
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(base_url=self.base_url, headers=self.headers, timeout=self.timeout, limits=self.limits)
+            return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        with self._lock:
+            if self._aclient is None:
+                self._aclient = httpx.AsyncClient(base_url=self.base_url, headers=self.headers, timeout=self.timeout, limits=self.limits)
+            return self._aclient
+
+    def post_json(self, path: str, payload: dict) -> dict:
+        """
+        POST payload as JSON and return the decoded response, retrying transient failures.
+        """
+        with _sync_semaphore(self.provider):
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    response = self.client.post(path, json=payload)
+                except httpx.TransportError as e:
+                    error, response = e, None
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return response.json()
+                    error = LLMError(f"{self.provider} returned HTTP {response.status_code}")
+                if attempt == LLM_MAX_RETRIES:
+                    raise LLMError(str(error)) from error
+                time.sleep(_backoff(attempt, response))
+
+    async def apost_json(self, path: str, payload: dict) -> dict:
+        """
+        Async variant of post_json.
+        """
+        async with _async_semaphore(self.provider):
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                try:
+                    response = await self.aclient.post(path, json=payload)
+                except httpx.TransportError as e:
+                    error, response = e, None
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        response.raise_for_status()
+                        return response.json()
+                    error = LLMError(f"{self.provider} returned HTTP {response.status_code}")
+                if attempt == LLM_MAX_RETRIES:
+                    raise LLMError(str(error)) from error
+                await asyncio.sleep(_backoff(attempt, response))
+
+    async def astream_lines(self, path: str, payload: dict) -> AsyncIterator[str]:
+        """
+        POST payload and yield non-empty response lines as they arrive.
+        Transient failures are retried only until the first line has been received.
+        """
+        async with _async_semaphore(self.provider):
+            for attempt in range(LLM_MAX_RETRIES + 1):
+                started, response_headers = False, None
+                try:
+                    async with self.aclient.stream("POST", path, json=payload) as response:
+                        response_headers = response
+                        if response.status_code not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            async for line in response.aiter_lines():
+                                if line:
+                                    started = True
+                                    yield line
+                            return
+                        error = LLMError(f"{self.provider} returned HTTP {response.status_code}")
+                except httpx.TransportError as e:
+                    if started:
+                        raise LLMError(f"{self.provider} stream interrupted: {e}") from e
+                    error, response_headers = e, None
+                if attempt == LLM_MAX_RETRIES:
+                    raise LLMError(str(error)) from error
+                await asyncio.sleep(_backoff(attempt, response_headers))
+
+
+def _backoff(attempt: int, response: Optional[httpx.Response]) -> float:
+    """
+    Seconds to wait before the next attempt: Retry-After when the server sends it,
+    otherwise full-jitter exponential backoff.
+    """
+    if response is not None:
+        retry_after = response.headers.get("retry-after")
+        if retry_after:
+            try:
+                return min(float(retry_after), LLM_BACKOFF_CAP)
+            except ValueError:
+                pass
+    return random.uniform(0, min(LLM_BACKOFF_CAP, LLM_BACKOFF_BASE * (2 ** attempt)))
+
+
+_CLIENTS: Dict[Tuple[str, Optional[str]], ProviderClient] = {}
+_SYNC_SEMAPHORES: Dict[str, threading.BoundedSemaphore] = {}
+_ASYNC_SEMAPHORES: Dict[str, asyncio.Semaphore] = {}
+_REGISTRY_LOCK = threading.Lock()
+
+
+def _sync_semaphore(provider: str) -> threading.BoundedSemaphore:
+    with _REGISTRY_LOCK:
+        if provider not in _SYNC_SEMAPHORES:
+            _SYNC_SEMAPHORES[provider] = threading.BoundedSemaphore(LLM_PROVIDER_CONCURRENCY)
+        return _SYNC_SEMAPHORES[provider]
+
+
+def _async_semaphore(provider: str) -> asyncio.Semaphore:
+    with _REGISTRY_LOCK:
+        if provider not in _ASYNC_SEMAPHORES:
+            _ASYNC_SEMAPHORES[provider] = asyncio.Semaphore(LLM_PROVIDER_CONCURRENCY)
+        return _ASYNC_SEMAPHORES[provider]
+
+
+def get_client(provider: str, api_key: Optional[str] = None) -> ProviderClient:
+    """
+    Return the pooled client for (provider, api_key), creating it on first use.
+    """
+    key = (provider, api_key)
+    with _REGISTRY_LOCK:
+        if key not in _CLIENTS:
+            base_url = OLLAMA_URL if provider == "ollama" else GROQ_BASE_URL
+            _CLIENTS[key] = ProviderClient(provider, base_url, api_key)
+        return _CLIENTS[key]
+
+
+def _request(provider: str, system_prompt: str, user_prompt: str, model: str, temperature: Optional[float]) -> Tuple[str, dict]:
+    """
+    Build (path, payload) for a chat completion on the given provider.
+    """
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_prompt}
+    ]
+    if provider == "ollama":
+        payload = {"model": model, "messages": messages, "stream": False}
+        if temperature is not None:
+            payload["options"] = {"temperature": temperature}
+        return "/api/chat", payload
+    payload = {"model": model, "messages": messages}
+    if temperature is not None:
+        payload["temperature"] = temperature
+    return "/chat/completions", payload
+
+
+def _delta(provider: str, line: str) -> str:
+    """
+    Extract the text delta from one streamed line: NDJSON for Ollama, SSE for Groq.
+    """
+    if provider == "ollama":
+        return json.loads(line).get("message", {}).get("content", "")
+    if not line.startswith("data:"):
+        return ""
+    data = line[len("data:"):].strip()
+    if data == "[DONE]":
+        return ""
+    return json.loads(data)["choices"][0].get("delta", {}).get("content") or ""
+
+
+def _content(provider: str, data: dict) -> str:
+    """
+    Extract the completion text from a provider response.
+    """
+    if provider == "ollama":
+        return data.get("message", {}).get("content", "")
+    return data["choices"][0]["message"]["content"]
+
+
+def _record_tokens(provider: str, data: Optional[dict], prompt: str, output: str):
+    """
+    Count prompt and completion tokens: provider-reported usage when the response
+    has it (Groq "usage", Ollama eval counts), estimated from the text otherwise.
+    """
+    data = data or {}
+    usage = data.get("usage") or {}
+    tokens_in = usage.get("prompt_tokens", data.get("prompt_eval_count"))
+    tokens_out = usage.get("completion_tokens", data.get("eval_count"))
+    metrics.LLM_TOKENS.inc(tokens_in if tokens_in is not None else estimate_tokens(prompt), provider=provider, direction="in")
+    metrics.LLM_TOKENS.inc(tokens_out if tokens_out is not None else estimate_tokens(output), provider=provider, direction="out")
+
+
+def _prepare(provider: str, api_key: Optional[str], model: Optional[str]):
+    """
+    Normalize provider/key/model. Returns (provider, api_key, model, error_message).
+    """
+    provider = "ollama" if provider == "ollama" else "groq"
+    model = model or DEFAULT_MODELS[provider]
+    if provider == "groq":
+        api_key = api_key or os.environ.get("GROQ_API_KEY")
+        if not api_key:
+            return provider, None, model, "No valid Groq API Key found in env or args"
+    else:
+        api_key = None
+    return provider, api_key, model, None
+
+
+def chat(
+    system_prompt: str,
+    user_prompt: str,
+    provider: str = "groq",
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Run one chat completion through the shared generation cache and pooled client.
+    Returns: (response_text, error_message); response_text is None on failure or for the mock provider.
+    """
+    if provider == "mock":
+        return None, "Provider set to Mock"
+    provider, api_key, model, error = _prepare(provider, api_key, model)
+    if error:
+        print(f"Using Mock Response ({error})")
+        return None, error
+
+    key = gen_cache.generation_key(provider, model, temperature, system_prompt, user_prompt)
+    cached = gen_cache.GENERATION_CACHE.get(key)
+    if cached:
+        return cached, None
+    path, payload = _request(provider, system_prompt, user_prompt, model, temperature)
+    try:
+        data = get_client(provider, api_key).post_json(path, payload)
+        text = _content(provider, data)
+    except Exception as e:
+        print(f"{provider} LLM Error: {e}")
+        return None, f"{provider} API Error: {str(e)}"
+    _record_tokens(provider, data, system_prompt + user_prompt, text or "")
+    if not text:
+        return None, f"{provider} returned an empty response"
+    gen_cache.GENERATION_CACHE.put(key, text)
+    return text, None
+
+
+async def achat(
+    system_prompt: str,
+    user_prompt: str,
+    provider: str = "groq",
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Async variant of chat; does not block the event loop.
+    """
+    if provider == "mock":
+        return None, "Provider set to Mock"
+    provider, api_key, model, error = _prepare(provider, api_key, model)
+    if error:
+        print(f"Using Mock Response ({error})")
+        return None, error
+
+    key = gen_cache.generation_key(provider, model, temperature, system_prompt, user_prompt)
+    cached = gen_cache.GENERATION_CACHE.get(key)
+    if cached:
+        return cached, None
+    path, payload = _request(provider, system_prompt, user_prompt, model, temperature)
+    try:
+        data = await get_client(provider, api_key).apost_json(path, payload)
+        text = _content(provider, data)
+    except Exception as e:
+        print(f"{provider} LLM Error: {e}")
+        return None, f"{provider} API Error: {str(e)}"
+    _record_tokens(provider, data, system_prompt + user_prompt, text or "")
+    if not text:
+        return None, f"{provider} returned an empty response"
+    gen_cache.GENERATION_CACHE.put(key, text)
+    return text, None
+
+
+async def astream(
+    system_prompt: str,
+    user_prompt: str,
+    provider: str = "groq",
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+) -> AsyncIterator[str]:
+    """
+    Stream a chat completion token by token.
+    A cached response is yielded in one piece; a completed stream is added to the cache.
+    Raises LLMError if the provider is unavailable (mock provider, missing key, HTTP failure).
+    """
+    if provider == "mock":
+        raise LLMError("Provider set to Mock")
+    provider, api_key, model, error = _prepare(provider, api_key, model)
+    if error:
+        raise LLMError(error)
+
+    key = gen_cache.generation_key(provider, model, temperature, system_prompt, user_prompt)
+    cached = gen_cache.GENERATION_CACHE.get(key)
+    if cached:
+        yield cached
+        return
+    path, payload = _request(provider, system_prompt, user_prompt, model, temperature)
+    payload["stream"] = True
+    parts = []
+    start = time.perf_counter()
+    try:
+        async for line in get_client(provider, api_key).astream_lines(path, payload):
+            token = _delta(provider, line)
+            if token:
+                if not parts:
+                    metrics.record("llm_first_token", time.perf_counter() - start)
+                parts.append(token)
+                yield token
+    except LLMError:
+        raise
+    except Exception as e:
+        raise LLMError(f"{provider} API Error: {str(e)}") from e
+    finally:
+        metrics.record("llm_stream", time.perf_counter() - start)
+        _record_tokens(provider, None, system_prompt + user_prompt, "".join(parts))
+    gen_cache.GENERATION_CACHE.put(key, "".join(parts))
+
+
+async def astrip_fences(tokens: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Remove a leading ```lang line and a trailing ``` from a token stream,
+    holding back only the few characters needed to recognise them.
+    """
+    head, decided, tail = "", False, ""
+    async for token in tokens:
+        if not decided:
+            head += token
+            if head.lstrip().startswith("```"):
+                if "\n" not in head:
+                    continue
+                token = head.split("\n", 1)[1]
+            elif len(head.lstrip()) < 3:
+                continue
+            else:
+                token = head
+            decided = True
+        tail += token
+        if len(tail) > 4:
+            yield tail[:-4]
+            tail = tail[-4:]
+    if not decided:
+        tail = head
+    tail = tail.rstrip()
+    if tail.endswith("```"):
+        tail = tail[:-3]
+    if tail:
+        yield tail
+
+
+async def aclose():
+    """
+    Close every pooled client (called on API shutdown).
+    """
+    with _REGISTRY_LOCK:
+        clients = list(_CLIENTS.values())
+        _CLIENTS.clear()
+    for c in clients:
+        if c._client is not None:
+            c._client.close()
+        if c._aclient is not None:
+            await c._aclient.aclose()
@@ -1,273 +1,1117 @@
-
-from dotenv import load_dotenv
-import os
-load_dotenv()
-
-from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, PlainTextResponse
-from pathlib import Path
-import json
-import uuid
-import traceback
-
-
-from .services import parser as parser_mod
-from .services import embeddings as emb_mod
-from .services import vectorstore as vs_mod
-from .services import rag_agent as rag_mod
-from .services import selenium_builder as sb_mod
-
-app = FastAPI(title="Autonomous QA Agent API")
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-BASE_DIR = Path(__file__).resolve().parents[2]
-ASSETS_DIR = BASE_DIR / "assets"
-KB_DIR = BASE_DIR / "kb"
-ASSETS_DIR.mkdir(exist_ok=True)
-KB_DIR.mkdir(exist_ok=True)
-
-EMBEDDER = None
-VECTOR_STORE = None
-HTML_CONTENT = ""
-INGESTED_CHUNKS = []
-GENERATED_TESTCASES = {}
-
-@app.on_event("startup")
-def startup_event():
-    global EMBEDDER, VECTOR_STORE
-
-    try:
-        EMBEDDER = emb_mod.EmbeddingModel()
-        dim = EMBEDDER.model.get_sentence_embedding_dimension()
-        VECTOR_STORE = vs_mod.FaissStore(dim=dim)
-        app.logger = getattr(app, "logger", None)
-    except Exception as e:
-        print("Failed to initialize embedding model or vector store:", e)
-        raise
-
-
-def _save_file_to_assets(upload: UploadFile, filename: str = None) -> Path:
-    filename = filename or upload.filename
-    dest = ASSETS_DIR / filename
-
-    with dest.open("wb") as f:
-        f.write(upload.file.read())
-    return dest
-
-def _parse_and_chunk(file_path: Path, filename: str):
-    """
-    Parse a file based on extension, return text string.
-    """
-    ext = file_path.suffix.lower()
-    raw_text = ""
-    with file_path.open("rb") as f:
-        b = f.read()
-    if ext in [".md", ".txt"]:
-
-        raw_text = b.decode("utf-8", errors="ignore")
-    elif ext in [".html", ".htm"]:
-        raw_text = parser_mod.parse_html(b.decode("utf-8", errors="ignore"))
-    elif ext == ".json":
-        raw_text = parser_mod.parse_json_bytes(b)
-    elif ext == ".pdf":
-        raw_text = parser_mod.parse_pdf_bytes(b)
-    else:
-
-        try:
-            raw_text = b.decode("utf-8", errors="ignore")
-        except Exception:
-            raw_text = ""
-    return raw_text
-
-
-
-@app.post("/upload_support_doc")
-async def upload_support_doc(file: UploadFile = File(...)):
-    """
-    Upload a support document (md/txt/json/pdf/html). File is saved to assets/.
-    Returns basic metadata.
-    """
-    try:
-        saved = _save_file_to_assets(file)
-        return JSONResponse({"status": "ok", "filename": saved.name, "path": str(saved)})
-    except Exception as e:
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}\n{tb}")
-
-@app.post("/upload_checkout_html")
-async def upload_checkout_html(file: UploadFile = File(...)):
-    """
-    Upload the checkout.html file. We store its raw HTML (text) in memory for later selector extraction.
-    """
-    global HTML_CONTENT
-    try:
-        saved = _save_file_to_assets(file, filename="checkout.html")
-
-        content = saved.read_text(encoding="utf-8", errors="ignore")
-        HTML_CONTENT = content
-        return JSONResponse({"status": "ok", "filename": saved.name, "message": "checkout.html uploaded and parsed"})
-    except Exception as e:
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to upload checkout.html: {e}\n{tb}")
-
-@app.post("/build_kb")
-async def build_kb():
-    """
-    Build the knowledge base from all files present in assets/.
-    - Parses each file
-    - Chunks text
-    - Embeds chunks and adds to FAISS store with metadata
-    """
-    global INGESTED_CHUNKS, VECTOR_STORE, EMBEDDER
-    INGESTED_CHUNKS = []
-    try:
-        assets = list(ASSETS_DIR.iterdir())
-        all_texts = []
-        metadatas = []
-        for p in assets:
-
-            if p.is_file() and p.suffix.lower() in [".md", ".txt", ".json", ".pdf", ".html", ".htm"]:
-                raw = _parse_and_chunk(p, p.name)
-                if not raw or raw.strip() == "":
-                    continue
-
-                chunks = parser_mod.chunk_text(raw, chunk_size=800, overlap=100)
-                for idx, c in enumerate(chunks):
-                    meta = {
-                        "source": p.name,
-                        "chunk_id": idx,
-                        "char_start": idx * (800 - 100),
-                        "char_end": min(len(raw), (idx + 1) * 800),
-                        "text_preview": c[:200],
-                    }
-                    all_texts.append(c)
-                    metadatas.append(meta)
-        if not all_texts:
-            return JSONResponse({"status": "no_data", "message": "No valid files/chunks found in assets/ to build KB."})
-        vectors = EMBEDDER.embed(all_texts)
-        VECTOR_STORE.add(vectors.astype("float32"), metadatas)
-        INGESTED_CHUNKS = metadatas
-        return JSONResponse({"status": "ok", "ingested_chunks": len(all_texts)})
-    except Exception as e:
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to build KB: {e}\n{tb}")
-
-@app.post("/generate_testcases")
-async def generate_testcases(
-    user_request: str = Form(...), 
-    top_k: int = 5,
-    x_groq_api_key: str = Header(None),
-    x_llm_provider: str = Header("groq")
-):
-    """
-    RAG pipeline:
-    - Embed the user's request
-    - Retrieve top_k chunks from VECTOR_STORE
-    - Call the LLM agent to generate structured testcases (JSON text)
-    Stores the generated testcases in memory and returns an id to fetch them.
-    """
-    global GENERATED_TESTCASES, VECTOR_STORE, EMBEDDER
-    if VECTOR_STORE is None:
-        raise HTTPException(status_code=500, detail="Vector store not initialized. Call /build_kb first.")
-    try:
-        q_vec = EMBEDDER.embed([user_request]).astype("float32")
-        retrieved = VECTOR_STORE.query(q_vec, top_k=top_k)  # list of metadata dicts
-
-        context_chunks = []
-        for r in retrieved:
-
-            source_name = r.get("source")
-            preview = r.get("text_preview", "")
-
-            context_chunks.append(f"Filename: {source_name}\n\n{preview}\n")
-
-        generated_text = rag_mod.generate_testcases(context_chunks, user_request, api_key=x_groq_api_key, provider=x_llm_provider)
-
-        tc_id = str(uuid.uuid4())
-        GENERATED_TESTCASES[tc_id] = {"request": user_request, "retrieved": retrieved, "output": generated_text}
-        return JSONResponse({"status": "ok", "testcases_id": tc_id, "preview": generated_text[:1000]})
-    except Exception as e:
-        tb = traceback.format_exc()
-        raise HTTPException(status_code=500, detail=f"Failed to generate testcases: {e}\n{tb}")
-
-@app.get("/testcases/{tc_id}")
-async def get_testcases(tc_id: str):
-    """
-    Retrieve previously generated testcases by id.
-    """
-    if tc_id not in GENERATED_TESTCASES:
-        raise HTTPException(status_code=404, detail="Testcases id not found")
-    return JSONResponse(GENERATED_TESTCASES[tc_id])
-
-@app.post("/generate_selenium_script")
-async def generate_selenium_script(
-    testcases_id: str = Form(...), 
-    testcase_index: int = Form(0),
-    x_groq_api_key: str = Header(None),
-    x_llm_provider: str = Header("groq")
-):
-    """
-    Generate a runnable Selenium Python script for one selected testcase.
-    Inputs:
-      - testcases_id: id received from /generate_testcases
-      - testcase_index: index into the JSON array or the selection
-    Behavior:
-      - Parses the stored agent output (attempt JSON parse)
-      - Extract selectors from uploaded checkout.html
-      - Calls selenium_builder to create Python code
-    """
-    global GENERATED_TESTCASES, HTML_CONTENT
-    if testcases_id not in GENERATED_TESTCASES:
-        raise HTTPException(status_code=404, detail="testcases_id not found")
-    item = GENERATED_TESTCASES[testcases_id]
-    out_text = item.get("output", "")
-
-    try:
-        parsed = json.loads(out_text)
-        if not isinstance(parsed, list) or len(parsed) == 0:
-            raise ValueError("Parsed testcases not a list or empty.")
-        if testcase_index < 0 or testcase_index >= len(parsed):
-            raise HTTPException(status_code=400, detail="testcase_index out of range")
-        testcase = parsed[testcase_index]
-    except Exception:
-
-        testcase = {
-            "Test_ID": f"TC-UNKNOWN-{testcases_id[:8]}",
-            "Feature": "Unknown (raw agent output)",
-            "Steps": [f"Follow agent output: {out_text[:400]}"],
-            "Expected_Result": "As per agent output",
-            "Grounded_In": [d.get("source") for d in item.get("retrieved", [])]
-        }
-
-    if not HTML_CONTENT or HTML_CONTENT.strip() == "":
-        raise HTTPException(status_code=400, detail="checkout.html not uploaded. Upload via /upload_checkout_html")
-
-
-    selectors = sb_mod.extract_selectors(HTML_CONTENT)
-
-    script_code = sb_mod.build_script(testcase, selectors, api_key=x_groq_api_key, provider=x_llm_provider)
-
-
-    return PlainTextResponse(script_code, media_type="text/x-python")
-
-@app.get("/health")
-async def health():
-    return {"status": "ok", "kb_chunks": len(INGESTED_CHUNKS), "has_html": bool(HTML_CONTENT)}
-
-
-@app.get("/assets")
-async def list_assets():
-    files = []
-    for f in ASSETS_DIR.iterdir():
-        if f.is_file():
-            files.append({"name": f.name, "path": str(f), "size": f.stat().st_size})
-    return JSONResponse({"assets": files})
+
+from dotenv import load_dotenv
+import os
+load_dotenv()
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, Header
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+import asyncio
+import contextvars
+import functools
+import json
+import multiprocessing
+import re
+import threading
+import time
+import uuid
+import traceback
+import numpy as np
+
+
+from .services import parser as parser_mod
+from .services import embeddings as emb_mod
+from .services import vectorstore as vs_mod
+from .services import rag_agent as rag_mod
+from .services import selenium_builder as sb_mod
+from .services import manifest as manifest_mod
+from .services import jobs as jobs_mod
+from .services import pipeline as pipeline_mod
+from .services import generation_cache as gen_cache_mod
+from .services import llm_client as llm_mod
+from .services import testcase_parser as tc_parser_mod
+from .services import selector_index as sel_index_mod
+from .services import chunkstore as chunk_mod
+from .services import lexical as lex_mod
+from .services import state_store as state_mod
+from .services import testcase_store as tc_store_mod
+from .services import metrics as metrics_mod
+from .services import chunker as chunker_mod
+from .services import dedup as dedup_mod
+
+app = FastAPI(title="Autonomous QA Agent API")
+
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
+
+
+# QA_BASE_DIR relocates assets/ and kb/ (e.g. for benchmarks on a scratch directory).
+BASE_DIR = Path(os.environ.get("QA_BASE_DIR") or Path(__file__).resolve().parents[2])
+ASSETS_DIR = BASE_DIR / "assets"
+KB_DIR = BASE_DIR / "kb"
+ASSETS_DIR.mkdir(exist_ok=True)
+KB_DIR.mkdir(exist_ok=True)
+
+EMBEDDER = None
+VECTOR_STORE = None
+CHUNK_STORE = None
+LEXICAL_INDEX = None
+DEDUP_INDEX = None
+HTML_PAGES = {}  # page name -> selector_index.SelectorIndex, in upload order
+INGESTED_CHUNKS = []
+BUILD_MANIFEST = manifest_mod.BuildManifest()
+
+SUPPORTED_EXTS = [".md", ".txt", ".json", ".pdf", ".html", ".htm"]
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 100
+# With CHUNK_TOKENS > 0, chunks are sized in embedding-model tokens instead of characters
+# (keep it at or below the model's max sequence length, 256 for all-MiniLM-L6-v2).
+CHUNK_TOKENS = int(os.environ.get("CHUNK_TOKENS", "0"))
+# Bump when chunk boundaries change, so the next build re-chunks every file.
+CHUNKER_VERSION = "native-1"
+INDEX_TYPE = os.environ.get("KB_INDEX_TYPE", "flat_ip")
+INDEX_PARAMS = json.loads(os.environ.get("KB_INDEX_PARAMS", "{}"))
+VECTOR_STORAGE = os.environ.get("KB_VECTOR_STORAGE", "float32")  # float32 | float16 | int8
+EMBED_BACKEND = os.environ.get("EMBED_BACKEND", "torch")  # torch | int8 | onnx
+EMBED_ONNX_FILE = os.environ.get("EMBED_ONNX_FILE", "")
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "8"))
+SELECTOR_TOKEN_BUDGET = int(os.environ.get("SELECTOR_TOKEN_BUDGET", "1500"))
+CONTEXT_TOKEN_BUDGET = int(os.environ.get("CONTEXT_TOKEN_BUDGET", "3000"))
+RETRIEVAL_MODE = os.environ.get("RETRIEVAL_MODE", "hybrid")  # hybrid | dense | lexical
+RETRIEVAL_CANDIDATES = int(os.environ.get("RETRIEVAL_CANDIDATES", "20"))
+RRF_K = int(os.environ.get("RRF_K", "60"))
+# Chunks that duplicate one already in the KB are not embedded again; the kept chunk
+# lists every file it came from. minhash: exact and near duplicates (estimated Jaccard
+# similarity of word 3-shingles >= DEDUP_THRESHOLD) | exact | off
+DEDUP_MODE = os.environ.get("DEDUP_MODE", "minhash")
+DEDUP_THRESHOLD = float(os.environ.get("DEDUP_THRESHOLD", "0.85"))
+EMBED_CACHE_SIZE = int(os.environ.get("EMBED_CACHE_SIZE", "10000"))
+EMBED_CACHE_DIR = os.environ.get("EMBED_CACHE_DIR", str(KB_DIR / "embedding_cache"))
+GEN_CACHE_SIZE = int(os.environ.get("GEN_CACHE_SIZE", "1000"))
+GEN_CACHE_TTL = float(os.environ.get("GEN_CACHE_TTL", str(24 * 3600)))
+GEN_CACHE_PATH = os.environ.get("GEN_CACHE_PATH", str(KB_DIR / "generation_cache.jsonl"))
+EMBED_BATCH_SIZE = int(os.environ.get("EMBED_BATCH_SIZE", "256"))
+PREFETCH_BATCHES = int(os.environ.get("PREFETCH_BATCHES", "4"))
+PARSE_WORKERS = int(os.environ.get("PARSE_WORKERS", str(os.cpu_count() or 1)))
+CPU_WORKERS = int(os.environ.get("CPU_WORKERS", str(min(8, os.cpu_count() or 1))))
+SHARED_STATE = os.environ.get("SHARED_STATE", "0") == "1"
+STATE_DB_PATH = os.environ.get("STATE_DB_PATH", str(KB_DIR / "state.db"))
+SHARED_SYNC_INTERVAL = float(os.environ.get("SHARED_SYNC_INTERVAL", "1.0"))
+TESTCASE_MEMORY_MB = float(os.environ.get("TESTCASE_MEMORY_MB", "64"))
+TESTCASE_MEMORY_TTL = float(os.environ.get("TESTCASE_MEMORY_TTL", "3600"))
+TESTCASE_RETENTION_DAYS = float(os.environ.get("TESTCASE_RETENTION_DAYS", "0"))
+TESTCASE_DB_PATH = os.environ.get("TESTCASE_DB_PATH", str(KB_DIR / "testcases.db"))
+MODEL_LOAD_BACKGROUND = os.environ.get("MODEL_LOAD_BACKGROUND", "1") == "1"
+
+# Embedding, parsing and FAISS work runs here instead of on the event loop.
+# torch, FAISS and PyMuPDF release the GIL in their hot loops, so threads scale.
+CPU_EXECUTOR = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="qa-cpu")
+# Shared-state mode (uvicorn --workers N): generated testcases, uploaded pages, build
+# status and the KB version live in SQLite; the KB itself is (re)loaded from kb/.
+STATE = state_mod.StateStore(Path(STATE_DB_PATH)) if SHARED_STATE else None
+# Generated testcases: recent entries in memory (bounded by TESTCASE_MEMORY_MB), the
+# rest spilled to SQLite. Shared-state mode writes every entry through to the shared DB.
+GENERATED_TESTCASES = tc_store_mod.TestcaseStore(
+    Path(STATE_DB_PATH if SHARED_STATE else TESTCASE_DB_PATH),
+    max_bytes=0 if SHARED_STATE else int(TESTCASE_MEMORY_MB * (1 << 20)),
+    ttl_seconds=TESTCASE_MEMORY_TTL,
+    retention_seconds=TESTCASE_RETENTION_DAYS * 86400,
+    persistent=SHARED_STATE,
+)
+KB_VERSION = 0
+# Set once the embedding model and saved KB are loaded (see startup_event).
+MODEL_READY = threading.Event()
+MODEL_ERROR = None
+MODEL_LOAD_SECONDS = None
+_LAST_SYNC = 0.0
+_SYNC_LOCK = threading.Lock()
+# Held while a build writes kb/, across processes.
+BUILD_LOCK_PATH = KB_DIR / "build.lock"
+# KB builds run as background jobs, one at a time.
+BUILD_JOBS = jobs_mod.JobManager(
+    publish=STATE.put_job if STATE else None,
+    cancel_probe=STATE.cancel_requested if STATE else None,
+)
+# PDF pages are extracted in worker processes; created on first use.
+PARSE_POOL = None
+
+
+async def _run_cpu(fn, *args, **kwargs):
+    """
+    Run blocking work on CPU_EXECUTOR without blocking the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(CPU_EXECUTOR, functools.partial(ctx.run, fn, *args, **kwargs))
+
+@app.on_event("startup")
+def startup_event():
+    """
+    Start loading the embedding model and the saved KB. With MODEL_LOAD_BACKGROUND (the
+    default) this happens on a background thread, so the server accepts requests within
+    the time it takes to import this module: GET /health answers at once, GET /ready
+    turns 200 once the model is loaded, and endpoints that need it return 503 until then.
+    """
+    gen_cache_mod.configure(GEN_CACHE_SIZE, GEN_CACHE_TTL, Path(GEN_CACHE_PATH) if GEN_CACHE_PATH else None)
+    if MODEL_LOAD_BACKGROUND:
+        threading.Thread(target=_load_models, name="qa-model-load", daemon=True).start()
+    else:
+        _load_models()
+        if MODEL_ERROR is not None:
+            raise RuntimeError(MODEL_ERROR)
+
+
+def _load_models():
+    """
+    Load the embedding model, the vector store, chunk store and lexical index, and the
+    saved KB; mark the app ready when done (or record the error).
+    """
+    global EMBEDDER, VECTOR_STORE, CHUNK_STORE, LEXICAL_INDEX, DEDUP_INDEX, KB_VERSION, MODEL_ERROR, MODEL_LOAD_SECONDS
+
+    start = time.perf_counter()
+    try:
+        with metrics_mod.span("model_load"):
+            embedder = emb_mod.EmbeddingModel(
+                cache_size=EMBED_CACHE_SIZE,
+                cache_dir=Path(EMBED_CACHE_DIR) if EMBED_CACHE_DIR else None,
+                backend=EMBED_BACKEND,
+                onnx_file=EMBED_ONNX_FILE or None,
+            )
+        dim = embedder.dim
+        EMBEDDER = embedder
+        VECTOR_STORE = vs_mod.FaissStore(dim=dim, index_type=INDEX_TYPE, params=INDEX_PARAMS, storage=VECTOR_STORAGE)
+        CHUNK_STORE = chunk_mod.ChunkStore(KB_DIR)
+        LEXICAL_INDEX = lex_mod.BM25Index()
+        DEDUP_INDEX = _new_dedup_index()
+        if STATE is not None:
+            KB_VERSION = STATE.get_counter("kb_version")
+            _sync_pages()
+        with metrics_mod.span("kb_load"):
+            _load_kb(dim)
+        app.logger = getattr(app, "logger", None)
+    except Exception as e:
+        MODEL_ERROR = f"{type(e).__name__}: {e}"
+        print("Failed to initialize embedding model or vector store:", e)
+        traceback.print_exc()
+        return
+    MODEL_LOAD_SECONDS = time.perf_counter() - start
+    MODEL_READY.set()
+
+
+def _new_dedup_index():
+    """
+    Empty dedup index for DEDUP_MODE, or None when dedup is off.
+    """
+    if DEDUP_MODE not in dedup_mod.MODES:
+        raise ValueError(f"Unknown DEDUP_MODE {DEDUP_MODE!r}, expected one of {dedup_mod.MODES}")
+    if DEDUP_MODE == "off":
+        return None
+    return dedup_mod.DedupIndex(DEDUP_THRESHOLD, near=DEDUP_MODE == "minhash")
+
+
+def _require_ready():
+    """
+    Raise 503 (with Retry-After) while the embedding model is still loading, or 500 if loading failed.
+    """
+    if MODEL_READY.is_set():
+        return
+    if MODEL_ERROR is not None:
+        raise HTTPException(status_code=500, detail=f"Embedding model failed to load: {MODEL_ERROR}")
+    raise HTTPException(status_code=503, detail="Embedding model is still loading, retry shortly.",
+                        headers={"Retry-After": "2"})
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await llm_mod.aclose()
+    GENERATED_TESTCASES.flush()
+    gen_cache_mod.GENERATION_CACHE.flush()
+
+
+@app.middleware("http")
+async def shared_state_sync(request, call_next):
+    """
+    Shared-state mode: bring this worker up to date (KB version, pages) before
+    handling the request; throttled to once per SHARED_SYNC_INTERVAL.
+    """
+    if STATE is not None and MODEL_READY.is_set() and time.monotonic() - _LAST_SYNC >= SHARED_SYNC_INTERVAL:
+        await _run_cpu(_sync_shared_state)
+    return await call_next(request)
+
+
+@app.middleware("http")
+async def request_metrics(request, call_next):
+    """
+    Record request latency per route. A request with the header "X-Timing: 1" also
+    gets a Server-Timing header with its per-stage breakdown (milliseconds; stages
+    that run while a streamed body is sent are not included).
+    """
+    token = metrics_mod.start_breakdown() if request.headers.get("x-timing") == "1" else None
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        route = request.scope.get("route")
+        metrics_mod.REQUEST_SECONDS.observe(
+            elapsed, method=request.method, path=getattr(route, "path", "unmatched"), status=status,
+        )
+    if token is not None:
+        timings = metrics_mod.end_breakdown(token)
+        response.headers["Server-Timing"] = ", ".join(
+            [f"{stage};dur={secs * 1000:.2f}" for stage, secs in timings.items()] + [f"total;dur={elapsed * 1000:.2f}"]
+        )
+    return response
+
+
+def _sync_shared_state():
+    """
+    Hot-reload the KB after a build in another worker and pick up pages uploaded to
+    other workers. The KB is not reloaded while a build holds the lock on kb/.
+    """
+    global _LAST_SYNC
+    with _SYNC_LOCK:
+        if time.monotonic() - _LAST_SYNC < SHARED_SYNC_INTERVAL:
+            return
+        _LAST_SYNC = time.monotonic()
+        if STATE.get_counter("kb_version") != KB_VERSION:
+            lock = state_mod.FileLock(BUILD_LOCK_PATH)
+            if lock.acquire(timeout=0):
+                try:
+                    _reload_kb_if_stale()
+                finally:
+                    lock.release()
+        _sync_pages()
+
+
+def _reload_kb_if_stale():
+    """
+    Reload kb/ if another worker has published a newer KB version. Caller holds the build lock.
+    """
+    global KB_VERSION
+    version = STATE.get_counter("kb_version")
+    if version != KB_VERSION:
+        _load_kb(EMBEDDER.dim)
+        KB_VERSION = version
+
+
+def _sync_pages():
+    """
+    Index pages that were uploaded (or replaced) in another worker.
+    """
+    for name, digest in STATE.page_hashes().items():
+        current = HTML_PAGES.get(name)
+        if current is None or current.content_hash != digest:
+            html = STATE.get_page_html(name)
+            if html is not None:
+                HTML_PAGES[name] = sel_index_mod.get_index(html)
+
+
+def _load_kb(dim: int):
+    """
+    Restore the vector store, chunk metadata, chunk texts, lexical and dedup indexes and build manifest
+    persisted under kb/. Leaves the empty store in place if nothing was saved or the saved
+    KB is unusable.
+    """
+    global VECTOR_STORE, CHUNK_STORE, LEXICAL_INDEX, DEDUP_INDEX, INGESTED_CHUNKS, BUILD_MANIFEST
+    try:
+        store = vs_mod.FaissStore.load(KB_DIR)
+        manifest = manifest_mod.BuildManifest.load(KB_DIR)
+        chunks = chunk_mod.ChunkStore.load(KB_DIR)
+        lexical = lex_mod.BM25Index.load(KB_DIR)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        print("Ignoring unreadable saved KB, run /build_kb to rebuild:", e)
+        return
+    if (
+        store.dim != dim or store.index_type != INDEX_TYPE or store.storage != VECTOR_STORAGE
+        or manifest.total_ids() != store.count() or chunks.count() != store.count()
+        or lexical.count() != store.count()
+    ):
+        print("Ignoring saved KB that does not match the current model, index type, vector storage, manifest, chunk store or lexical index, run /build_kb to rebuild")
+        return
+    if store.needs_retrain():
+        print(f"Saved ivfpq index was trained on {store.trained_on} vectors but serves {store.count()}, run /build_kb to retrain it")
+    dedup = None
+    if DEDUP_MODE != "off":
+        try:
+            dedup = dedup_mod.DedupIndex.load(KB_DIR, DEDUP_THRESHOLD, near=DEDUP_MODE == "minhash")
+        except (FileNotFoundError, ValueError):
+            dedup = None
+        if dedup is None or dedup.count() != store.count():
+            ids = [m["vector_id"] for m in store.all_metadata()]
+            dedup = dedup_mod.DedupIndex.from_texts(chunks.get_many(ids), DEDUP_THRESHOLD, near=DEDUP_MODE == "minhash")
+    VECTOR_STORE = store
+    CHUNK_STORE = chunks
+    LEXICAL_INDEX = lexical
+    DEDUP_INDEX = dedup
+    BUILD_MANIFEST = manifest
+    INGESTED_CHUNKS = store.all_metadata()
+
+
+async def _save_file_to_assets(upload: UploadFile, filename: str = None) -> Path:
+    filename = filename or upload.filename
+    dest = ASSETS_DIR / filename
+
+    data = await upload.read()
+    await _run_cpu(dest.write_bytes, data)
+    return dest
+
+def _parse_pool() -> ProcessPoolExecutor:
+    """
+    Process pool used to extract PDF pages in parallel.
+    Uses the spawn start method, since forking a process that runs threads is unsafe.
+    """
+    global PARSE_POOL
+    if PARSE_POOL is None:
+        PARSE_POOL = ProcessPoolExecutor(max_workers=PARSE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return PARSE_POOL
+
+def _parse_and_chunk(file_path: Path, filename: str):
+    """
+    Parse a file based on extension and lazily yield its chunks as
+    (chunk_text, char_start, char_end). PDFs are parsed page by page on the parse pool.
+    """
+    segments = parser_mod.iter_file_text(file_path, pdf_executor=_parse_pool())
+    kind = chunker_mod.kind_for(filename)
+    if CHUNK_TOKENS > 0:
+        chunks = parser_mod.iter_chunks_stream(
+            segments, chunk_size=CHUNK_TOKENS, overlap=CHUNK_TOKENS * CHUNK_OVERLAP // CHUNK_SIZE,
+            window=CHUNK_TOKENS * 4 * 16, kind=kind, length=EMBEDDER.count_tokens,
+        )
+    else:
+        chunks = parser_mod.iter_chunks_stream(segments, chunk_size=CHUNK_SIZE, overlap=CHUNK_OVERLAP, kind=kind)
+    return metrics_mod.timed_iter("parse_and_chunk", chunks)
+
+
+
+@app.post("/upload_support_doc")
+async def upload_support_doc(file: UploadFile = File(...)):
+    """
+    Upload a support document (md/txt/json/pdf/html). File is saved to assets/.
+    Returns basic metadata.
+    """
+    try:
+        saved = await _save_file_to_assets(file)
+        return JSONResponse({"status": "ok", "filename": saved.name, "path": str(saved)})
+    except Exception as e:
+        tb = traceback.format_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to save file: {e}\n{tb}")
+
+@app.post("/upload_checkout_html")
+async def upload_checkout_html(file: UploadFile = File(...), page_name: str = Form("checkout")):
+    """
+    Upload an HTML page under test (checkout.html by default; pass page_name for others
+    such as cart or payment). The page is saved to assets/<page_name>.html and parsed once
+    into a selector index that script generation reads from.
+    """
+    global HTML_PAGES
+    if not re.fullmatch(r"[A-Za-z0-9_-]+", page_name):
+        raise HTTPException(status_code=400, detail="page_name may only contain letters, digits, '_' and '-'")
+    try:
+        saved = await _save_file_to_assets(file, filename=f"{page_name}.html")
+
+        content = saved.read_text(encoding="utf-8", errors="ignore")
+        index = await _run_cpu(sel_index_mod.get_index, content)
+        HTML_PAGES[page_name] = index
+        if STATE is not None:
+            await _run_cpu(STATE.put_page, page_name, content, index.content_hash)
+        return JSONResponse({
+            "status": "ok", "filename": saved.name, "page_name": page_name,
+            "content_hash": index.content_hash, "elements": len(index.elements),
+            "message": f"{saved.name} uploaded and parsed",
+        })
+    except Exception as e:
+        tb = traceback.format_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to upload {page_name}.html: {e}\n{tb}")
+
+@app.get("/pages")
+async def list_pages():
+    """
+    Uploaded pages with their content hash and indexed element count.
+    """
+    return {"pages": [
+        {"page_name": name, "content_hash": index.content_hash, "elements": len(index.elements)}
+        for name, index in HTML_PAGES.items()
+    ]}
+
+@app.get("/pages/{page_name}/selectors")
+async def get_page_selectors(page_name: str):
+    """
+    Full selector index of one uploaded page.
+    """
+    if page_name not in HTML_PAGES:
+        raise HTTPException(status_code=404, detail="page_name not found")
+    return JSONResponse(HTML_PAGES[page_name].to_dict())
+
+def _pages_for(page_name: Optional[str]) -> dict:
+    """
+    Selector indexes to generate a script against: the named page, or every uploaded
+    page when page_name is not given.
+    """
+    if not HTML_PAGES:
+        raise HTTPException(status_code=400, detail="checkout.html not uploaded. Upload via /upload_checkout_html")
+    if page_name is None:
+        return dict(HTML_PAGES)
+    if page_name not in HTML_PAGES:
+        raise HTTPException(status_code=404, detail=f"Page '{page_name}' not uploaded")
+    return {page_name: HTML_PAGES[page_name]}
+
+def _selector_summary(pages: dict, testcase: dict) -> str:
+    """
+    Selector summary for one testcase, ranked by relevance and trimmed to
+    SELECTOR_TOKEN_BUDGET; blocking (may embed element labels), run via _run_cpu.
+    """
+    with metrics_mod.span("extract_selectors"):
+        return sel_index_mod.combined_summary(
+            pages, query=sb_mod.testcase_query(testcase), max_tokens=SELECTOR_TOKEN_BUDGET,
+            embedder=EMBEDDER if MODEL_READY.is_set() else None,
+        )
+
+def _build_kb_job(job: jobs_mod.BuildJob) -> dict:
+    """
+    Run a KB build while holding the cross-process lock on kb/, so builds in different
+    workers never interleave. In shared-state mode the build starts from the newest KB
+    another worker may have published, and publishes its own by bumping the KB version.
+    """
+    lock = state_mod.FileLock(BUILD_LOCK_PATH)
+    lock.acquire(check=job.check_cancelled)
+    try:
+        if STATE is not None:
+            _reload_kb_if_stale()
+        return _build_kb(job)
+    finally:
+        lock.release()
+
+
+def _build_kb(job: jobs_mod.BuildJob) -> dict:
+    """
+    Incrementally build the knowledge base from the files present in assets/.
+    - Skips files whose content hash and chunker settings match the build manifest
+    - Parses, chunks and embeds new or edited files, replacing their old vectors
+    - Evicts vectors of files that were deleted from assets/
+    - Merges chunks that duplicate one already in the KB (DEDUP_MODE) into it instead
+      of embedding them: the kept chunk's "sources" lists every file it came from
+    Changes are applied to copies of the store, chunk texts, lexical index, dedup index
+    and manifest; the live ones keep serving queries and are swapped out only when the
+    build completes.
+    """
+    global INGESTED_CHUNKS, VECTOR_STORE, CHUNK_STORE, LEXICAL_INDEX, DEDUP_INDEX, BUILD_MANIFEST, KB_VERSION
+    settings = {
+        "chunk_size": CHUNK_SIZE,
+        "overlap": CHUNK_OVERLAP,
+        "chunker": CHUNKER_VERSION,
+        "chunk_tokens": CHUNK_TOKENS,
+        "model": EMBEDDER.model_id,
+        "dedup": f"minhash:{DEDUP_THRESHOLD}" if DEDUP_MODE == "minhash" else DEDUP_MODE,
+    }
+    store, manifest, chunks = VECTOR_STORE, BUILD_MANIFEST.copy(), CHUNK_STORE.copy()
+    lexical = LEXICAL_INDEX.copy()
+    dedup = DEDUP_INDEX.copy() if DEDUP_INDEX is not None else None
+    near = DEDUP_MODE == "minhash"
+    copied = False
+
+    def writable():
+        nonlocal store, copied
+        if not copied:
+            store, copied = store.copy(), True
+        return store
+
+    added, skipped, removed, merged = 0, 0, 0, 0
+
+    def forget(name: str) -> set:
+        """
+        Evict a file's chunks and take it out of the sources of chunks it was merged
+        into. Returns the other files merged into the evicted chunks, which have to be
+        ingested again since the chunk that stood for them is gone.
+        """
+        nonlocal removed
+        for vid in manifest.merged(name):
+            for meta in store.get_metadata([vid]):
+                writable().update_metadata(vid, sources=[s for s in meta.get("sources", [meta["source"]]) if s != name])
+        old_ids = manifest.forget(name)
+        if not old_ids:
+            return set()
+        orphaned = {s for meta in store.get_metadata(old_ids) for s in meta.get("sources", [])[1:]}
+        removed += writable().remove(old_ids)
+        chunks.remove(old_ids)
+        lexical.remove(old_ids)
+        if dedup is not None:
+            dedup.remove(old_ids)
+        return orphaned
+
+    assets = [p for p in sorted(ASSETS_DIR.iterdir()) if p.is_file() and p.suffix.lower() in SUPPORTED_EXTS]
+    job.update(files_total=len(assets))
+    digests = {}
+    pending = []
+    for p in assets:
+        job.check_cancelled()
+        digests[p.name] = manifest_mod.file_digest(p)
+        if not manifest.is_current(p.name, digests[p.name], settings):
+            pending.append(p.name)
+    pending.extend(manifest.stale(digests))
+
+    todo = set(pending)
+    while pending:
+        for name in forget(pending.pop()):
+            if name in digests and name not in todo:
+                todo.add(name)
+                pending.append(name)
+    changed = [(p, digests[p.name]) for p in assets if p.name in todo]
+    skipped = len(assets) - len(changed)
+    job.incr(files_parsed=skipped)
+
+    def records():
+        # Runs on the prefetch thread: parsing, chunking and dedup signatures overlap with embedding.
+        for p, _ in changed:
+            n = 0
+            for n, (chunk, start, end) in enumerate(_parse_and_chunk(p, p.name), start=1):
+                job.incr(chunks_total=1)
+                sig = dedup_mod.signature(chunk, near) if dedup is not None else None
+                yield p.name, n - 1, chunk, start, end, sig
+            job.incr(files_parsed=1)
+            metrics_mod.CHUNKS.inc(n, stage="parsed")
+
+    file_ids = {p.name: [] for p, _ in changed}
+    file_merged = {p.name: [] for p, _ in changed}
+    batches = pipeline_mod.prefetch(pipeline_mod.batched(records(), EMBED_BATCH_SIZE), maxsize=PREFETCH_BATCHES)
+    try:
+        for batch in batches:
+            job.check_cancelled()
+            ids, metadatas, texts = [], {}, []
+            for name, idx, chunk, start, end, sig in batch:
+                dup = dedup.find(sig) if dedup is not None else None
+                if dup is not None:
+                    meta = metadatas.get(dup) or store.get_metadata([dup])[0]
+                    sources = meta.get("sources") or [meta["source"]]
+                    if name not in sources:
+                        if dup in metadatas:
+                            sources.append(name)
+                        else:
+                            writable().update_metadata(dup, sources=sources + [name])
+                        file_merged[name].append(dup)
+                    merged += 1
+                    continue
+                vid = manifest.allocate_ids(1)[0]
+                metadatas[vid] = {
+                    "vector_id": vid,
+                    "source": name,
+                    "sources": [name],
+                    "chunk_id": idx,
+                    "char_start": start,
+                    "char_end": end,
+                    "text_preview": chunk[:200],
+                }
+                if dedup is not None:
+                    dedup.add(vid, sig)
+                file_ids[name].append(vid)
+                ids.append(vid)
+                texts.append(chunk)
+            if ids:
+                vectors = EMBEDDER.embed(texts)
+                writable().add(vectors.astype("float32"), list(metadatas.values()), ids)
+                chunks.add(ids, texts)
+                lexical.add(ids, texts)
+            job.incr(chunks_embedded=len(batch))
+            metrics_mod.CHUNKS.inc(len(ids), stage="embedded")
+            metrics_mod.CHUNKS.inc(len(batch) - len(ids), stage="deduplicated")
+    finally:
+        batches.close()
+
+    for p, digest in changed:
+        manifest.record(p.name, digest, settings, file_ids[p.name], file_merged[p.name])
+        added += len(file_ids[p.name])
+
+    job.check_cancelled()
+    store.flush()
+    if store.needs_retrain():
+        # The ivfpq lists were sized for the first build; retrain on the original vectors
+        # (mostly served by the embedding cache) now that the corpus has outgrown it.
+        print(f"Retraining the ivfpq index: trained on {store.trained_on} vectors, serving {store.count()}")
+        ids = [m["vector_id"] for m in store.all_metadata()]
+        texts = chunks.get_many(ids)
+        vectors = []
+        for start in range(0, len(ids), EMBED_BATCH_SIZE):
+            job.check_cancelled()
+            vectors.append(EMBEDDER.embed([texts[i] for i in ids[start:start + EMBED_BATCH_SIZE]]).astype("float32"))
+        writable().retrain(np.vstack(vectors), ids)
+    if copied or not (KB_DIR / manifest_mod.MANIFEST_FILE).exists():
+        store.save(KB_DIR)
+        chunks.save()
+        lexical.save(KB_DIR)
+        if dedup is not None:
+            dedup.save(KB_DIR)
+        manifest.save(KB_DIR)
+        if STATE is not None:
+            KB_VERSION = STATE.bump_counter("kb_version")
+
+    # Swap in the new KB; requests already holding the old store finish against it.
+    VECTOR_STORE, CHUNK_STORE, LEXICAL_INDEX, DEDUP_INDEX, BUILD_MANIFEST = store, chunks, lexical, dedup, manifest
+    INGESTED_CHUNKS = store.all_metadata()
+    if not INGESTED_CHUNKS:
+        return {"status": "no_data", "message": "No valid files/chunks found in assets/ to build KB."}
+    return {
+        "status": "ok",
+        "ingested_chunks": len(INGESTED_CHUNKS),
+        "added_chunks": added,
+        "deduplicated_chunks": merged,
+        "removed_chunks": removed,
+        "skipped_files": skipped,
+    }
+
+
+@app.post("/build_kb")
+async def build_kb():
+    """
+    Start a background knowledge-base build and return its job id immediately.
+    Poll GET /build_kb/{job_id} for progress; POST /build_kb/{job_id}/cancel to stop it.
+    If a build is already queued, that job is returned instead of queueing another.
+    """
+    _require_ready()
+    job = BUILD_JOBS.submit(_build_kb_job)
+    return JSONResponse({"status": "accepted", "job_id": job.id, "job": job.to_dict()}, status_code=202)
+
+@app.get("/build_kb/{job_id}")
+async def build_kb_status(job_id: str):
+    """
+    Progress of a KB build: files parsed, chunks embedded, chunks/sec and ETA.
+    In shared-state mode, jobs running in other workers are reported from the state store.
+    """
+    job = BUILD_JOBS.get(job_id)
+    if job is not None:
+        return JSONResponse(job.to_dict())
+    snapshot = await _run_cpu(STATE.get_job, job_id) if STATE is not None else None
+    if snapshot is None:
+        raise HTTPException(status_code=404, detail="Build job not found")
+    return JSONResponse(snapshot)
+
+@app.post("/build_kb/{job_id}/cancel")
+async def cancel_build_kb(job_id: str):
+    """
+    Cancel a queued or running KB build. The previous knowledge base stays in place.
+    In shared-state mode a job running in another worker stops at its next checkpoint.
+    """
+    job = BUILD_JOBS.get(job_id)
+    if job is not None:
+        job.cancel()
+        return JSONResponse(job.to_dict())
+    if STATE is None or not await _run_cpu(STATE.request_cancel, job_id):
+        raise HTTPException(status_code=404, detail="Build job not found")
+    return JSONResponse(await _run_cpu(STATE.get_job, job_id))
+
+def _context_chunks(retrieved: list) -> List[str]:
+    """
+    Format retrieved chunks as context strings for the LLM prompt: full chunk texts
+    from the chunk store, merged and deduplicated, packed up to CONTEXT_TOKEN_BUDGET.
+    """
+    texts = CHUNK_STORE.get_many(r["vector_id"] for r in retrieved if "vector_id" in r) if CHUNK_STORE else {}
+    passages = rag_mod.assemble_context(retrieved, texts, max_tokens=CONTEXT_TOKEN_BUDGET)
+    metrics_mod.CHUNKS.inc(len(passages), stage="prompt")
+    return passages
+
+
+def _retrieve(queries: List[str], top_k: int) -> list:
+    """
+    Retrieve top_k chunks per query; blocking, run via _run_cpu.
+    In the default hybrid mode, dense (FAISS) and lexical (BM25) candidates are fused
+    with reciprocal rank fusion, so exact terms such as coupon codes, field ids and API
+    paths are found even when embeddings miss them. Each result carries the fused
+    "score" plus "dense_score" / "lexical_score" from the retrievers that found it.
+    """
+    with metrics_mod.span("retrieve"):
+        results = _search(list(queries), top_k)
+    metrics_mod.CHUNKS.inc(sum(len(r) for r in results), stage="retrieved")
+    return results
+
+
+def _search(queries: List[str], top_k: int) -> list:
+    """
+    The retrieval behind _retrieve (see there), without the timing and counters.
+    """
+    store, lexical = VECTOR_STORE, LEXICAL_INDEX
+    if RETRIEVAL_MODE == "dense":
+        return store.query_batch(EMBEDDER.embed(queries).astype("float32"), top_k=top_k)
+
+    depth = max(top_k, RETRIEVAL_CANDIDATES)
+    if RETRIEVAL_MODE == "lexical":
+        dense_all = [[] for _ in queries]
+    else:
+        dense_all = store.query_batch(EMBEDDER.embed(queries).astype("float32"), top_k=depth)
+
+    results = []
+    for query, dense in zip(queries, dense_all):
+        lex = lexical.query(query, top_k=depth)
+        dense_scores = {m["vector_id"]: m["score"] for m in dense}
+        lex_scores = dict(lex)
+        fused = lex_mod.rrf_fuse([list(dense_scores), [vid for vid, _ in lex]], k=RRF_K, top_k=top_k)
+        hits = []
+        for vid, score in fused:
+            for meta in store.get_metadata([vid]):
+                hits.append({**meta, "score": score, "dense_score": dense_scores.get(vid), "lexical_score": lex_scores.get(vid)})
+        results.append(hits)
+    return results
+
+
+def _store_testcases(user_request: str, retrieved: list, generated_text: str, tc_id: str = None, status: str = "complete", testcases: list = None) -> str:
+    """
+    Store generated testcases and return their id.
+    The output is parsed into a testcase list once, here, unless the caller already
+    parsed it (streaming); script generation then indexes that list directly.
+    """
+    previous = GENERATED_TESTCASES.get(tc_id) if tc_id else None
+    tc_id = tc_id or str(uuid.uuid4())
+    if testcases is None:
+        testcases = tc_parser_mod.parse_testcases(generated_text) if generated_text else []
+    GENERATED_TESTCASES[tc_id] = {
+        "request": user_request, "retrieved": retrieved, "output": generated_text,
+        "status": status, "testcases": testcases,
+        "created_at": previous["created_at"] if previous else time.time(),
+    }
+    return tc_id
+
+
+@app.post("/generate_testcases")
+async def generate_testcases(
+    user_request: str = Form(...), 
+    top_k: int = 5,
+    x_groq_api_key: str = Header(None),
+    x_llm_provider: str = Header("groq")
+):
+    """
+    RAG pipeline:
+    - Embed the user's request
+    - Retrieve top_k chunks from VECTOR_STORE
+    - Call the LLM agent to generate structured testcases (JSON text)
+    Stores the generated testcases in memory and returns an id to fetch them.
+    """
+    global VECTOR_STORE, EMBEDDER
+    _require_ready()
+    if VECTOR_STORE is None:
+        raise HTTPException(status_code=500, detail="Vector store not initialized. Call /build_kb first.")
+    try:
+        retrieved = (await _run_cpu(_retrieve, [user_request], top_k))[0]  # list of metadata dicts
+
+        context_chunks = _context_chunks(retrieved)
+        generated_text = await rag_mod.generate_testcases_async(context_chunks, user_request, api_key=x_groq_api_key, provider=x_llm_provider)
+
+        tc_id = await _run_cpu(_store_testcases, user_request, retrieved, generated_text)
+        return JSONResponse({"status": "ok", "testcases_id": tc_id, "preview": generated_text[:1000]})
+    except Exception as e:
+        tb = traceback.format_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to generate testcases: {e}\n{tb}")
+
+@app.post("/generate_testcases/stream")
+async def generate_testcases_stream(
+    user_request: str = Form(...),
+    top_k: int = 5,
+    x_groq_api_key: str = Header(None),
+    x_llm_provider: str = Header("groq")
+):
+    """
+    Streaming variant of /generate_testcases: the LLM output is forwarded as a chunked
+    text/plain response while it is generated. The testcases id is returned up front in
+    the X-Testcases-Id header; the stored entry has status "streaming" until the stream
+    ends and is then finalized with the full output and status "complete", or with the
+    partial output and status "incomplete" (provider stream failed) or "aborted" (client
+    disconnected).
+    """
+    _require_ready()
+    if VECTOR_STORE is None:
+        raise HTTPException(status_code=500, detail="Vector store not initialized. Call /build_kb first.")
+    try:
+        retrieved = (await _run_cpu(_retrieve, [user_request], top_k))[0]
+    except Exception as e:
+        tb = traceback.format_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve context: {e}\n{tb}")
+
+    tc_id = await _run_cpu(_store_testcases, user_request, retrieved, "", status="streaming")
+    entry = await _run_cpu(GENERATED_TESTCASES.__getitem__, tc_id)
+    tc_parser = tc_parser_mod.IncrementalTestcaseParser()
+
+    async def finalize(output: str, status: str):
+        # A stream that broke off or was abandoned keeps its partial output, marked as such.
+        await _run_cpu(
+            _store_testcases, user_request, retrieved, output, tc_id=tc_id, status=status,
+            testcases=entry["testcases"] + tc_parser.close(),
+        )
+
+    tokens = rag_mod.stream_testcases(
+        _context_chunks(retrieved), user_request,
+        api_key=x_groq_api_key, provider=x_llm_provider, on_complete=finalize,
+    )
+
+    async def body():
+        # Each testcase becomes selectable as soon as its closing brace is streamed.
+        try:
+            async for token in tokens:
+                parsed = tc_parser.feed(token)
+                if parsed:
+                    entry["testcases"].extend(parsed)
+                    await _run_cpu(GENERATED_TESTCASES.put, tc_id, entry)
+                yield token
+        finally:
+            await tokens.aclose()
+
+    return StreamingResponse(body(), media_type="text/plain; charset=utf-8", headers={"X-Testcases-Id": tc_id})
+
+@app.post("/generate_testcases_bulk")
+async def generate_testcases_bulk(
+    user_requests: List[str] = Form(...),
+    top_k: int = 5,
+    x_groq_api_key: str = Header(None),
+    x_llm_provider: str = Header("groq")
+):
+    """
+    Bulk RAG pipeline for many feature requests at once:
+    - Embeds all requests in a single EmbeddingModel.embed call
+    - Retrieves top_k chunks for all of them with one FAISS search
+    - Fans the LLM calls out concurrently (at most LLM_CONCURRENCY at a time)
+    A failed LLM call is reported for that request only; the others still succeed.
+    """
+    global VECTOR_STORE, EMBEDDER
+    _require_ready()
+    if VECTOR_STORE is None:
+        raise HTTPException(status_code=500, detail="Vector store not initialized. Call /build_kb first.")
+    try:
+        retrieved_all = await _run_cpu(_retrieve, user_requests, top_k)
+    except Exception as e:
+        tb = traceback.format_exc()
+        raise HTTPException(status_code=500, detail=f"Failed to retrieve context: {e}\n{tb}")
+
+    semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
+
+    async def _one(user_request: str, retrieved: list) -> dict:
+        async with semaphore:
+            try:
+                generated_text = await rag_mod.generate_testcases_async(
+                    _context_chunks(retrieved), user_request,
+                    api_key=x_groq_api_key, provider=x_llm_provider,
+                )
+            except Exception as e:
+                return {"request": user_request, "status": "error", "error": str(e)}
+        tc_id = await _run_cpu(_store_testcases, user_request, retrieved, generated_text)
+        return {"request": user_request, "status": "ok", "testcases_id": tc_id, "preview": generated_text[:1000]}
+
+    results = await asyncio.gather(*(_one(r, ret) for r, ret in zip(user_requests, retrieved_all)))
+    return JSONResponse({"status": "ok", "results": results})
+
+@app.get("/testcases")
+async def list_testcases(offset: int = 0, limit: int = 50, status: Optional[str] = None):
+    """
+    Page through stored testcases, newest first. Returns summaries only (request,
+    status, number of testcases); fetch an entry with /testcases/{id}.
+    """
+    if offset < 0 or not 1 <= limit <= 500:
+        raise HTTPException(status_code=400, detail="offset must be >= 0 and limit between 1 and 500")
+    items, total = await _run_cpu(GENERATED_TESTCASES.list, offset, limit, status)
+    return JSONResponse({"items": items, "total": total, "offset": offset, "limit": limit})
+
+@app.get("/testcases/{tc_id}")
+async def get_testcases(tc_id: str):
+    """
+    Retrieve previously generated testcases by id.
+    """
+    entry = await _run_cpu(GENERATED_TESTCASES.get, tc_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Testcases id not found")
+    return JSONResponse(entry)
+
+def _select_testcase(testcases_id: str, testcase_index: int, item: Optional[dict] = None) -> dict:
+    """
+    Return the selected testcase from the list parsed when testcases_id was stored,
+    falling back to a testcase that wraps the raw output when nothing could be parsed.
+    While the output is still streaming, only testcases already completed are available.
+    item is the stored entry if the caller has already read it. Reads and writes the
+    testcase store, so call it through _run_cpu.
+    """
+    if item is None:
+        item = GENERATED_TESTCASES.get(testcases_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="testcases_id not found")
+    out_text = item.get("output", "")
+    testcases = item.get("testcases")
+    if testcases is None:
+        testcases = item["testcases"] = tc_parser_mod.parse_testcases(out_text)
+        GENERATED_TESTCASES[testcases_id] = item
+
+    if 0 <= testcase_index < len(testcases):
+        return testcases[testcase_index]
+    if item.get("status") == "streaming":
+        raise HTTPException(status_code=409, detail="testcase_index not generated yet; the testcases are still streaming")
+    if testcases:
+        raise HTTPException(status_code=400, detail="testcase_index out of range")
+
+    return {
+        "Test_ID": f"TC-UNKNOWN-{testcases_id[:8]}",
+        "Feature": "Unknown (raw agent output)",
+        "Steps": [f"Follow agent output: {out_text[:400]}"],
+        "Expected_Result": "As per agent output",
+        "Grounded_In": list(dict.fromkeys(
+            s for d in item.get("retrieved", []) for s in (d.get("sources") or [d.get("source")])
+        )),
+    }
+
+@app.post("/generate_selenium_script")
+async def generate_selenium_script(
+    testcases_id: str = Form(...), 
+    testcase_index: int = Form(0),
+    page_name: Optional[str] = Form(None),
+    x_groq_api_key: str = Header(None),
+    x_llm_provider: str = Header("groq")
+):
+    """
+    Generate a runnable Selenium Python script for one selected testcase.
+    Inputs:
+      - testcases_id: id received from /generate_testcases
+      - testcase_index: index into the JSON array or the selection
+      - page_name: uploaded page whose selectors to use (all pages if omitted)
+    Behavior:
+      - Looks up the testcase parsed when the output was stored
+      - Reads the selector index of page_name (all uploaded pages if omitted)
+      - Calls selenium_builder to create Python code
+    """
+    global GENERATED_TESTCASES, HTML_PAGES
+    testcase = await _run_cpu(_select_testcase, testcases_id, testcase_index)
+
+    selectors = await _run_cpu(_selector_summary, _pages_for(page_name), testcase)
+
+    script_code = await sb_mod.build_script_async(testcase, selectors, api_key=x_groq_api_key, provider=x_llm_provider)
+
+
+    return PlainTextResponse(script_code, media_type="text/x-python")
+
+@app.post("/generate_selenium_script/stream")
+async def generate_selenium_script_stream(
+    testcases_id: str = Form(...),
+    testcase_index: int = Form(0),
+    page_name: Optional[str] = Form(None),
+    x_groq_api_key: str = Header(None),
+    x_llm_provider: str = Header("groq")
+):
+    """
+    Streaming variant of /generate_selenium_script: script tokens are forwarded as a
+    chunked text/x-python response while they are generated.
+    """
+    testcase = await _run_cpu(_select_testcase, testcases_id, testcase_index)
+    selectors = await _run_cpu(_selector_summary, _pages_for(page_name), testcase)
+    tokens = sb_mod.stream_script(testcase, selectors, api_key=x_groq_api_key, provider=x_llm_provider)
+    return StreamingResponse(tokens, media_type="text/x-python; charset=utf-8")
+
+@app.post("/generate_selenium_scripts")
+async def generate_selenium_scripts(
+    testcases_id: str = Form(...),
+    testcase_indices: Optional[List[int]] = Form(None),
+    output_format: str = Form("zip"),
+    max_concurrency: int = Form(LLM_CONCURRENCY),
+    page_name: Optional[str] = Form(None),
+    x_groq_api_key: str = Header(None),
+    x_llm_provider: str = Header("groq")
+):
+    """
+    Batch variant of /generate_selenium_script for a whole testcase set.
+    Inputs:
+      - testcases_id: id received from /generate_testcases
+      - testcase_indices: indices to generate (repeat the field; duplicates are ignored);
+        all testcases if omitted
+      - output_format: "zip" (one script per testcase plus report.json) or "pytest"
+        (a single test module with one test function per testcase)
+      - max_concurrency: concurrent LLM calls, capped at LLM_CONCURRENCY
+      - page_name: page whose selectors to use (all uploaded pages if omitted)
+    Pages are parsed once at upload; each testcase gets its own relevance-ranked
+    selector summary. A failed item is recorded in the
+    report (zip) or as a skipped test (pytest); the rest of the batch still completes.
+    """
+    if output_format not in ("zip", "pytest"):
+        raise HTTPException(status_code=400, detail="output_format must be 'zip' or 'pytest'")
+    item = await _run_cpu(GENERATED_TESTCASES.get, testcases_id)
+    if item is None:
+        raise HTTPException(status_code=404, detail="testcases_id not found")
+    if item.get("status") == "streaming":
+        raise HTTPException(status_code=409, detail="Testcases are still streaming; retry when generation has finished")
+    pages = _pages_for(page_name)
+
+    if testcase_indices is None:
+        testcase_indices = list(range(max(len(item["testcases"]), 1)))
+    # Script and test names come from the index, so each testcase is generated once.
+    testcase_indices = list(dict.fromkeys(testcase_indices))
+    testcases = [await _run_cpu(_select_testcase, testcases_id, i, item) for i in testcase_indices]
+
+    semaphore = asyncio.Semaphore(max(1, min(max_concurrency, LLM_CONCURRENCY)))
+
+    async def _one(index: int, testcase: dict) -> dict:
+        async with semaphore:
+            try:
+                selectors = await _run_cpu(_selector_summary, pages, testcase)
+                script = await sb_mod.build_script_async(testcase, selectors, api_key=x_groq_api_key, provider=x_llm_provider)
+                return {"index": index, "testcase": testcase, "status": "ok", "script": script, "error": None}
+            except Exception as e:
+                return {"index": index, "testcase": testcase, "status": "error", "script": None, "error": str(e)}
+
+    results = await asyncio.gather(*(_one(i, tc) for i, tc in zip(testcase_indices, testcases)))
+
+    if output_format == "pytest":
+        module = sb_mod.bundle_pytest_module(results)
+        return PlainTextResponse(module, media_type="text/x-python", headers={
+            "Content-Disposition": f'attachment; filename="test_{testcases_id[:8]}.py"',
+        })
+    archive = await _run_cpu(sb_mod.bundle_zip, results)
+    return Response(archive, media_type="application/zip", headers={
+        "Content-Disposition": f'attachment; filename="selenium_{testcases_id[:8]}.zip"',
+    })
+
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics: per-stage and per-route latency histograms, chunk, LLM token
+    and cache lookup counters.
+    """
+    return PlainTextResponse(metrics_mod.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/ready")
+async def ready():
+    """
+    Readiness: 200 once the embedding model and saved KB are loaded, 503 while loading
+    (500 if loading failed). GET /health is the liveness check and never waits on the model.
+    """
+    if MODEL_READY.is_set():
+        return {"status": "ready", "model_load_seconds": round(MODEL_LOAD_SECONDS, 3), "kb_chunks": len(INGESTED_CHUNKS)}
+    if MODEL_ERROR is not None:
+        return JSONResponse({"status": "failed", "error": MODEL_ERROR}, status_code=500)
+    return JSONResponse({"status": "loading"}, status_code=503, headers={"Retry-After": "2"})
+
+@app.get("/health")
+async def health():
+    return {
+        "status": "ok",
+        "ready": MODEL_READY.is_set(),
+        "kb_chunks": len(INGESTED_CHUNKS),
+        "has_html": bool(HTML_PAGES),
+        "pages": list(HTML_PAGES),
+        "shared_state": SHARED_STATE,
+        "kb_version": KB_VERSION,
+        "embedding_model": EMBEDDER.model_id if EMBEDDER else None,
+        "vector_storage": VECTOR_STORAGE,
+        "embedding_cache": EMBEDDER.cache.stats() if EMBEDDER else None,
+        "generation_cache": gen_cache_mod.GENERATION_CACHE.stats(),
+        "testcase_store": GENERATED_TESTCASES.stats(),
+    }
+
+
+@app.get("/assets")
+async def list_assets():
+    files = []
+    for f in ASSETS_DIR.iterdir():
+        if f.is_file():
+            files.append({"name": f.name, "path": str(f), "size": f.stat().st_size})
+    return JSONResponse({"assets": files})
@@ -0,0 +1,119 @@
+# backend/app/services/manifest.py
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Dict, Any, List, Iterable
+
+
+MANIFEST_FILE = "manifest.json"
+
+
+def file_digest(path: Path, block_size: int = 1 << 20) -> str:
+    """
+    Return the sha256 hex digest of a file's content, read in blocks.
+    """
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class BuildManifest:
+    """
+    Records which asset files are already in the vector store.
+    Each entry is keyed by filename and holds the content hash, the chunker
+    settings used and the vector ids of its chunks, so /build_kb can skip
+    unchanged files and evict the vectors of edited or deleted ones. Chunks that
+    duplicated another file's chunk get no id; the ids they were merged into are
+    kept under "merged" so the file can be taken out of those chunks' sources.
+    """
+
+    def __init__(self):
+        self.files: Dict[str, Dict[str, Any]] = {}
+        self.next_id = 0
+
+    def is_current(self, name: str, digest: str, settings: Dict[str, Any]) -> bool:
+        """
+        True if `name` was already ingested with the same content and settings.
+        """
+        entry = self.files.get(name)
+        return entry is not None and entry["hash"] == digest and entry["settings"] == settings
+
+    def allocate_ids(self, n: int) -> List[int]:
+        """
+        Reserve n fresh vector ids.
+        """
+        ids = list(range(self.next_id, self.next_id + n))
+        self.next_id += n
+        return ids
+
+    def record(self, name: str, digest: str, settings: Dict[str, Any], ids: List[int], merged: Iterable[int] = ()):
+        """
+        Store (or replace) the entry for an ingested file.
+        """
+        self.files[name] = {"hash": digest, "settings": dict(settings), "ids": list(ids), "merged": list(merged)}
+
+    def merged(self, name: str) -> List[int]:
+        """
+        Ids of other files' chunks that chunks of `name` were merged into as duplicates.
+        """
+        entry = self.files.get(name)
+        return entry.get("merged", []) if entry else []
+
+    def forget(self, name: str) -> List[int]:
+        """
+        Drop the entry for `name` and return the vector ids it owned.
+        """
+        entry = self.files.pop(name, None)
+        return entry["ids"] if entry else []
+
+    def stale(self, present: Iterable[str]) -> List[str]:
+        """
+        Return names that are in the manifest but no longer present in assets/.
+        """
+        present = set(present)
+        return [name for name in self.files if name not in present]
+
+    def copy(self) -> "BuildManifest":
+        """
+        Independent copy for a build that may be cancelled or fail.
+        """
+        other = BuildManifest()
+        other.next_id = self.next_id
+        other.files = {
+            name: {**e, "settings": dict(e["settings"]), "ids": list(e["ids"]), "merged": list(e.get("merged", []))}
+            for name, e in self.files.items()
+        }
+        return other
+
+    def total_ids(self) -> int:
+        """
+        Number of vector ids owned by manifest entries.
+        """
+        return sum(len(e["ids"]) for e in self.files.values())
+
+    def save(self, directory: Path):
+        """
+        Write the manifest to `directory` atomically.
+        """
+        path = Path(directory) / MANIFEST_FILE
+        tmp = path.with_suffix(".tmp")
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump({"next_id": self.next_id, "files": self.files}, f, separators=(",", ":"))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, directory: Path) -> "BuildManifest":
+        """
+        Load a manifest saved with `save`. Raises FileNotFoundError if there is none.
+        """
+        path = Path(directory) / MANIFEST_FILE
+        with path.open("r", encoding="utf-8") as f:
+            data = json.load(f)
+        manifest = cls()
+        manifest.next_id = data["next_id"]
+        manifest.files = data["files"]
+        return manifest
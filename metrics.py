@@ -0,0 +1,207 @@
+# backend/app/services/metrics.py
+
+import bisect
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, Optional, Sequence, Tuple
+
+# Seconds; covers sub-millisecond cache hits up to slow LLM calls.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Stage durations of the current request, when it asked for a timing breakdown.
+_TIMINGS: contextvars.ContextVar[Optional[Dict[str, float]]] = contextvars.ContextVar("qa_timings", default=None)
+
+_REGISTRY = []
+
+
+def _format_labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    """
+    Monotonic counter with labels, rendered in the Prometheus text format. Thread-safe.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value:g}"
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram with labels, rendered in the Prometheus text format.
+    observe() is a bisect and three additions under a lock. Thread-safe.
+    """
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # labels -> [bucket counts, sum, count]
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            if i < len(self.buckets):
+                series[0][i] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((k, (list(s[0]), s[1], s[2])) for k, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                le = 'le="%g"' % bound
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}"
+            le = 'le="+Inf"'
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total:.6f}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+STAGE_SECONDS = Histogram("qa_stage_seconds", "Time spent per pipeline stage", ["stage"])
+REQUEST_SECONDS = Histogram("qa_request_seconds", "HTTP request latency until the response starts", ["method", "path", "status"])
+CHUNKS = Counter("qa_chunks_total", "Chunks processed, by stage (parsed, embedded, deduplicated, retrieved, prompt)", ["stage"])
+LLM_TOKENS = Counter("qa_llm_tokens_total", "LLM tokens (provider usage, or estimated when not reported)", ["provider", "direction"])
+CACHE_REQUESTS = Counter("qa_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+
+
+@contextmanager
+def span(stage: str):
+    """
+    Time the enclosed block into qa_stage_seconds and, if the current request asked
+    for it, into its timing breakdown (durations of repeated stages add up).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def record(stage: str, seconds: float):
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def timed(stage: str):
+    """
+    Decorator form of span for plain and async functions.
+    """
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_iter(stage: str, items: Iterable) -> Iterator:
+    """
+    Yield from items, recording the total time spent producing them (not the time
+    the consumer spends between items) as one observation when the iterator ends.
+    """
+    elapsed = 0.0
+    it = iter(items)
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(it)
+            except StopIteration:
+                return
+            finally:
+                elapsed += time.perf_counter() - start
+            yield item
+    finally:
+        record(stage, elapsed)
+
+
+def start_breakdown() -> contextvars.Token:
+    """
+    Collect a per-stage timing breakdown for the current request, until end_breakdown.
+    """
+    return _TIMINGS.set({})
+
+
+def end_breakdown(token: contextvars.Token) -> Dict[str, float]:
+    """
+    Stop collecting and return the stage durations (seconds) collected since start_breakdown.
+    """
+    timings = _TIMINGS.get() or {}
+    _TIMINGS.reset(token)
+    return timings
+
+
+def breakdown() -> Optional[Dict[str, float]]:
+    """
+    Stage durations (seconds) collected so far in this request, or None if not collecting.
+    """
+    return _TIMINGS.get()
+
+
+def render() -> str:
+    """
+    All metrics in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in _REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
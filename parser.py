@@ -1,50 +1,146 @@
-
-import fitz
-import json
-from typing import List
-from bs4 import BeautifulSoup
-try:
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-except ImportError:
-    from langchain.text_splitter import RecursiveCharacterTextSplitter
-
-def parse_html(html_content: str) -> str:
-    """
-    Parses HTML content and returns plain text.
-    """
-    soup = BeautifulSoup(html_content, "html.parser")
-    return soup.get_text("\n")
-
-def parse_json_bytes(file_bytes: bytes) -> str:
-    """
-    Parses JSON bytes and returns formatted string.
-    """
-    try:
-        parsed = json.loads(file_bytes.decode("utf-8"))
-        return json.dumps(parsed, indent=2)
-    except Exception:
-        return file_bytes.decode("utf-8", errors="ignore")
-
-def parse_pdf_bytes(file_bytes: bytes) -> str:
-    """
-    Parses PDF bytes and returns text.
-    """
-    text = ""
-    try:
-        pdf = fitz.open(stream=file_bytes, filetype="pdf")
-        for page in pdf:
-            text += page.get_text()
-    except Exception as e:
-        text = f"[ERROR PARSING PDF] {str(e)}"
-    return text
-
-def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
-    """
-    Chunks text into smaller pieces.
-    """
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=chunk_size,
-        chunk_overlap=overlap,
-        length_function=len,
-    )
-    return splitter.split_text(text)
+
+import json
+from collections import deque
+from pathlib import Path
+from typing import Callable, List, Iterable, Iterator, Optional, Tuple
+
+from . import metrics
+from .chunker import Chunker
+
+def parse_html(html_content: str) -> str:
+    """
+    Parses HTML content and returns plain text.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, "html.parser")
+    return soup.get_text("\n")
+
+def parse_json_bytes(file_bytes: bytes) -> str:
+    """
+    Parses JSON bytes and returns formatted string.
+    """
+    try:
+        parsed = json.loads(file_bytes.decode("utf-8"))
+        return json.dumps(parsed, indent=2)
+    except Exception:
+        return file_bytes.decode("utf-8", errors="ignore")
+
+def parse_pdf_bytes(file_bytes: bytes) -> str:
+    """
+    Parses PDF bytes and returns text.
+    PyMuPDF is imported here rather than at module load, so it is only paid for
+    once a PDF is actually seen.
+    """
+    try:
+        import fitz
+
+        pdf = fitz.open(stream=file_bytes, filetype="pdf")
+        return "".join(page.get_text() for page in pdf)
+    except Exception as e:
+        return f"[ERROR PARSING PDF] {str(e)}"
+
+def _pdf_page_texts(path: str, start: int, stop: int) -> List[str]:
+    """
+    Extract the text of pages [start, stop) of a PDF file.
+    Top-level so it can run in a process pool worker.
+    """
+    import fitz
+
+    with fitz.open(path) as pdf:
+        return [pdf[i].get_text() for i in range(start, min(stop, pdf.page_count))]
+
+def iter_pdf_pages(path: Path, executor=None, pages_per_task: int = 8, max_in_flight: int = 8) -> Iterator[str]:
+    """
+    Yield the text of each page of a PDF, in order.
+    With an executor (e.g. a ProcessPoolExecutor), page ranges are extracted in
+    parallel, keeping at most max_in_flight ranges outstanding so memory stays bounded.
+    """
+    try:
+        import fitz
+
+        with fitz.open(str(path)) as pdf:
+            page_count = pdf.page_count
+    except Exception as e:
+        yield f"[ERROR PARSING PDF] {str(e)}"
+        return
+
+    ranges = [(s, s + pages_per_task) for s in range(0, page_count, pages_per_task)]
+    if executor is None:
+        for start, stop in ranges:
+            yield from _pdf_page_texts(str(path), start, stop)
+        return
+
+    pending = deque()
+    for start, stop in ranges:
+        pending.append(executor.submit(_pdf_page_texts, str(path), start, stop))
+        if len(pending) >= max_in_flight:
+            yield from pending.popleft().result()
+    while pending:
+        yield from pending.popleft().result()
+
+def iter_file_text(path: Path, pdf_executor=None) -> Iterator[str]:
+    """
+    Yield the plain text of a supported file in segments: one per page for PDFs,
+    a single segment for everything else.
+    """
+    ext = path.suffix.lower()
+    if ext == ".pdf":
+        yield from iter_pdf_pages(path, executor=pdf_executor)
+        return
+    b = path.read_bytes()
+    if ext in [".html", ".htm"]:
+        yield parse_html(b.decode("utf-8", errors="ignore"))
+    elif ext == ".json":
+        yield parse_json_bytes(b)
+    else:
+        yield b.decode("utf-8", errors="ignore")
+
+@metrics.timed("chunk_text")
+def chunk_text(text: str, chunk_size: int = 800, overlap: int = 100, kind: str = "text",
+               length: Optional[Callable[[str], int]] = None) -> List[str]:
+    """
+    Chunks text into smaller pieces (see chunker.Chunker).
+    """
+    return [c for c, _, _ in Chunker(chunk_size, overlap, kind, length).iter_chunks(text)]
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate for prompt budgeting (~4 characters per token for
+    English text with Llama-style tokenizers).
+    """
+    return (len(text) + 3) // 4
+
+def iter_chunks_stream(
+    segments: Iterable[str], chunk_size: int = 800, overlap: int = 100, window: int = None,
+    kind: str = "text", length: Optional[Callable[[str], int]] = None,
+) -> Iterator[Tuple[str, int, int]]:
+    """
+    Chunk a stream of text segments lazily.
+    Segments are buffered until `window` characters are available, the buffer is
+    chunked, and every chunk but the last is yielded; the text from the start of the
+    last one is carried over and chunked together with the following text. Memory is
+    bounded by the window, not by the document size.
+    Yields (chunk, char_start, char_end) with exact offsets into the concatenated text.
+    """
+    chunker = Chunker(chunk_size, overlap, kind, length)
+    window = window or chunk_size * 16
+    buf, base = "", 0
+
+    for seg in segments:
+        buf += seg
+        if len(buf) < window:
+            continue
+        with metrics.span("chunk_text"):
+            chunks = list(chunker.iter_chunks(buf))
+        if len(chunks) < 2:
+            continue
+        for chunk, start, end in chunks[:-1]:
+            yield chunk, base + start, base + end
+        keep = chunks[-1][1]
+        buf, base = buf[keep:], base + keep
+    if buf.strip():
+        with metrics.span("chunk_text"):
+            chunks = list(chunker.iter_chunks(buf))
+        for chunk, start, end in chunks:
+            yield chunk, base + start, base + end
@@ -1,114 +1,203 @@
-import os
-import json
-from typing import List
-import requests
-
-def get_ollama_response(system_prompt: str, user_prompt: str, model: str = "llama3") -> str:
-    """
-    Helper to get response from local Ollama instance.
-    """
-    try:
-        url = "http://localhost:11434/api/chat"
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "stream": False
-        }
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json().get("message", {}).get("content", "")
-    except Exception as e:
-        print(f"Ollama Error: {e}")
-        return None
-
-from groq import Groq
-
-def get_llm_response(system_prompt: str, user_prompt: str, api_key: str = None, provider: str = "groq") -> tuple:
-    """
-    Helper to get response from LLM provider (Groq or Ollama) or fallback.
-    Returns: (response_text, error_message)
-    """
-    if provider == "mock":
-        return None, "Provider set to Mock"
-
-    if provider == "ollama":
-        resp = get_ollama_response(system_prompt, user_prompt)
-        if resp:
-            return resp, None
-        return None, "Ollama call failed"
-
-
-    api_key = api_key or os.environ.get("GROQ_API_KEY")
-    
-    if api_key:
-        try:
-            client = Groq(api_key=api_key)
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0.2,
-            )
-            return chat_completion.choices[0].message.content, None
-        except Exception as e:
-            print(f"Groq API Error: {e}")
-            return None, f"Groq API Error: {str(e)}"
-            
-    print("Using Mock Response (No valid Groq API Key or Error)")
-    return None, "No valid Groq API Key found in env or args"
-
-def generate_testcases(context_chunks: List[str], user_request: str, api_key: str = None, provider: str = "groq") -> str:
-    """
-    Generates structured test cases based on the provided context and user request.
-    """
-    
-    context_str = "\n\n".join(context_chunks)
-    
-    system_prompt = """You are an expert QA Automation Engineer. 
-Your goal is to generate comprehensive test cases based STRICTLY on the provided project documentation.
-Do not hallucinate features not mentioned in the context.
-Output must be a JSON list of objects with the following keys:
-- Test_ID (e.g., TC-001)
-- Feature
-- Test_Scenario
-- Expected_Result
-- Grounded_In (Filename of the doc source)
-
-Return ONLY the JSON array. No markdown formatting or extra text.
-"""
-
-    user_prompt = f"""
-Context from documentation:
-{context_str}
-
-User Request: {user_request}
-
-Generate test cases now.
-"""
-
-    response_text, error_msg = get_llm_response(system_prompt, user_prompt, api_key=api_key, provider=provider)
-    
-    if response_text:
-
-        if response_text.strip().startswith("```"):
-            try:
-                response_text = response_text.strip().split("\n", 1)[1].rsplit("\n", 1)[0]
-            except IndexError:
-                pass
-        return response_text
-
-
-    return json.dumps([
-        {
-            "Test_ID": "TC-MOCK-001",
-            "Feature": f"Mock Feature (Error: {error_msg})",
-            "Test_Scenario": f"Mock test for: {user_request}",
-            "Expected_Result": "Should work as expected",
-            "Grounded_In": "product_specs.md"
-        }
-    ], indent=2)
+import hashlib
+import inspect
+import json
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from . import llm_client
+from . import metrics
+from .parser import estimate_tokens
+from . import testcase_parser
+
+GROQ_MODEL = "llama-3.1-8b-instant"
+TEMPERATURE = 0.2
+OLLAMA_MODEL = "llama3"
+
+def _model_for(provider: str) -> str:
+    """
+    Model name to request from the given provider.
+    """
+    return OLLAMA_MODEL if provider == "ollama" else GROQ_MODEL
+
+@metrics.timed("llm")
+def get_llm_response(system_prompt: str, user_prompt: str, api_key: str = None, provider: str = "groq") -> tuple:
+    """
+    Helper to get response from LLM provider (Groq or Ollama) or fallback.
+    Returns: (response_text, error_message)
+    """
+    return llm_client.chat(
+        system_prompt, user_prompt, provider=provider, api_key=api_key,
+        model=_model_for(provider), temperature=TEMPERATURE,
+    )
+
+@metrics.timed("llm")
+async def get_llm_response_async(system_prompt: str, user_prompt: str, api_key: str = None, provider: str = "groq") -> tuple:
+    """
+    Async variant of get_llm_response.
+    Returns: (response_text, error_message)
+    """
+    return await llm_client.achat(
+        system_prompt, user_prompt, provider=provider, api_key=api_key,
+        model=_model_for(provider), temperature=TEMPERATURE,
+    )
+
+@metrics.timed("assemble_context")
+def assemble_context(retrieved: List[dict], texts: Dict[int, str], max_tokens: int = 3000) -> List[str]:
+    """
+    Pack retrieved chunks into prompt context strings within a token budget.
+    - Uses the full chunk text from texts (by vector_id), else the stored text_preview
+    - Merges adjacent chunks of the same file (consecutive chunk_ids or overlapping
+      character ranges) into one passage, dropping the overlapping characters
+    - Skips passages whose text was already included (e.g. the same doc under two names)
+    - Names the other files a passage's chunks were deduplicated from ("sources"), so
+      Grounded_In can cite any of them
+    - Adds passages in retrieval-rank order while they fit; the top passage is truncated
+      rather than dropped if it alone exceeds the budget
+    """
+    runs = []  # [best_rank, source, first_chunk, last_chunk, end, text, other_sources]
+    ranked = sorted(enumerate(retrieved), key=lambda x: (x[1].get("source") or "", x[1].get("chunk_id", 0)))
+    for rank, r in ranked:
+        text = texts.get(r.get("vector_id"), r.get("text_preview", ""))
+        start, end = r.get("char_start"), r.get("char_end")
+        prev = runs[-1] if runs else None
+        if (
+            prev is not None and prev[1] == r.get("source")
+            and (r.get("chunk_id") == prev[3] + 1 or (start is not None and prev[4] is not None and start <= prev[4]))
+        ):
+            overlap = prev[4] - start if start is not None and prev[4] is not None and start < prev[4] else 0
+            prev[5] += text[overlap:] if overlap else "\n" + text
+            prev[0] = min(prev[0], rank)
+            prev[3], prev[4] = r.get("chunk_id"), end
+            prev[6].extend(s for s in r.get("sources", [])[1:] if s not in prev[6])
+        else:
+            runs.append([rank, r.get("source"), r.get("chunk_id"), r.get("chunk_id"), end, text, list(r.get("sources", [])[1:])])
+
+    context_chunks, seen, used = [], set(), 0
+    for _, source, first, last, _, text, others in sorted(runs, key=lambda x: x[0]):
+        digest = hashlib.sha1(text.strip().encode("utf-8")).digest()
+        if digest in seen:
+            continue
+        span = f"chunk {first}" if first == last else f"chunks {first}-{last}"
+        header = f"Filename: {source} ({span})\n"
+        if others:
+            header += f"Also in: {', '.join(others)}\n"
+        header += "\n"
+        entry = f"{header}{text}\n"
+        cost = estimate_tokens(entry)
+        if used + cost > max_tokens:
+            if context_chunks:
+                continue
+            entry = f"{header}{text[:max(0, max_tokens * 4 - len(header))]}\n"
+            cost = max_tokens
+        seen.add(digest)
+        context_chunks.append(entry)
+        used += cost
+    return context_chunks
+
+def _testcase_prompts(context_chunks: List[str], user_request: str) -> tuple:
+    """
+    Build the (system_prompt, user_prompt) pair for testcase generation.
+    """
+    
+    context_str = "\n\n".join(context_chunks)
+    
+    system_prompt = """You are an expert QA Automation Engineer. 
+Your goal is to generate comprehensive test cases based STRICTLY on the provided project documentation.
+Do not hallucinate features not mentioned in the context.
+Output must be a JSON list of objects with the following keys:
+- Test_ID (e.g., TC-001)
+- Feature
+- Test_Scenario
+- Expected_Result
+- Grounded_In (Filename of the doc source; a passage marked "Also in" may be cited by any of its filenames)
+
+Return ONLY the JSON array. No markdown formatting or extra text.
+"""
+
+    user_prompt = f"""
+Context from documentation:
+{context_str}
+
+User Request: {user_request}
+
+Generate test cases now.
+"""
+    return system_prompt, user_prompt
+
+def _finalize_testcases(response_text: str, error_msg: str, user_request: str) -> str:
+    """
+    Strip code fences from the LLM output, or fall back to a mock testcase on error.
+    """
+    if response_text:
+        return testcase_parser.strip_code_fences(response_text)
+
+
+    return json.dumps([
+        {
+            "Test_ID": "TC-MOCK-001",
+            "Feature": f"Mock Feature (Error: {error_msg})",
+            "Test_Scenario": f"Mock test for: {user_request}",
+            "Expected_Result": "Should work as expected",
+            "Grounded_In": "product_specs.md"
+        }
+    ], indent=2)
+
+def generate_testcases(context_chunks: List[str], user_request: str, api_key: str = None, provider: str = "groq") -> str:
+    """
+    Generates structured test cases based on the provided context and user request.
+    """
+    system_prompt, user_prompt = _testcase_prompts(context_chunks, user_request)
+    response_text, error_msg = get_llm_response(system_prompt, user_prompt, api_key=api_key, provider=provider)
+    return _finalize_testcases(response_text, error_msg, user_request)
+
+async def generate_testcases_async(context_chunks: List[str], user_request: str, api_key: str = None, provider: str = "groq") -> str:
+    """
+    Async variant of generate_testcases for use from the API's event loop.
+    """
+    system_prompt, user_prompt = _testcase_prompts(context_chunks, user_request)
+    response_text, error_msg = await get_llm_response_async(system_prompt, user_prompt, api_key=api_key, provider=provider)
+    return _finalize_testcases(response_text, error_msg, user_request)
+
+async def stream_testcases(
+    context_chunks: List[str],
+    user_request: str,
+    api_key: str = None,
+    provider: str = "groq",
+    on_complete: Optional[Callable[[str, str], Any]] = None,
+) -> AsyncIterator[str]:
+    """
+    Streams generated test cases token by token (code fences removed).
+    If the provider is unavailable, the mock testcase is yielded instead.
+    on_complete receives the final output and how the stream ended when it ends,
+    including when the client disconnects early; it may be a coroutine function.
+    The status is "complete", "incomplete" (the provider stream broke off) or
+    "aborted" (the consumer stopped reading before the end).
+    """
+    system_prompt, user_prompt = _testcase_prompts(context_chunks, user_request)
+    parts = []
+    status = "aborted"
+    try:
+        tokens = llm_client.astream(
+            system_prompt, user_prompt, provider=provider, api_key=api_key,
+            model=_model_for(provider), temperature=TEMPERATURE,
+        )
+        async for token in llm_client.astrip_fences(tokens):
+            parts.append(token)
+            yield token
+        status = "complete"
+    except llm_client.LLMError as e:
+        if not parts:
+            fallback = _finalize_testcases(None, str(e), user_request)
+            parts.append(fallback)
+            yield fallback
+            status = "complete"
+        else:
+            print(f"LLM stream ended early: {e}")
+            status = "incomplete"
+    except Exception:
+        status = "incomplete"
+        raise
+    finally:
+        if on_complete is not None:
+            result = on_complete("".join(parts), status)
+            if inspect.isawaitable(result):
+                await result
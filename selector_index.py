@@ -0,0 +1,352 @@
+# backend/app/services/selector_index.py
+
+import hashlib
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from . import metrics
+from .parser import estimate_tokens
+
+try:
+    import lxml.etree as lxml_etree
+    import lxml.html as lxml_html
+except ImportError:  # fall back to BeautifulSoup's pure-Python parser
+    lxml_html = None
+
+INDEXED_TAGS = ("form", "label", "input", "textarea", "select", "button", "a")
+KEPT_ATTRS = ("id", "name", "type", "value", "class", "placeholder", "aria-label", "href", "for", "action")
+# Elements with a visible text of their own (a form's text would be its whole content).
+TEXT_TAGS = ("label", "select", "button", "a")
+# Controls whose labels are folded into the control's own entry.
+CONTROL_TAGS = ("input", "textarea", "select")
+_STOPWORDS = {"a", "an", "and", "the", "to", "of", "in", "on", "for", "is", "be", "should", "with", "it"}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def content_hash(html_content: str) -> str:
+    return hashlib.sha256(html_content.encode("utf-8", errors="ignore")).hexdigest()
+
+
+def _norm(text: Optional[str]) -> str:
+    return " ".join((text or "").split())
+
+
+def _xpath_literal(value: str) -> str:
+    if '"' not in value:
+        return f'"{value}"'
+    if "'" not in value:
+        return f"'{value}'"
+    parts = value.split('"')
+    return "concat(" + ", '\"', ".join(f'"{p}"' for p in parts) + ")"
+
+
+def _css_string(value: str) -> str:
+    """
+    Double-quoted CSS string for an attribute selector value.
+    """
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return '"' + re.sub(r"[\n\r\f]", lambda m: f"\\{ord(m.group(0)):x} ", escaped) + '"'
+
+
+def _css_ident_ok(value: str) -> bool:
+    return bool(value) and (value[0].isalpha() or value[0] in "_-") and all(c.isalnum() or c in "_-" for c in value)
+
+
+def _raw_elements_lxml(html_content: str) -> Iterator[Tuple[str, dict, str, str]]:
+    """
+    (tag, attrs, text, label) for each indexed element, in document order.
+    """
+    try:
+        root = lxml_html.fromstring(html_content)
+    except lxml_etree.ParserError:
+        return  # empty document (whitespace or comments only): no elements
+    labels = {lab.get("for"): _norm(lab.text_content()) for lab in root.iter("label") if lab.get("for")}
+    ids = {el.get("id") for el in root.iter(*CONTROL_TAGS) if el.get("id")}
+    for el in root.iter(*INDEXED_TAGS):
+        if el.tag == "label" and (el.get("for") in ids or next(el.iter(*CONTROL_TAGS), None) is not None):
+            continue  # attached label: its text is the control's Label
+        attrs = {k: el.get(k) for k in KEPT_ATTRS if el.get(k) is not None}
+        label = ""
+        if el.tag not in ("label", "form"):
+            label = labels.get(attrs.get("id"), "")
+            if not label:
+                wrapper = next(el.iterancestors("label"), None)
+                label = _norm(wrapper.text_content()) if wrapper is not None else ""
+        text = _norm(el.text_content()) if el.tag in TEXT_TAGS else ""
+        yield el.tag, attrs, text, label
+
+
+def _raw_elements_bs4(html_content: str) -> Iterator[Tuple[str, dict, str, str]]:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html_content, "html.parser")
+    tags = soup.find_all(INDEXED_TAGS)
+    labels = {lab.get("for"): _norm(lab.get_text(" ")) for lab in tags if lab.name == "label" and lab.get("for")}
+    ids = {el.get("id") for el in tags if el.name in CONTROL_TAGS and el.get("id")}
+    for el in tags:
+        if el.name == "label" and (el.get("for") in ids or el.find(CONTROL_TAGS) is not None):
+            continue
+        attrs = {k: " ".join(v) if isinstance(v, list) else v for k, v in el.attrs.items() if k in KEPT_ATTRS}
+        label = ""
+        if el.name not in ("label", "form"):
+            label = labels.get(attrs.get("id"), "")
+            if not label:
+                wrapper = el.find_parent("label")
+                label = _norm(wrapper.get_text(" ")) if wrapper is not None else ""
+        text = _norm(el.get_text(" ")) if el.name in TEXT_TAGS else ""
+        yield el.name, attrs, text, label
+
+
+class SelectorIndex:
+    """
+    Structured selector index for one HTML page: for every form, label, input, textarea,
+    select, button and link its id, name, type, value, visible text, label text, CSS and
+    XPath candidates, uniqueness flags and the most robust unique locator. Labels attached
+    to a control are folded into that control. Built once per page content.
+    """
+
+    def __init__(self, html_content: str):
+        self.content_hash = content_hash(html_content)
+        self._summary: Optional[str] = None
+        self._vectors: Dict[str, np.ndarray] = {}  # embedder model_id -> element vectors
+        self._lock = threading.Lock()
+        raw = list((_raw_elements_lxml if lxml_html is not None else _raw_elements_bs4)(html_content))
+        ids = Counter(a.get("id") for _, a, _, _ in raw if a.get("id"))
+        names = Counter((t, a.get("name")) for t, a, _, _ in raw if a.get("name"))
+        values = Counter((t, a.get("name"), a.get("value")) for t, a, _, _ in raw if a.get("name") and a.get("value"))
+        texts = Counter((t, x) for t, _, x, _ in raw if x)
+        classes = Counter((t, a.get("class")) for t, a, _, _ in raw if a.get("class"))
+        hrefs = Counter(a.get("href") for t, a, _, _ in raw if t == "a" and a.get("href"))
+        positions = Counter()
+        self.elements: List[dict] = []
+        for tag, attrs, text, label in raw:
+            positions[tag] += 1
+            el_id, name, value, cls = attrs.get("id"), attrs.get("name"), attrs.get("value"), _norm(attrs.get("class"))
+            unique = {
+                "id": bool(el_id) and ids[el_id] == 1,
+                "name": bool(name) and names[(tag, name)] == 1,
+                "value": bool(name and value) and values[(tag, name, value)] == 1,
+                "text": bool(text) and texts[(tag, text)] == 1,
+                "class": bool(cls) and classes[(tag, attrs.get("class"))] == 1,
+                "href": tag == "a" and bool(attrs.get("href")) and hrefs[attrs.get("href")] == 1,
+            }
+            css, xpath = [], []
+            if el_id:
+                css.append(f"#{el_id}" if _css_ident_ok(el_id) else f"[id={_css_string(el_id)}]")
+                xpath.append(f"//{tag}[@id={_xpath_literal(el_id)}]")
+            if name:
+                css.append(f"{tag}[name={_css_string(name)}]")
+                xpath.append(f"//{tag}[@name={_xpath_literal(name)}]")
+                if value:
+                    css.append(f"{tag}[name={_css_string(name)}][value={_css_string(value)}]")
+            if tag == "a" and attrs.get("href"):
+                css.append(f"a[href={_css_string(attrs['href'])}]")
+            if tag == "label" and attrs.get("for"):
+                css.append(f"label[for={_css_string(attrs['for'])}]")
+            if cls and all(_css_ident_ok(c) for c in cls.split()):
+                css.append(tag + "".join(f".{c}" for c in cls.split()))
+            if text and tag in ("button", "a", "label"):
+                xpath.append(f"//{tag}[normalize-space()={_xpath_literal(text)}]")
+            xpath.append(f"(//{tag})[{positions[tag]}]")
+            element = {
+                "tag": tag,
+                "id": el_id,
+                "name": name,
+                "type": attrs.get("type"),
+                "value": value,
+                "text": text[:80],
+                "label": label[:80],
+                "placeholder": attrs.get("placeholder") or attrs.get("aria-label"),
+                "href": (attrs.get("href") or "")[:80] or None,
+                "for": attrs.get("for"),
+                "action": attrs.get("action"),
+                "class": cls or None,
+                "css": css,
+                "xpath": xpath,
+                "unique": unique,
+            }
+            element["locator"] = self._best_locator(element, css, xpath, unique)
+            element["line"] = self._line(element)
+            element["tokens"] = estimate_tokens(element["line"])
+            self.elements.append(element)
+
+    @staticmethod
+    def _best_locator(e: dict, css: List[str], xpath: List[str], unique: dict) -> Tuple[str, str]:
+        """
+        Most robust unique locator as (By strategy, value); positional XPath as a last resort.
+        """
+        tag = e["tag"]
+        if unique["id"]:
+            return ("By.ID", e["id"])
+        if unique["name"]:
+            return ("By.CSS_SELECTOR", f"{tag}[name={_css_string(e['name'])}]")
+        if unique["value"]:
+            return ("By.CSS_SELECTOR", f"{tag}[name={_css_string(e['name'])}][value={_css_string(e['value'])}]")
+        if tag == "label" and e["for"]:
+            return ("By.CSS_SELECTOR", f"label[for={_css_string(e['for'])}]")
+        if unique["text"] and tag == "a":
+            return ("By.LINK_TEXT", e["text"])
+        if unique["href"]:
+            return ("By.CSS_SELECTOR", next(c for c in css if c.startswith("a[href=")))
+        if unique["text"] and tag in ("button", "label"):
+            return ("By.XPATH", f"//{tag}[normalize-space()={_xpath_literal(e['text'])}]")
+        if unique["class"] and css and css[-1].startswith(tag + "."):
+            return ("By.CSS_SELECTOR", css[-1])
+        return ("By.XPATH", xpath[-1])
+
+    @staticmethod
+    def _line(e: dict) -> str:
+        """
+        Prompt line for one element; empty fields are left out.
+        """
+        parts = [f"Tag: {e['tag']}"]
+        for key, title in (("id", "ID"), ("name", "Name"), ("type", "Type")):
+            if e[key]:
+                parts.append(f"{title}: {e[key]}")
+        if e["type"] in ("radio", "checkbox") and e["value"]:
+            parts.append(f"Value: {e['value']}")
+        for key, title in (("text", "Text"), ("label", "Label"), ("placeholder", "Placeholder"),
+                           ("href", "Href"), ("for", "For"), ("action", "Action"), ("class", "Class")):
+            if e[key]:
+                parts.append(f"{title}: {e[key]}")
+        by, value = e["locator"]
+        parts.append(f"Locator: {by} {value!r}")
+        return ", ".join(parts)
+
+    def summary(self) -> str:
+        """
+        One line per element for the script-generation prompt (built once).
+        """
+        if self._summary is None:
+            self._summary = "\n".join(e["line"] for e in self.elements)
+        return self._summary
+
+    def total_tokens(self) -> int:
+        return sum(e["tokens"] for e in self.elements)
+
+    def scores(self, query: str, embedder=None) -> np.ndarray:
+        """
+        Relevance of each element to query (a testcase's feature, steps and expected
+        result). With an embedder: cosine similarity between the query and each element's
+        label/text/attributes, plus a lexical overlap bonus; element vectors are computed
+        once per embedder model_id. Without one: lexical overlap only.
+        """
+        q_words = set(_WORD.findall(query.lower())) - _STOPWORDS
+        lexical = np.array([
+            len(q_words & words) / len(words) if words else 0.0
+            for words in (set(_WORD.findall(_search_text(e).lower())) for e in self.elements)
+        ], dtype="float32")
+        if embedder is None or not self.elements:
+            return lexical
+        vectors = self._element_vectors(embedder)
+        q = embedder.embed([query])[0]
+        sims = vectors @ q / (np.linalg.norm(vectors, axis=1) * np.linalg.norm(q) + 1e-9)
+        return sims.astype("float32") + 0.5 * lexical
+
+    def _element_vectors(self, embedder) -> np.ndarray:
+        with self._lock:
+            vectors = self._vectors.get(embedder.model_id)
+        if vectors is None:
+            vectors = embedder.embed([_search_text(e) for e in self.elements]).astype("float32")
+            with self._lock:
+                self._vectors[embedder.model_id] = vectors
+        return vectors
+
+    def to_dict(self) -> dict:
+        return {
+            "content_hash": self.content_hash,
+            "elements": [{k: v for k, v in e.items() if k not in ("line", "tokens")} for e in self.elements],
+        }
+
+
+def _search_text(e: dict) -> str:
+    """
+    Text an element is matched on: its tag, identifiers, label and visible text.
+    """
+    fields = (e["tag"], e["id"], e["name"], e["type"], e["label"], e["text"], e["placeholder"], e["value"])
+    return " ".join(f.replace("_", " ").replace("-", " ") for f in fields if f)
+
+
+class SelectorIndexCache:
+    """
+    LRU of SelectorIndex objects keyed by content hash, so identical page content is
+    parsed once no matter how many pages or uploads share it. Thread-safe.
+    """
+
+    def __init__(self, max_entries: int = 64):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, SelectorIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, html_content: str) -> SelectorIndex:
+        key = content_hash(html_content)
+        with self._lock:
+            index = self._entries.get(key)
+            if index is not None:
+                self._entries.move_to_end(key)
+        if index is not None:
+            metrics.CACHE_REQUESTS.inc(cache="selector_index", result="hit")
+            return index
+        metrics.CACHE_REQUESTS.inc(cache="selector_index", result="miss")
+        with metrics.span("selector_index"):
+            index = SelectorIndex(html_content)
+        with self._lock:
+            self._entries[key] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return index
+
+
+SELECTOR_INDEXES = SelectorIndexCache()
+
+
+def get_index(html_content: str) -> SelectorIndex:
+    """
+    Cached SelectorIndex for the given page content.
+    """
+    return SELECTOR_INDEXES.get(html_content)
+
+
+def combined_summary(pages: Dict[str, SelectorIndex], query: str = "", max_tokens: int = 0, embedder=None) -> str:
+    """
+    Prompt summary for one or several named pages (one section per page).
+    With max_tokens > 0 and pages larger than that, elements are ranked by relevance
+    to query across all pages and the most relevant ones that fit the budget are kept,
+    listed in document order.
+    """
+    total = sum(index.total_tokens() for index in pages.values())
+    if max_tokens <= 0 or total <= max_tokens:
+        keep = {name: list(range(len(index.elements))) for name, index in pages.items()}
+        omitted = 0
+    else:
+        ranked = []
+        for name, index in pages.items():
+            for i, score in enumerate(index.scores(query, embedder)):
+                ranked.append((-float(score), name, i))
+        ranked.sort()
+        keep = {name: [] for name in pages}
+        used = 0
+        for _, name, i in ranked:
+            cost = pages[name].elements[i]["tokens"]
+            if used + cost <= max_tokens:
+                keep[name].append(i)
+                used += cost
+        omitted = len(ranked) - sum(len(v) for v in keep.values())
+
+    sections = []
+    for name, index in pages.items():
+        if not keep[name]:
+            continue
+        if len(keep[name]) == len(index.elements):
+            body = index.summary()
+        else:
+            body = "\n".join(index.elements[i]["line"] for i in sorted(keep[name]))
+        sections.append(body if len(pages) == 1 else f"Page: {name}.html\n{body}")
+    if omitted:
+        sections.append(f"({omitted} less relevant elements omitted)")
+    return "\n\n".join(sections)
@@ -1,155 +1,244 @@
-import os
-import json
-from bs4 import BeautifulSoup
-import requests
-
-def get_ollama_response(system_prompt: str, user_prompt: str, model: str = "llama3") -> str:
-    """
-    Helper to get response from local Ollama instance.
-    """
-    try:
-        url = "http://localhost:11434/api/chat"
-        payload = {
-            "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            "stream": False
-        }
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json().get("message", {}).get("content", "")
-    except Exception as e:
-        print(f"Ollama Error: {e}")
-        return None
-
-from groq import Groq
-
-def get_llm_response(system_prompt: str, user_prompt: str, api_key: str = None, provider: str = "groq") -> str:
-    """
-    Helper to get response from LLM provider or fallback.
-    """
-    if provider == "mock":
-        return None
-
-    if provider == "ollama":
-        return get_ollama_response(system_prompt, user_prompt)
-
-    api_key = api_key or os.environ.get("GROQ_API_KEY")
-    
-    if api_key:
-        try:
-            client = Groq(api_key=api_key)
-            chat_completion = client.chat.completions.create(
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                model="llama-3.1-8b-instant",
-                temperature=0.1,
-            )
-            return chat_completion.choices[0].message.content
-        except Exception as e:
-            print(f"Groq API Error: {e}")
-            pass
-            
-    return None
-
-
-def extract_selectors(html_content: str) -> str:
-    """
-    Parses HTML and extracts potential interesting elements (inputs, buttons) 
-    to help the LLM generate correct selectors.
-    Returns a summary string.
-    """
-    soup = BeautifulSoup(html_content, "html.parser")
-    
-    elements = []
-    
-
-    for inp in soup.find_all("input"):
-        info = f"Tag: input, ID: {inp.get('id')}, Name: {inp.get('name')}, Type: {inp.get('type')}"
-        elements.append(info)
-        
-
-    for btn in soup.find_all("button"):
-        info = f"Tag: button, ID: {btn.get('id')}, Text: {btn.get_text(strip=True)}, Class: {btn.get('class')}"
-        elements.append(info)
-        
-
-    for sel in soup.find_all("select"):
-        info = f"Tag: select, ID: {sel.get('id')}, Name: {sel.get('name')}"
-        elements.append(info)
-
-    return "\n".join(elements)
-
-def build_script(testcase: dict, selectors_summary: str, api_key: str = None, provider: str = "groq") -> str:
-    """
-    Generates a Python Selenium script for the given test case.
-    """
-    
-    system_prompt = """You are an expert Selenium Automation Engineer using Python.
-Your task is to write a complete, runnable Python script using Selenium WebDriver (Chrome).
-The script should:
-1. Setup the driver (assume chromedriver is in path or use webdriver_manager).
-2. Open 'checkout.html' (assume it's in the current directory or provide a placeholder path).
-3. Implement the steps required for the test case.
-4. Add assertions to verify the Expected Result.
-5. Close the driver at the end.
-
-Use the provided HTML Element Selectors to ensure the script works.
-Return ONLY the Python code.
-"""
-
-    user_prompt = f"""
-Test Case:
-{json.dumps(testcase, indent=2)}
-
-HTML Selectors Available:
-{selectors_summary}
-
-Generate the Selenium Python script now.
-"""
-
-    code = get_llm_response(system_prompt, user_prompt, api_key=api_key, provider=provider)
-    
-    if code:
-
-        if code.startswith("```python"):
-            code = code.replace("```python", "").replace("```", "")
-        if code.startswith("```"):
-            code = code.replace("```", "")
-        return code.strip()
-
-
-    return f"""
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-import time
-
-
-
-def run_test():
-    driver = webdriver.Chrome()
-    try:
-        driver.get("file:///path/to/checkout.html")
-        print("Opened checkout.html")
-        
-
-        
-        print("Executing test steps...")
-        time.sleep(1)
-        
-        print("Verifying expected result: {testcase.get('Expected_Result')}")
-        assert True # Placeholder assertion
-        print("Test Passed!")
-        
-    except Exception as e:
-        print(f"Test Failed: {{e}}")
-    finally:
-        driver.quit()
-
-if __name__ == "__main__":
-    run_test()
-"""
+import io
+import json
+import re
+import zipfile
+from typing import AsyncIterator, List
+
+from . import llm_client
+from . import metrics
+from . import selector_index
+from . import testcase_parser
+
+GROQ_MODEL = "llama-3.1-8b-instant"
+TEMPERATURE = 0.1
+OLLAMA_MODEL = "llama3"
+
+def _model_for(provider: str) -> str:
+    """
+    Model name to request from the given provider.
+    """
+    return OLLAMA_MODEL if provider == "ollama" else GROQ_MODEL
+
+def get_llm_response(system_prompt: str, user_prompt: str, api_key: str = None, provider: str = "groq") -> str:
+    """
+    Helper to get response from LLM provider or fallback (None).
+    """
+    text, _ = llm_client.chat(
+        system_prompt, user_prompt, provider=provider, api_key=api_key,
+        model=_model_for(provider), temperature=TEMPERATURE,
+    )
+    return text
+
+async def get_llm_response_async(system_prompt: str, user_prompt: str, api_key: str = None, provider: str = "groq") -> str:
+    """
+    Async variant of get_llm_response.
+    """
+    text, _ = await llm_client.achat(
+        system_prompt, user_prompt, provider=provider, api_key=api_key,
+        model=_model_for(provider), temperature=TEMPERATURE,
+    )
+    return text
+
+
+def testcase_query(testcase: dict) -> str:
+    """
+    Text a testcase is matched against page elements with: its feature, scenario,
+    steps, test data and expected result.
+    """
+    parts = []
+    for key, value in testcase.items():
+        if key in ("Test_ID", "Grounded_In"):
+            continue
+        if isinstance(value, list):
+            parts.extend(str(v) for v in value)
+        else:
+            parts.append(str(value))
+    return "\n".join(parts)
+
+@metrics.timed("extract_selectors")
+def extract_selectors(html_content: str, testcase: dict = None, max_tokens: int = 0, embedder=None) -> str:
+    """
+    Summary of the interesting elements (forms, labels, inputs, textareas, selects,
+    buttons, links) of a page, with a recommended locator for each, to help the LLM
+    generate correct selectors. With a testcase and max_tokens, only the elements most
+    relevant to the testcase that fit the budget are listed.
+    Backed by the content-hash keyed selector index, so repeated calls do not reparse.
+    """
+    index = selector_index.get_index(html_content)
+    query = testcase_query(testcase) if testcase else ""
+    return selector_index.combined_summary({"page": index}, query=query, max_tokens=max_tokens, embedder=embedder)
+
+def _script_prompts(testcase: dict, selectors_summary: str) -> tuple:
+    """
+    Build the (system_prompt, user_prompt) pair for Selenium script generation.
+    """
+    
+    system_prompt = """You are an expert Selenium Automation Engineer using Python.
+Your task is to write a complete, runnable Python script using Selenium WebDriver (Chrome).
+The script should:
+1. Setup the driver (assume chromedriver is in path or use webdriver_manager).
+2. Open the page the selectors belong to, e.g. 'checkout.html' (assume it's in the current directory or provide a placeholder path).
+3. Implement the steps required for the test case.
+4. Add assertions to verify the Expected Result.
+5. Close the driver at the end.
+6. Put the test in a function named run_test() that lets failed assertions and errors
+   propagate, and call it only under `if __name__ == "__main__":` (the test runner calls
+   run_test() itself).
+
+Use the provided HTML Element Selectors to ensure the script works; prefer each element's Locator.
+Return ONLY the Python code.
+"""
+
+    user_prompt = f"""
+Test Case:
+{json.dumps(testcase, indent=2)}
+
+HTML Selectors Available:
+{selectors_summary}
+
+Generate the Selenium Python script now.
+"""
+    return system_prompt, user_prompt
+
+def _finalize_script(code: str, testcase: dict) -> str:
+    """
+    Strip code fences from the LLM output, or fall back to a template script.
+    """
+    if code:
+        return testcase_parser.strip_code_fences(code)
+
+
+    return f"""
+from selenium import webdriver
+from selenium.webdriver.common.by import By
+import time
+
+
+
+def run_test():
+    driver = webdriver.Chrome()
+    try:
+        driver.get("file:///path/to/checkout.html")
+        print("Opened checkout.html")
+        
+
+        
+        print("Executing test steps...")
+        time.sleep(1)
+        
+        print("Verifying expected result: {testcase.get('Expected_Result')}")
+        assert True # Placeholder assertion
+        print("Test Passed!")
+        
+    except Exception as e:
+        print(f"Test Failed: {{e}}")
+    finally:
+        driver.quit()
+
+if __name__ == "__main__":
+    run_test()
+"""
+
+def build_script(testcase: dict, selectors_summary: str, api_key: str = None, provider: str = "groq") -> str:
+    """
+    Generates a Python Selenium script for the given test case.
+    """
+    system_prompt, user_prompt = _script_prompts(testcase, selectors_summary)
+    code = get_llm_response(system_prompt, user_prompt, api_key=api_key, provider=provider)
+    return _finalize_script(code, testcase)
+
+async def build_script_async(testcase: dict, selectors_summary: str, api_key: str = None, provider: str = "groq") -> str:
+    """
+    Async variant of build_script for use from the API's event loop.
+    """
+    system_prompt, user_prompt = _script_prompts(testcase, selectors_summary)
+    code = await get_llm_response_async(system_prompt, user_prompt, api_key=api_key, provider=provider)
+    return _finalize_script(code, testcase)
+
+async def stream_script(testcase: dict, selectors_summary: str, api_key: str = None, provider: str = "groq") -> AsyncIterator[str]:
+    """
+    Streams a Python Selenium script token by token (code fences removed).
+    If the provider is unavailable, the template script is yielded instead.
+    """
+    system_prompt, user_prompt = _script_prompts(testcase, selectors_summary)
+    emitted = False
+    try:
+        tokens = llm_client.astream(
+            system_prompt, user_prompt, provider=provider, api_key=api_key,
+            model=_model_for(provider), temperature=TEMPERATURE,
+        )
+        async for token in llm_client.astrip_fences(tokens):
+            emitted = True
+            yield token
+    except llm_client.LLMError as e:
+        if not emitted:
+            yield _finalize_script(None, testcase)
+        else:
+            print(f"LLM stream ended early: {e}")
+
+
+def script_filename(index: int, testcase: dict) -> str:
+    """
+    Stable, importable file name for one testcase's script, e.g. test_003_tc_discount_01.py.
+    """
+    slug = re.sub(r"[^0-9a-zA-Z]+", "_", str(testcase.get("Test_ID", ""))).strip("_").lower()
+    return f"test_{index:03d}_{slug or 'case'}.py"
+
+
+def bundle_zip(results: List[dict]) -> bytes:
+    """
+    Pack batch results into a zip: one script per successful testcase plus report.json
+    listing every item with its status and error (if any).
+    Each result has index, testcase, status ("ok" | "error"), script and error.
+    """
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w", zipfile.ZIP_DEFLATED) as zf:
+        for r in results:
+            if r["status"] == "ok":
+                zf.writestr(script_filename(r["index"], r["testcase"]), r["script"])
+        report = [
+            {"index": r["index"], "Test_ID": r["testcase"].get("Test_ID"), "status": r["status"], "error": r.get("error")}
+            for r in results
+        ]
+        zf.writestr("report.json", json.dumps(report, indent=2))
+    return buf.getvalue()
+
+
+def bundle_pytest_module(results: List[dict]) -> str:
+    """
+    Combine batch results into one pytest module with a test function per testcase.
+    Each script is embedded as source and executed in its own namespace, then its
+    run_test() is called, so a script that fails to compile or run, or has no
+    run_test(), only fails its own test; items whose generation failed become skipped
+    tests carrying the error.
+    """
+    lines = [
+        "# Generated Selenium test suite",
+        "import pytest",
+        "",
+        "",
+        "def _run_script(source, name):",
+        "    namespace = {\"__name__\": name}",
+        "    exec(compile(source, name, \"exec\"), namespace)",
+        "    if not callable(namespace.get(\"run_test\")):",
+        "        pytest.fail(f\"{name} defines no run_test() entry point\")",
+        "    namespace[\"run_test\"]()",
+    ]
+    for r in results:
+        name = script_filename(r["index"], r["testcase"])[:-3]
+        lines += ["", ""]
+        if r["status"] == "ok":
+            lines += [
+                f"SCRIPT_{r['index']:03d} = {r['script']!r}",
+                "",
+                "",
+                f"def {name}():",
+                f"    _run_script(SCRIPT_{r['index']:03d}, {name + '.py'!r})",
+            ]
+        else:
+            lines += [
+                f"@pytest.mark.skip(reason={('generation failed: ' + str(r.get('error')))!r})",
+                f"def {name}():",
+                "    pass",
+            ]
+    return "\n".join(lines) + "\n"
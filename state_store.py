@@ -0,0 +1,171 @@
+# backend/app/services/state_store.py
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS pages (name TEXT PRIMARY KEY, html TEXT NOT NULL, content_hash TEXT NOT NULL,
+                                  updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, data TEXT NOT NULL, cancel INTEGER NOT NULL DEFAULT 0,
+                                 updated_at REAL NOT NULL);
+"""
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    """
+    Autocommit connection in WAL mode, for use by a single thread.
+    """
+    conn = sqlite3.connect(str(path), timeout=30, isolation_level=None, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class StateStore:
+    """
+    SQLite database shared by all worker processes on one host: counters (e.g. the
+    KB version), uploaded pages and build job status. WAL mode lets readers proceed while a writer commits.
+    One connection per thread.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(_SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def get_counter(self, name: str) -> int:
+        row = self._conn().execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def bump_counter(self, name: str) -> int:
+        """
+        Atomically increment a counter and return its new value.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO counters (name, value) VALUES (?, 0)", (name,))
+            conn.execute("UPDATE counters SET value = value + 1 WHERE name = ?", (name,))
+            value = conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return value
+
+    def put_page(self, name: str, html: str, content_hash: str):
+        self._conn().execute(
+            "INSERT OR REPLACE INTO pages (name, html, content_hash, updated_at) VALUES (?, ?, ?, ?)",
+            (name, html, content_hash, time.time()),
+        )
+
+    def page_hashes(self) -> Dict[str, str]:
+        """
+        Content hash of every stored page, in upload order (without loading the HTML).
+        """
+        rows = self._conn().execute("SELECT name, content_hash FROM pages ORDER BY updated_at").fetchall()
+        return dict(rows)
+
+    def get_page_html(self, name: str) -> Optional[str]:
+        row = self._conn().execute("SELECT html FROM pages WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def put_job(self, job: dict):
+        self._conn().execute(
+            "INSERT INTO jobs (id, data, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at",
+            (job["job_id"], json.dumps(job), time.time()),
+        )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        row = self._conn().execute("SELECT data, cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = json.loads(row[0])
+        job["cancel_requested"] = job.get("cancel_requested") or bool(row[1])
+        return job
+
+    def request_cancel(self, job_id: str) -> bool:
+        cur = self._conn().execute("UPDATE jobs SET cancel = 1 WHERE id = ?", (job_id,))
+        return cur.rowcount > 0
+
+    def cancel_requested(self, job_id: str) -> bool:
+        row = self._conn().execute("SELECT cancel FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return bool(row and row[0])
+
+
+class FileLock:
+    """
+    Cross-process exclusive lock on a file (fcntl on POSIX, msvcrt on Windows).
+    acquire() polls so the caller can give up, e.g. when a build is cancelled.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fh = None
+
+    def acquire(self, timeout: float = None, poll: float = 0.2, check=None) -> bool:
+        """
+        Wait for the lock. check() is called between attempts and may raise to stop waiting.
+        Returns False on timeout.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        fh = open(self.path, "a+b")
+        while True:
+            try:
+                if os.name == "nt":
+                    import msvcrt
+                    fh.seek(0)
+                    msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+                else:
+                    import fcntl
+                    fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+                self._fh = fh
+                return True
+            except OSError:
+                if deadline is not None and time.monotonic() >= deadline:
+                    fh.close()
+                    return False
+                if check is not None:
+                    try:
+                        check()
+                    except BaseException:
+                        fh.close()
+                        raise
+                time.sleep(poll)
+
+    def release(self):
+        if self._fh is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._fh.seek(0)
+                msvcrt.locking(self._fh.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._fh.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._fh.close()
+            self._fh = None
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
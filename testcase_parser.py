@@ -0,0 +1,210 @@
+# backend/app/services/testcase_parser.py
+
+import ast
+import json
+import re
+from typing import List, Optional
+
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+_MISSING_COMMA = re.compile(r'("|\d|true|false|null|[}\]])(\s*\n\s*)(")')
+_PY_LITERALS = {"True": "true", "False": "false", "None": "null"}
+_WORD = re.compile(r"\w+")
+# Keys the generation prompt asks for; an object with none of them is not a testcase.
+TESTCASE_KEYS = {"Test_ID", "Feature", "Test_Scenario", "Steps", "Expected_Result", "Grounded_In"}
+
+
+def strip_code_fences(text: str) -> str:
+    """
+    Remove a leading ```lang line and a trailing ``` from LLM output.
+    """
+    stripped = text.strip()
+    if stripped.startswith("```"):
+        stripped = stripped.split("\n", 1)[1] if "\n" in stripped else ""
+    if stripped.rstrip().endswith("```"):
+        stripped = stripped.rstrip()[:-3]
+    return stripped.strip()
+
+
+def _escape_controls_in_strings(text: str) -> str:
+    """
+    Escape raw newlines/tabs inside JSON strings and map Python literals outside them.
+    """
+    out = []
+    in_string = escape = False
+    i = 0
+    while i < len(text):
+        ch = text[i]
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            elif ch == "\n":
+                ch = "\\n"
+            elif ch == "\t":
+                ch = "\\t"
+            elif ch == "\r":
+                ch = ""
+        elif ch == '"':
+            in_string = True
+        elif ch.isalpha():
+            m = _WORD.match(text, i)
+            word = m.group(0) if m else ch
+            out.append(_PY_LITERALS.get(word, word))
+            i += len(word)
+            continue
+        out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def loads_tolerant(text: str) -> Optional[object]:
+    """
+    json.loads with repairs for common LLM faults: smart quotes, trailing commas,
+    raw newlines in strings, Python True/False/None, missing commas between fields
+    and single-quoted keys/strings. Returns None if the text cannot be repaired.
+    """
+    try:
+        return json.loads(text)
+    except ValueError:
+        pass
+    repaired = _escape_controls_in_strings(text.translate(_SMART_QUOTES))
+    repaired = _TRAILING_COMMA.sub(r"\1", repaired)
+    repaired = _MISSING_COMMA.sub(r"\1,\2\3", repaired)
+    try:
+        return json.loads(repaired)
+    except ValueError:
+        pass
+    try:
+        return ast.literal_eval(text.translate(_SMART_QUOTES))
+    except (ValueError, SyntaxError):
+        return None
+
+
+class IncrementalTestcaseParser:
+    """
+    Incrementally extracts testcase objects from a (streamed) JSON array.
+    feed() returns every top-level object completed by the new text, as soon as its
+    closing brace arrives (the testcases of a {"testcases": [...]} style wrapper when
+    the wrapper closes); code fences, prose and array punctuation between objects
+    are skipped. Consumed text is discarded, so memory stays bounded by one object.
+    """
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._start = -1
+        self.count = 0
+
+    def feed(self, text: str) -> List[dict]:
+        """
+        Consume more output and return the testcases completed by it.
+        """
+        self._buf += text
+        done = []
+        buf, i = self._buf, self._pos
+        while i < len(buf):
+            ch = buf[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"' and self._depth > 0:
+                self._in_string = True
+            elif ch == "{":
+                if self._depth == 0:
+                    self._start = i
+                self._depth += 1
+            elif ch == "}" and self._depth > 0:
+                self._depth -= 1
+                if self._depth == 0:
+                    obj = loads_tolerant(buf[self._start:i + 1])
+                    if isinstance(obj, dict):
+                        done.extend(_unwrap(obj))
+                    self._start = -1
+            i += 1
+        # Keep only the unfinished object (if any).
+        if self._depth > 0:
+            self._buf, self._pos = buf[self._start:], i - self._start
+            self._start = 0
+        else:
+            self._buf, self._pos = "", 0
+        self.count += len(done)
+        return done
+
+    def close(self) -> List[dict]:
+        """
+        End of output: try to repair a truncated final object by closing its open
+        string and braces. Returns the recovered testcase, if any.
+        """
+        if self._depth == 0 or not self._buf:
+            return []
+        tail = self._buf + ('"' if self._in_string else "")
+        self._buf, self._pos, self._depth, self._in_string, self._escape = "", 0, 0, False, False
+        # Full tail first, then cut back to the last complete field.
+        candidates = [tail]
+        cut = tail.rfind(",")
+        if cut > 0:
+            candidates.append(tail[:cut])
+        for candidate in candidates:
+            obj = loads_tolerant(candidate.rstrip().rstrip(",:") + _closers(candidate))
+            if isinstance(obj, dict):
+                found = _unwrap(obj)
+                self.count += len(found)
+                return found
+        return []
+
+
+def _unwrap(obj: dict) -> List[dict]:
+    """
+    Testcases in a completed top-level object: the object itself, or, for a wrapper
+    such as {"testcases": [...]} (no testcase keys, a single list of objects), the
+    objects in that list.
+    """
+    if TESTCASE_KEYS.intersection(obj):
+        return [obj]
+    lists = [v for v in obj.values() if isinstance(v, list)]
+    if len(lists) == 1 and lists[0] and all(isinstance(item, dict) for item in lists[0]):
+        return lists[0]
+    return [obj]
+
+
+def _closers(text: str) -> str:
+    """
+    Brackets/braces needed to close everything left open in text.
+    """
+    stack = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+        elif ch in "}]" and stack:
+            stack.pop()
+    return "".join(reversed(stack))
+
+
+def parse_testcases(text: str) -> List[dict]:
+    """
+    Parse a complete LLM output into a list of testcases, tolerating fences,
+    surrounding prose, common JSON faults and a truncated final object.
+    """
+    parser = IncrementalTestcaseParser()
+    return parser.feed(text) + parser.close()
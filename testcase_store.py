@@ -0,0 +1,227 @@
+# backend/app/services/testcase_store.py
+
+import json
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from .state_store import connect
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS testcases (
+    id TEXT PRIMARY KEY,
+    created_at REAL NOT NULL,
+    request TEXT,
+    status TEXT,
+    n_testcases INTEGER NOT NULL DEFAULT 0,
+    data BLOB
+);
+CREATE INDEX IF NOT EXISTS testcases_created ON testcases (created_at);
+"""
+
+
+class TestcaseStore:
+    """
+    Generated testcases by id, bounded in memory.
+    Recent entries are kept in an LRU capped at `max_bytes` (measured as serialized
+    JSON) and `ttl_seconds` of idleness; evicted entries spill to SQLite as
+    zlib-compressed JSON and are loaded back on access. A summary row (request,
+    status, testcase count) is written on every put, so listing never loads entries.
+    With max_bytes=0 every entry is written straight to disk, which is what the
+    shared-state mode uses so all workers see the same entries.
+    Entries older than `retention_seconds` (0 = keep forever) are deleted.
+    The entry count and disk bytes reported by stats() are counted once on open and
+    then kept up to date by this process's writes, so stats() never scans the table
+    (in shared-state mode, other workers' writes show up after a restart).
+    """
+
+    def __init__(self, path: Path, max_bytes: int = 64 << 20, ttl_seconds: float = 3600,
+                 retention_seconds: float = 0, persistent: bool = False):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.retention_seconds = retention_seconds
+        self._memory: "OrderedDict[str, list]" = OrderedDict()  # id -> [entry, size, last_access]
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._last_purge = 0.0
+        self.spills = 0
+        self.disk_hits = 0
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        if not persistent:
+            # Rows whose data only lived in the memory of a process that did not flush.
+            conn.execute("DELETE FROM testcases WHERE data IS NULL")
+        self._entries, self._disk_bytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM testcases"
+        ).fetchone()
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def put(self, tc_id: str, entry: dict):
+        """
+        Store or replace an entry. Evicts idle and least recently used entries to disk.
+        """
+        raw = json.dumps(entry, separators=(",", ":")).encode("utf-8")
+        summary = (
+            tc_id, entry.get("created_at", time.time()), (entry.get("request") or "")[:500],
+            entry.get("status"), len(entry.get("testcases") or []),
+        )
+        spill = [] if self.max_bytes > 0 else [(tc_id, raw)]
+        with self._lock:
+            old = self._memory.pop(tc_id, None)
+            if old is not None:
+                self._memory_bytes -= old[1]
+            if self.max_bytes > 0:
+                self._memory[tc_id] = [entry, len(raw), time.monotonic()]
+                self._memory_bytes += len(raw)
+                spill.extend(self._evict_locked())
+        conn = self._conn()
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO testcases (id, created_at, request, status, n_testcases) VALUES (?, ?, ?, ?, ?)",
+            summary,
+        ).rowcount
+        if inserted:
+            with self._lock:
+                self._entries += 1
+        else:
+            conn.execute(
+                "UPDATE testcases SET request = ?, status = ?, n_testcases = ? WHERE id = ?",
+                (summary[2], summary[3], summary[4], tc_id),
+            )
+        self._spill(spill)
+        self._purge_expired()
+
+    def _evict_locked(self) -> List[Tuple[str, bytes]]:
+        """
+        Pop idle entries and, while over the byte cap, the least recently used ones.
+        Returns (id, json bytes) pairs to write to disk.
+        """
+        out = []
+        now = time.monotonic()
+        while self._memory:
+            tc_id, (entry, size, last) = next(iter(self._memory.items()))
+            if self._memory_bytes <= self.max_bytes and now - last < self.ttl_seconds:
+                break
+            self._memory.popitem(last=False)
+            self._memory_bytes -= size
+            out.append((tc_id, json.dumps(entry, separators=(",", ":")).encode("utf-8")))
+        return out
+
+    def _spill(self, items: List[Tuple[str, bytes]]):
+        if not items:
+            return
+        conn = self._conn()
+        rows = [(zlib.compress(raw, 6), tc_id) for tc_id, raw in items]
+        old = sum(
+            conn.execute("SELECT COALESCE(LENGTH(data), 0) FROM testcases WHERE id = ?", (tc_id,)).fetchone()[0]
+            for _, tc_id in rows
+        )
+        conn.executemany("UPDATE testcases SET data = ? WHERE id = ?", rows)
+        with self._lock:
+            self._disk_bytes += sum(len(data) for data, _ in rows) - old
+        self.spills += len(items)
+
+    def get(self, tc_id: str, default=None) -> Optional[dict]:
+        """
+        Entry by id from memory, or from disk if it was evicted.
+        Entries loaded from disk are not promoted back into memory.
+        """
+        with self._lock:
+            item = self._memory.get(tc_id)
+            if item is not None:
+                item[2] = time.monotonic()
+                self._memory.move_to_end(tc_id)
+                return item[0]
+        row = self._conn().execute("SELECT data FROM testcases WHERE id = ?", (tc_id,)).fetchone()
+        if row is None or row[0] is None:
+            return default
+        self.disk_hits += 1
+        return json.loads(zlib.decompress(row[0]))
+
+    def __getitem__(self, tc_id: str) -> dict:
+        entry = self.get(tc_id)
+        if entry is None:
+            raise KeyError(tc_id)
+        return entry
+
+    def __setitem__(self, tc_id: str, entry: dict):
+        self.put(tc_id, entry)
+
+    def __contains__(self, tc_id) -> bool:
+        with self._lock:
+            if tc_id in self._memory:
+                return True
+        return self._conn().execute(
+            "SELECT 1 FROM testcases WHERE id = ? AND data IS NOT NULL", (tc_id,)
+        ).fetchone() is not None
+
+    def list(self, offset: int = 0, limit: int = 50, status: Optional[str] = None) -> Tuple[List[Dict], int]:
+        """
+        One page of entry summaries, newest first, and the total count.
+        """
+        where, args = ("WHERE status = ?", [status]) if status else ("", [])
+        conn = self._conn()
+        total = conn.execute(f"SELECT COUNT(*) FROM testcases {where}", args).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT id, created_at, request, status, n_testcases FROM testcases {where} "
+            "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            args + [limit, offset],
+        ).fetchall()
+        items = [
+            {"testcases_id": r[0], "created_at": r[1], "request": r[2], "status": r[3], "n_testcases": r[4]}
+            for r in rows
+        ]
+        return items, total
+
+    def _purge_expired(self):
+        if self.retention_seconds <= 0 or time.monotonic() - self._last_purge < 60:
+            return
+        self._last_purge = time.monotonic()
+        cutoff = time.time() - self.retention_seconds
+        with self._lock:
+            expired = [k for k, v in self._memory.items() if v[0].get("created_at", cutoff) < cutoff]
+            for k in expired:
+                self._memory_bytes -= self._memory.pop(k)[1]
+        conn = self._conn()
+        n, nbytes = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(data)), 0) FROM testcases WHERE created_at < ?", (cutoff,)
+        ).fetchone()
+        conn.execute("DELETE FROM testcases WHERE created_at < ?", (cutoff,))
+        with self._lock:
+            self._entries -= n
+            self._disk_bytes -= nbytes
+
+    def flush(self):
+        """
+        Write every in-memory entry to disk (e.g. on shutdown); they stay in memory too.
+        """
+        with self._lock:
+            items = [(k, json.dumps(v[0], separators=(",", ":")).encode("utf-8")) for k, v in self._memory.items()]
+        self._spill(items)
+
+    def stats(self) -> dict:
+        """
+        Memory and disk usage, for /health.
+        """
+        with self._lock:
+            memory_entries, memory_bytes = len(self._memory), self._memory_bytes
+            total, disk_bytes = self._entries, self._disk_bytes
+        return {
+            "entries": total,
+            "memory_entries": memory_entries,
+            "memory_bytes": memory_bytes,
+            "memory_cap_bytes": self.max_bytes,
+            "disk_bytes": disk_bytes,
+            "spilled": self.spills,
+            "disk_hits": self.disk_hits,
+        }
@@ -0,0 +1,53 @@
+import math
+import random
+import sys
+import types
+from pathlib import Path
+
+import pytest
+
+try:
+    from backend.app.services import lexical
+except ImportError:
+    # Flattened checkout: import the services as a package rooted at the repository.
+    package = types.ModuleType("services")
+    package.__path__ = [str(Path(__file__).resolve().parents[1])]
+    sys.modules.setdefault("services", package)
+    from services import lexical
+
+
+def _reference_scores(index, terms):
+    n = index.count()
+    avg_len = sum(index._doc_len.values()) / n
+    scores = {}
+    for term in terms:
+        postings = index._postings.get(term, {})
+        idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+        for vid, tf in postings.items():
+            norm = tf + index.k1 * (1 - index.b + index.b * index._doc_len[vid] / avg_len)
+            scores[vid] = scores.get(vid, 0.0) + idf * tf * (index.k1 + 1) / norm
+    return scores
+
+
+def test_query_matches_bm25_over_the_kept_terms():
+    rng = random.Random(0)
+    vocab = [f"w{i}" for i in range(300)]
+    index = lexical.BM25Index()
+    texts = [" ".join(rng.choice(vocab) for _ in range(rng.randint(5, 40))) for _ in range(400)]
+    index.add(range(400), texts)
+    index.remove([3, 5])
+
+    results = index.query("the w1 w2 w200 discount", top_k=10)
+    expected = _reference_scores(index, ["w1", "w2", "w200"])
+    assert [score for _, score in results] == pytest.approx(sorted(expected.values(), reverse=True)[:10])
+    for vid, score in results:
+        assert score == pytest.approx(expected[vid])
+
+
+def test_stopwords_are_skipped_unless_nothing_else_matches():
+    index = lexical.BM25Index()
+    index.add([1, 2, 3], ["apply the discount code", "the cart total", "checkout for the order"])
+
+    assert [vid for vid, _ in index.query("the discount")] == [1]
+    assert sorted(vid for vid, _ in index.query("for the")) == [3]
+    assert index.query("unknown words") == []
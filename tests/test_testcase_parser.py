@@ -0,0 +1,31 @@
+import sys
+from pathlib import Path
+
+try:
+    from backend.app.services import testcase_parser
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+    import testcase_parser
+
+
+def test_loads_tolerant_with_non_ascii_text_outside_strings():
+    # The first json.loads fails, so the repair pass walks the non-ASCII words.
+    assert testcase_parser.loads_tolerant('{"Feature": "Café", "Automated": True} voilà 测试') is None
+    assert testcase_parser.loads_tolerant('{"Feature": "Café", "Automated": True, "Priorité": None,}') == {
+        "Feature": "Café", "Automated": True, "Priorité": None,
+    }
+
+
+def test_parse_testcases_with_non_ascii_unquoted_value():
+    text = '[{"Test_ID": "TC-001", "Feature": "Café", "Automated": True,},\n {"Test_ID": "TC-002", "Note": 测试}]'
+    assert testcase_parser.parse_testcases(text) == [{"Test_ID": "TC-001", "Feature": "Café", "Automated": True}]
+
+
+def test_parse_testcases_unwraps_wrapper_object():
+    text = '```json\n{"testcases": [{"Test_ID": "TC-001"}, {"Test_ID": "TC-002"}], "count": 2}\n```'
+    assert testcase_parser.parse_testcases(text) == [{"Test_ID": "TC-001"}, {"Test_ID": "TC-002"}]
+
+
+def test_parse_testcases_keeps_testcase_with_list_field():
+    text = '[{"Test_ID": "TC-001", "Steps": [{"action": "click"}]}]'
+    assert testcase_parser.parse_testcases(text) == [{"Test_ID": "TC-001", "Steps": [{"action": "click"}]}]
@@ -0,0 +1,45 @@
+import sys
+import types
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+pytest.importorskip("faiss")
+
+try:
+    from backend.app.services import vectorstore
+except ImportError:
+    # Flattened checkout: import the services as a package rooted at the repository.
+    package = types.ModuleType("services")
+    package.__path__ = [str(Path(__file__).resolve().parents[1])]
+    sys.modules.setdefault("services", package)
+    from services import vectorstore
+
+
+def _vectors(n, seed):
+    return np.random.RandomState(seed).randn(n, 32).astype("float32")
+
+
+def _metadatas(ids):
+    return [{"vector_id": i} for i in ids]
+
+
+@pytest.mark.parametrize("index_type", vectorstore.INDEX_TYPES)
+def test_copy_after_load_can_be_extended(tmp_path, index_type):
+    params = {"m": 8} if index_type == "ivfpq" else None
+    store = vectorstore.FaissStore(dim=32, index_type=index_type, params=params)
+    first = _vectors(300, 0)
+    store.add(first, _metadatas(range(300)), range(300))
+    store.save(tmp_path)
+
+    loaded = vectorstore.FaissStore.load(tmp_path)
+    copy = loaded.copy()
+    copy.add(_vectors(20, 1), _metadatas(range(300, 320)), range(300, 320))
+    copy.flush()
+
+    assert copy.count() == 320
+    assert loaded.count() == 300
+    assert loaded.query(first[7], top_k=1)[0]["vector_id"] == 7
+    copy.save(tmp_path)
+    assert vectorstore.FaissStore.load(tmp_path).count() == 320
@@ -1,54 +1,445 @@
-# backend/app/services/vectorstore.py
-
-import faiss
-import numpy as np
-from typing import List, Dict, Any
-
-
-class FaissStore:
-    """
-    Simple FAISS wrapper to store embeddings + metadata.
-    Metadata is kept in parallel for retrieval.
-    """
-
-    def __init__(self, dim: int = 384):
-        """
-        Initialize a FAISS flat index (L2 distance) and empty metadata list.
-        """
-        self.index = faiss.IndexFlatL2(dim)
-        self.metadata: List[Dict[str, Any]] = []
-
-    def add(self, vectors: np.ndarray, metadatas: List[Dict[str, Any]]):
-        """
-        Add vectors and their corresponding metadata to the store.
-        Args:
-            vectors: np.ndarray of shape (n_vectors, dim)
-            metadatas: list of dicts, length n_vectors
-        """
-        if len(vectors) != len(metadatas):
-            raise ValueError("Vectors and metadata length mismatch")
-        self.index.add(np.array(vectors, dtype="float32"))
-        self.metadata.extend(metadatas)
-
-    def query(self, query_vector: np.ndarray, top_k: int = 5) -> List[Dict[str, Any]]:
-        """
-        Search for top_k nearest neighbors to query_vector.
-        Args:
-            query_vector: np.ndarray of shape (dim,) or (1, dim)
-            top_k: number of results to return
-        Returns:
-            List of metadata dicts for top_k closest vectors
-        """
-        qv = query_vector.reshape(1, -1).astype("float32")
-        D, I = self.index.search(qv, top_k)
-        results = []
-        for i in I[0]:
-            if i < len(self.metadata):
-                results.append(self.metadata[i])
-        return results
-
-    def count(self) -> int:
-        """
-        Return number of vectors stored
-        """
-        return self.index.ntotal
+# backend/app/services/vectorstore.py
+
+import json
+import math
+import os
+import numpy as np
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Optional
+
+from . import metrics
+
+INDEX_FILE = "index.faiss"
+METADATA_FILE = "metadata.json"
+
+INDEX_TYPES = ["flat_l2", "flat_ip", "hnsw", "ivfpq"]
+# Vector storage formats; float16/int8 use FAISS scalar quantizers (2x / 4x smaller).
+STORAGE_TYPES = ["float32", "float16", "int8"]
+# int8 quantizer ranges are trained on the first vectors added (or all of them, if fewer).
+SQ_TRAIN_SIZE = 20000
+# An ivfpq index trained on a small first build is retrained once it serves this many
+# times more vectors than it was trained on.
+IVFPQ_RETRAIN_FACTOR = 4
+
+DEFAULT_PARAMS = {
+    "hnsw": {"M": 32, "ef_construction": 80, "ef_search": 64},
+    "ivfpq": {"nlist": 1024, "m": 48, "nbits": 8, "nprobe": 16},
+}
+
+
+class FaissStore:
+    """
+    Simple FAISS wrapper to store embeddings + metadata.
+    Vectors are added under explicit int64 ids so they can be removed again
+    when the source file changes; metadata is kept in a dict keyed by id.
+
+    Supported index types:
+      - flat_l2: exact search on raw L2 distance
+      - flat_ip: exact cosine search (vectors are L2-normalized, inner product)
+      - hnsw:    approximate cosine search on an HNSW graph
+      - ivfpq:   approximate cosine search on an IVF index with product quantization,
+                 trained on the vectors of the first build and retrained (see
+                 `needs_retrain`) once the corpus has outgrown them
+
+    The flat and hnsw types keep full float32 vectors unless `storage` is float16 or
+    int8, which store scalar-quantized codes instead (ivfpq is already compressed).
+    """
+
+    def __init__(self, dim: int = 384, index_type: str = "flat_ip", params: Optional[Dict[str, Any]] = None,
+                 storage: str = "float32"):
+        """
+        Initialize an empty FAISS index of the given type wrapped in an id map, and empty metadata.
+        """
+        import faiss
+
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown index type {index_type!r}, expected one of {INDEX_TYPES}")
+        if storage not in STORAGE_TYPES:
+            raise ValueError(f"Unknown vector storage {storage!r}, expected one of {STORAGE_TYPES}")
+        if index_type == "ivfpq" and storage != "float32":
+            raise ValueError("ivfpq stores product-quantized codes; use storage='float32' with it")
+        self.dim = dim
+        self.index_type = index_type
+        self.storage = storage
+        self.params = {**DEFAULT_PARAMS.get(index_type, {}), **(params or {})}
+        self.normalize = index_type != "flat_l2"
+        self.index = faiss.IndexIDMap2(self._new_index())
+        self.metadata: Dict[int, Dict[str, Any]] = {}
+        self._pending: List[tuple] = []
+        self.trained_on: Optional[int] = None  # vectors the ivfpq index was trained on
+        self._index_path = None
+        self._mmapped = False
+
+    def _new_index(self, n_train: Optional[int] = None):
+        """
+        Create the underlying (unwrapped) FAISS index. For ivfpq, n_train clamps
+        nlist/nbits so that training on a small first build still succeeds.
+        """
+        import faiss
+
+        p = self.params
+        if self.storage != "float32":
+            qtype = faiss.ScalarQuantizer.QT_fp16 if self.storage == "float16" else faiss.ScalarQuantizer.QT_8bit
+            metric = faiss.METRIC_L2 if self.index_type == "flat_l2" else faiss.METRIC_INNER_PRODUCT
+            if self.index_type == "hnsw":
+                index = faiss.IndexHNSWSQ(self.dim, qtype, p["M"], metric)
+                index.hnsw.efConstruction = p["ef_construction"]
+                index.hnsw.efSearch = p["ef_search"]
+                return index
+            return faiss.IndexScalarQuantizer(self.dim, qtype, metric)
+        if self.index_type == "flat_l2":
+            return faiss.IndexFlatL2(self.dim)
+        if self.index_type == "flat_ip":
+            return faiss.IndexFlatIP(self.dim)
+        if self.index_type == "hnsw":
+            index = faiss.IndexHNSWFlat(self.dim, p["M"], faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = p["ef_construction"]
+            index.hnsw.efSearch = p["ef_search"]
+            return index
+
+        nlist, nbits = p["nlist"], p["nbits"]
+        if n_train is not None:
+            nlist = max(1, min(nlist, n_train // 39))
+            nbits = max(1, min(nbits, int(math.log2(max(n_train, 2)))))
+        m = max(d for d in range(1, min(p["m"], self.dim) + 1) if self.dim % d == 0)
+        quantizer = faiss.IndexFlatIP(self.dim)
+        index = faiss.IndexIVFPQ(quantizer, self.dim, nlist, m, nbits, faiss.METRIC_INNER_PRODUCT)
+        index.nprobe = min(p["nprobe"], nlist)
+        return index
+
+    def _train_size(self) -> int:
+        """
+        Number of buffered vectors after which an untrained index is trained automatically.
+        """
+        if self.index_type != "ivfpq":
+            return SQ_TRAIN_SIZE
+        return 39 * max(self.params["nlist"], 2 ** self.params["nbits"])
+
+    def _prepare(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        Cast to contiguous float32 rows and L2-normalize for the cosine index types.
+        """
+        import faiss
+
+        vectors = np.array(vectors, dtype="float32").reshape(-1, self.dim)
+        if self.normalize:
+            faiss.normalize_L2(vectors)
+        return vectors
+
+    @metrics.timed("faiss_add")
+    def add(self, vectors: np.ndarray, metadatas: List[Dict[str, Any]], ids: Iterable[int]):
+        """
+        Add vectors and their corresponding metadata to the store.
+        For an untrained ivfpq index, vectors are buffered until enough are available
+        to train on (or until `flush` is called).
+        Args:
+            vectors: np.ndarray of shape (n_vectors, dim)
+            metadatas: list of dicts, length n_vectors
+            ids: unique int ids for the vectors, length n_vectors
+        """
+        ids = np.asarray(list(ids), dtype="int64")
+        if len(vectors) != len(metadatas) or len(vectors) != len(ids):
+            raise ValueError("Vectors, metadata and ids length mismatch")
+        if len(ids) == 0:
+            return
+        self._ensure_writable()
+        vectors = self._prepare(vectors)
+        for i, meta in zip(ids.tolist(), metadatas):
+            self.metadata[i] = meta
+
+        if not self.index.is_trained:
+            self._pending.append((vectors, ids))
+            if sum(len(i) for _, i in self._pending) >= self._train_size():
+                self.flush()
+            return
+        self.index.add_with_ids(vectors, ids)
+
+    def flush(self):
+        """
+        Train an untrained index on all buffered vectors and add them.
+        No-op when nothing is pending.
+        """
+        import faiss
+
+        if not self._pending:
+            return
+        vectors = np.vstack([v for v, _ in self._pending])
+        ids = np.concatenate([i for _, i in self._pending])
+        self._pending = []
+        if not self.index.is_trained:
+            inner = self._new_index(n_train=len(vectors))
+            inner.train(vectors)
+            self.index = faiss.IndexIDMap2(inner)
+            self.trained_on = len(vectors)
+        self.index.add_with_ids(vectors, ids)
+
+    def needs_retrain(self) -> bool:
+        """
+        True when an ivfpq index was trained on fewer vectors than a full training set
+        and now holds more than IVFPQ_RETRAIN_FACTOR times as many, so its nlist/nbits
+        (clamped to the training size) are too small for the corpus.
+        """
+        if self.index_type != "ivfpq" or not self.trained_on:
+            return False
+        return self.trained_on < self._train_size() and self.count() > IVFPQ_RETRAIN_FACTOR * self.trained_on
+
+    def retrain(self, vectors: np.ndarray, ids: Iterable[int]):
+        """
+        Rebuild the index trained on `vectors`, which must be the original (not
+        PQ-decoded) vectors of every stored id. Metadata is kept.
+        """
+        import faiss
+
+        ids = np.asarray(list(ids), dtype="int64")
+        if len(vectors) != len(ids) or set(ids.tolist()) != set(self.metadata):
+            raise ValueError("retrain needs a vector for every stored id")
+        self._mmapped = False
+        self._pending = []
+        vectors = self._prepare(vectors)
+        inner = self._new_index(n_train=len(vectors))
+        if len(vectors) and not inner.is_trained:
+            inner.train(vectors)
+            self.trained_on = len(vectors)
+        self.index = faiss.IndexIDMap2(inner)
+        if len(vectors):
+            self.index.add_with_ids(vectors, ids)
+
+    def remove(self, ids: Iterable[int]) -> int:
+        """
+        Remove vectors (and their metadata) by id.
+        Returns:
+            Number of vectors removed
+        """
+        ids = np.asarray(list(ids), dtype="int64")
+        if len(ids) == 0:
+            return 0
+        self._ensure_writable()
+        drop = set(ids.tolist())
+        removed = 0
+        if self._pending:
+            kept = []
+            for v, i in self._pending:
+                mask = np.array([x not in drop for x in i.tolist()], dtype=bool)
+                removed += int((~mask).sum())
+                if mask.any():
+                    kept.append((v[mask], i[mask]))
+            self._pending = kept
+        try:
+            removed += self.index.remove_ids(ids)
+        except RuntimeError:
+            # HNSW graphs do not support deletion: rebuild from the surviving vectors.
+            removed += self._rebuild_without(drop)
+        for i in drop:
+            self.metadata.pop(i, None)
+        return removed
+
+    def _rebuild_without(self, drop: set) -> int:
+        """
+        Rebuild the index from every stored vector whose id is not in `drop`.
+        Returns the number of vectors dropped.
+        """
+        import faiss
+
+        keep = np.array([i for i in self.metadata if i not in drop], dtype="int64")
+        before = self.index.ntotal
+        vectors = self.index.reconstruct_batch(keep) if len(keep) else None
+        inner = self._new_index()
+        if len(keep) and not inner.is_trained:
+            inner.train(vectors)
+        self.index = faiss.IndexIDMap2(inner)
+        if len(keep):
+            self.index.add_with_ids(vectors, keep)
+        return before - self.index.ntotal
+
+    def query(self, query_vector: np.ndarray, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Search for top_k nearest neighbors to query_vector.
+        Args:
+            query_vector: np.ndarray of shape (dim,) or (1, dim)
+            top_k: number of results to return
+        Returns:
+            List of metadata dicts for top_k closest vectors, each with a "score"
+            (cosine similarity, or negated L2 distance for flat_l2; higher is better)
+        """
+        return self.query_batch(query_vector.reshape(1, -1), top_k=top_k)[0]
+
+    @metrics.timed("faiss_query")
+    def query_batch(self, query_vectors: np.ndarray, top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Search for the top_k nearest neighbors of every row with a single FAISS search.
+        Args:
+            query_vectors: np.ndarray of shape (n_queries, dim)
+            top_k: number of results to return per query
+        Returns:
+            One list of scored metadata dicts (see query) per query row, in input order
+        """
+        qv = self._prepare(query_vectors)
+        if self.index.ntotal == 0:
+            return [[] for _ in range(len(qv))]
+        D, I = self.index.search(qv, top_k)
+        sign = 1.0 if self.normalize else -1.0
+        results = []
+        for dists, row in zip(D.tolist(), I.tolist()):
+            results.append([
+                {**self.metadata[i], "score": sign * d}
+                for d, i in zip(dists, row) if i in self.metadata
+            ])
+        return results
+
+    def get_metadata(self, ids: Iterable[int]) -> List[Dict[str, Any]]:
+        """
+        Metadata for the given ids, in the given order; unknown ids are skipped.
+        """
+        return [self.metadata[i] for i in ids if i in self.metadata]
+
+    def update_metadata(self, vid: int, **fields):
+        """
+        Set fields on the metadata of a stored vector. The dict is replaced rather than
+        modified, since copies of the store share metadata dicts. Unknown ids are ignored.
+        """
+        if vid in self.metadata:
+            self.metadata[vid] = {**self.metadata[vid], **fields}
+
+    def copy(self) -> "FaissStore":
+        """
+        Independent in-memory copy, so a build can modify it while this store keeps serving queries.
+        A memory-mapped index is read back from disk instead of cloned, since FAISS cannot
+        clone the on-disk inverted lists of a mapped IVF index.
+        """
+        import faiss
+
+        other = FaissStore.__new__(FaissStore)
+        other.__dict__.update(self.__dict__)
+        other.params = dict(self.params)
+        if self._mmapped:
+            other.index = _read_index(self._index_path, mmap=False)[0]
+            other._apply_search_params()
+        else:
+            other.index = faiss.clone_index(self.index)
+        other.metadata = dict(self.metadata)
+        other._pending = list(self._pending)
+        other._index_path = None
+        other._mmapped = False
+        return other
+
+    def all_metadata(self) -> List[Dict[str, Any]]:
+        """
+        Return metadata for every stored vector, in id order.
+        """
+        return [self.metadata[i] for i in sorted(self.metadata)]
+
+    def count(self) -> int:
+        """
+        Return number of vectors stored (including vectors waiting for index training)
+        """
+        return self.index.ntotal + sum(len(i) for _, i in self._pending)
+
+    def save(self, directory: Path):
+        """
+        Persist the index and a compact, column-oriented metadata sidecar to `directory`.
+        Pending vectors are flushed first. Files are written to temporaries and renamed
+        into place, so readers never see a partial file.
+        """
+        import faiss
+
+        self.flush()
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        index_path = directory / INDEX_FILE
+        meta_path = directory / METADATA_FILE
+
+        tmp_index = index_path.with_suffix(".tmp")
+        faiss.write_index(self.index, str(tmp_index))
+
+        ids = sorted(self.metadata)
+        fields = sorted({k for m in self.metadata.values() for k in m})
+        sidecar = {
+            "dim": self.dim,
+            "index_type": self.index_type,
+            "storage": self.storage,
+            "params": self.params,
+            "trained_on": self.trained_on,
+            "ids": ids,
+            "columns": {f: [self.metadata[i].get(f) for i in ids] for f in fields},
+        }
+        tmp_meta = meta_path.with_suffix(".tmp")
+        with tmp_meta.open("w", encoding="utf-8") as f:
+            json.dump(sidecar, f, separators=(",", ":"))
+
+        os.replace(tmp_index, index_path)
+        os.replace(tmp_meta, meta_path)
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "FaissStore":
+        """
+        Load a store saved with `save`. When mmap is True the index is memory-mapped
+        read-only where FAISS supports it; it is re-read into memory on the first write.
+        Raises FileNotFoundError if no saved store exists, ValueError if it is inconsistent.
+        """
+        import faiss
+
+        directory = Path(directory)
+        index_path = directory / INDEX_FILE
+        meta_path = directory / METADATA_FILE
+        if not index_path.exists() or not meta_path.exists():
+            raise FileNotFoundError(f"No saved vector store in {directory}")
+
+        with meta_path.open("r", encoding="utf-8") as f:
+            sidecar = json.load(f)
+
+        store = cls(
+            dim=sidecar["dim"], index_type=sidecar.get("index_type", "flat_l2"),
+            params=sidecar.get("params"), storage=sidecar.get("storage", "float32"),
+        )
+        store._index_path = index_path
+        store.index, store._mmapped = _read_index(index_path, mmap)
+        store._apply_search_params()
+        store.trained_on = sidecar.get("trained_on")
+        if store.trained_on is None and store.index_type == "ivfpq" and store.index.is_trained:
+            # Saved before the training size was recorded: the clamp in _new_index
+            # gives at least 39 training vectors per list.
+            store.trained_on = 39 * faiss.downcast_index(store.index.index).nlist
+
+        ids = sidecar["ids"]
+        columns = sidecar["columns"]
+        for row, i in enumerate(ids):
+            store.metadata[i] = {f: values[row] for f, values in columns.items() if values[row] is not None}
+
+        if store.index.ntotal != len(store.metadata) or store.index.d != store.dim:
+            raise ValueError("Saved index and metadata are out of sync")
+        return store
+
+    def _apply_search_params(self):
+        """
+        Re-apply query-time parameters (efSearch / nprobe) to a loaded index.
+        """
+        import faiss
+
+        inner = faiss.downcast_index(self.index.index)
+        if self.index_type == "hnsw":
+            inner.hnsw.efSearch = self.params["ef_search"]
+        elif self.index_type == "ivfpq":
+            inner.nprobe = min(self.params["nprobe"], inner.nlist)
+
+    def _ensure_writable(self):
+        """
+        Swap a memory-mapped, read-only index for an in-memory copy before mutating it.
+        """
+        if self._mmapped:
+            self.index, self._mmapped = _read_index(self._index_path, mmap=False)
+            self._apply_search_params()
+
+
+def _read_index(path: Path, mmap: bool):
+    """
+    Read a FAISS index, memory-mapping it when requested and supported.
+    Returns (index, mmapped).
+    """
+    import faiss
+
+    if mmap:
+        try:
+            return faiss.read_index(str(path), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY), True
+        except RuntimeError:
+            pass
+    return faiss.read_index(str(path)), False